@@ -0,0 +1,181 @@
+"""
+Módulo: ann_index.py
+
+Módulo con los índices de búsqueda aproximada (ANN) que usa `LocalVectorStore` cuando
+el corpus es demasiado grande para compararlo entero con cada consulta:
+- `IVFIndex`: índice de ficheros invertidos. Los vectores se agrupan con k-means y
+  cada consulta sólo recorre los grupos cuyos centroides están más cerca.
+- `HNSWIndex`: grafo HNSW mediante la librería opcional `hnswlib`.
+
+Ambos índices trabajan con las filas del almacén y sólo proponen candidatos; la
+puntuación final la calcula el almacén con los vectores originales.
+"""
+
+from pathlib import Path
+from typing import Optional
+
+import numpy as np
+
+# Number of rows assigned to their centroid at once while building the IVF index
+_ASSIGN_BLOCK_SIZE = 65536
+
+
+def _assign(vectors: np.ndarray, centroids: np.ndarray) -> np.ndarray:
+    assignments = np.empty(len(vectors), dtype=np.int32)
+    for start in range(0, len(vectors), _ASSIGN_BLOCK_SIZE):
+        block = np.asarray(
+            vectors[start : start + _ASSIGN_BLOCK_SIZE], dtype=np.float32
+        )
+        assignments[start : start + len(block)] = np.argmax(block @ centroids.T, axis=1)
+    return assignments
+
+
+class IVFIndex:
+    """
+    Índice de ficheros invertidos (IVF) sobre vectores normalizados.
+
+    Parámetros:
+    -----------
+    nlist : int, opcional
+        Número de grupos. Si es 0 o None, se usa 4 * sqrt(n).
+    nprobe : int, opcional
+        Número de grupos recorridos en cada consulta (por defecto es 8).
+    """
+
+    def __init__(self, nlist: Optional[int] = None, nprobe: int = 8) -> None:
+        self._nlist = nlist
+        self.nprobe = nprobe
+        self.centroids = None
+        self._list_rows = None
+        self._list_offsets = None
+        self.num_rows = 0
+
+    def build(self, vectors: np.ndarray, iterations: int = 10, seed: int = 0) -> None:
+        """
+        Entrena los centroides con k-means esférico sobre una muestra y asigna
+        todas las filas a su grupo.
+
+        Parámetros:
+        -----------
+        vectors : np.ndarray
+            Matriz (n, dim) de vectores normalizados (puede estar proyectada en memoria).
+        iterations : int, opcional
+            Iteraciones de k-means (por defecto es 10).
+        seed : int, opcional
+            Semilla del muestreo inicial.
+        """
+        num_rows = len(vectors)
+        nlist = self._nlist or max(1, int(4 * np.sqrt(num_rows)))
+        nlist = min(nlist, num_rows)
+
+        rng = np.random.default_rng(seed)
+        sample_size = min(num_rows, max(64 * nlist, 10000))
+        sample_rows = np.sort(rng.choice(num_rows, size=sample_size, replace=False))
+        sample = np.asarray(vectors[sample_rows], dtype=np.float32)
+
+        centroids = sample[rng.choice(sample_size, size=nlist, replace=False)].copy()
+        for _ in range(iterations):
+            labels = np.argmax(sample @ centroids.T, axis=1)
+            sums = np.zeros_like(centroids)
+            np.add.at(sums, labels, sample)
+            norms = np.linalg.norm(sums, axis=1, keepdims=True)
+            # Empty clusters keep their previous centroid
+            non_empty = norms[:, 0] > 0
+            centroids[non_empty] = sums[non_empty] / norms[non_empty]
+
+        self._set_lists(centroids, _assign(vectors, centroids))
+
+    def _set_lists(self, centroids: np.ndarray, assignments: np.ndarray) -> None:
+        self.centroids = centroids.astype(np.float32)
+        self._list_rows = np.argsort(assignments, kind="stable").astype(np.int64)
+        self._list_offsets = np.searchsorted(
+            assignments[self._list_rows], np.arange(len(centroids) + 1)
+        )
+        self.num_rows = len(assignments)
+
+    def candidates(self, query: np.ndarray, num_candidates: int) -> np.ndarray:
+        """
+        Devuelve las filas de los `nprobe` grupos más cercanos a la consulta.
+        `num_candidates` no se usa: el IVF siempre devuelve grupos completos.
+        """
+        nprobe = min(self.nprobe, len(self.centroids))
+        probes = np.argpartition(-(self.centroids @ query), nprobe - 1)[:nprobe]
+        return np.concatenate(
+            [
+                self._list_rows[
+                    self._list_offsets[probe] : self._list_offsets[probe + 1]
+                ]
+                for probe in probes
+            ]
+        )
+
+    def save(self, path: Path) -> None:
+        assignments = np.empty(self.num_rows, dtype=np.int32)
+        for list_id in range(len(self.centroids)):
+            start, stop = self._list_offsets[list_id], self._list_offsets[list_id + 1]
+            assignments[self._list_rows[start:stop]] = list_id
+        np.savez(path, centroids=self.centroids, assignments=assignments)
+
+    def load(self, path: Path) -> None:
+        with np.load(path) as data:
+            self._set_lists(data["centroids"], data["assignments"])
+
+
+class HNSWIndex:
+    """
+    Grafo HNSW sobre vectores normalizados, mediante `hnswlib`.
+
+    Parámetros:
+    -----------
+    m : int, opcional
+        Número de conexiones por nodo (por defecto es 16).
+    ef_construction : int, opcional
+        Tamaño de la lista de candidatos durante la construcción (por defecto es 200).
+    ef_search : int, opcional
+        Tamaño mínimo de la lista de candidatos durante la búsqueda (por defecto es 64).
+    """
+
+    def __init__(
+        self, m: int = 16, ef_construction: int = 200, ef_search: int = 64
+    ) -> None:
+        import hnswlib
+
+        self._hnswlib = hnswlib
+        self._m = m
+        self._ef_construction = ef_construction
+        self.ef_search = ef_search
+        self._index = None
+        self.num_rows = 0
+
+    def build(self, vectors: np.ndarray) -> None:
+        """
+        Construye el grafo con todas las filas de `vectors`.
+        """
+        num_rows, dim = vectors.shape
+        self._index = self._hnswlib.Index(space="ip", dim=dim)
+        self._index.init_index(
+            max_elements=num_rows, ef_construction=self._ef_construction, M=self._m
+        )
+        for start in range(0, num_rows, _ASSIGN_BLOCK_SIZE):
+            block = np.asarray(
+                vectors[start : start + _ASSIGN_BLOCK_SIZE], dtype=np.float32
+            )
+            self._index.add_items(block, np.arange(start, start + len(block)))
+        self.num_rows = num_rows
+
+    def candidates(self, query: np.ndarray, num_candidates: int) -> np.ndarray:
+        """
+        Devuelve las `num_candidates` filas más cercanas según el grafo.
+        """
+        num_candidates = min(num_candidates, self.num_rows)
+        self._index.set_ef(max(self.ef_search, num_candidates))
+        labels, _ = self._index.knn_query(query, k=num_candidates)
+        return labels[0].astype(np.int64)
+
+    def save(self, path: Path) -> None:
+        self._index.save_index(str(path))
+
+    def load(self, path: Path, dim: int, num_rows: int) -> None:
+        self._index = self._hnswlib.Index(space="ip", dim=dim)
+        self._index.load_index(str(path), max_elements=num_rows)
+        self.num_rows = num_rows
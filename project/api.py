@@ -0,0 +1,180 @@
+"""
+Módulo: api.py
+
+Servicio HTTP (FastAPI) que expone el flujo de búsqueda a otros servicios:
+- `POST /retrieve`: recuperación de documentos con umbral de confianza, sin LLM.
+- `POST /search`: flujo completo (detección del idioma, transformación de la query,
+  recuperación, filtro de relevancia y respuesta). Con `"stream": true`, la
+  respuesta se envía como server-sent events a medida que el modelo la genera.
+- `GET /metrics`: métricas en el formato de Prometheus.
+- `GET /health`: comprobación de estado.
+
+Las recuperaciones de peticiones simultáneas se agrupan con `RetrievalBatcher`, de
+modo que sus embeddings se calculan en una sola pasada del modelo.
+
+Uso (desde el directorio `project`):
+    python api.py
+    uvicorn api:app --host 0.0.0.0 --port 8080
+"""
+
+import json
+from contextlib import asynccontextmanager
+from typing import List
+
+from config import settings
+from doc_list import DocListResponse
+from fastapi import FastAPI
+from fastapi.responses import PlainTextResponse, StreamingResponse
+from metrics import render_prometheus
+from micro_batcher import RetrievalBatcher
+from pydantic import BaseModel, Field
+from resources import (
+    get_shared_language_detection_model,
+    get_shared_llm,
+    get_shared_retriever,
+    warm_up,
+)
+from response_maker import arun_response_maker, stream_response_maker
+from search_pipeline import SearchResult, prepare_search
+from starlette.concurrency import iterate_in_threadpool
+
+
+class RetrieveRequest(BaseModel):
+    """
+    Petición de `/retrieve`.
+
+    Atributos:
+    ----------
+    query : str
+        El texto de la consulta (se usa tal cual, sin transformarla).
+    """
+
+    query: str = Field(min_length=1)
+
+
+class RetrieveResponse(BaseModel):
+    """
+    Respuesta de `/retrieve`.
+
+    Atributos:
+    ----------
+    query : str
+        La consulta.
+    documents : List[DocListResponse]
+        Los documentos recuperados que superan el umbral de confianza.
+    """
+
+    query: str
+    documents: List[DocListResponse]
+
+
+class SearchRequest(BaseModel):
+    """
+    Petición de `/search`.
+
+    Atributos:
+    ----------
+    query : str
+        La consulta original del usuario.
+    stream : bool
+        Si es True, la respuesta se envía como server-sent events.
+    """
+
+    query: str = Field(min_length=1)
+    stream: bool = False
+
+
+def _sse_event(event: str, data) -> str:
+    return f"event: {event}\ndata: {json.dumps(data, ensure_ascii=False)}\n\n"
+
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    # Load every model before accepting requests
+    warm_up()
+    app.state.batcher = RetrievalBatcher(get_shared_retriever())
+    yield
+    await app.state.batcher.close()
+
+
+app = FastAPI(title="HyDE-RAG search service", lifespan=lifespan)
+
+
+@app.post("/retrieve", response_model=RetrieveResponse)
+async def retrieve(request: RetrieveRequest) -> RetrieveResponse:
+    """
+    Recupera los documentos de una consulta, agrupada con las peticiones
+    simultáneas.
+    """
+    documents = await app.state.batcher.query_with_confidence(request.query)
+    return RetrieveResponse(query=request.query, documents=documents)
+
+
+@app.post("/search", response_model=SearchResult)
+async def search(request: SearchRequest):
+    """
+    Ejecuta el flujo de búsqueda completo. Con `stream`, envía los eventos:
+    - "documents": el resultado de la búsqueda sin la respuesta.
+    - "token": cada fragmento de la respuesta.
+    - "done": fin de la respuesta.
+    """
+    llm = get_shared_llm()
+    result = await prepare_search(
+        request.query,
+        llm,
+        get_shared_retriever(),
+        get_shared_language_detection_model(),
+        retrieve_documents=app.state.batcher.query_with_confidence,
+    )
+
+    if not request.stream:
+        result.response = await arun_response_maker(
+            result.transformed_query, result.detected_language, result.documents, llm
+        )
+        return result
+
+    async def _events():
+        yield _sse_event("documents", result.model_dump())
+        # stream_response_maker blocks on the model: iterate it off the event loop
+        async for delta in iterate_in_threadpool(
+            stream_response_maker(
+                result.transformed_query,
+                result.detected_language,
+                result.documents,
+                llm,
+            )
+        ):
+            yield _sse_event("token", delta)
+        yield _sse_event("done", {})
+
+    return StreamingResponse(
+        _events(),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+    )
+
+
+@app.get("/metrics", response_class=PlainTextResponse)
+async def metrics() -> str:
+    """
+    Devuelve las métricas del proceso en el formato de texto de Prometheus.
+    """
+    return render_prometheus()
+
+
+@app.get("/health")
+async def health() -> dict:
+    """
+    Comprobación de estado del servicio.
+    """
+    return {"status": "ok"}
+
+
+def main():
+    import uvicorn
+
+    uvicorn.run(app, host=settings.API_HOST, port=settings.API_PORT)
+
+
+if __name__ == "__main__":
+    main()
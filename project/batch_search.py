@@ -0,0 +1,385 @@
+"""
+Módulo: batch_search.py
+
+Módulo para ejecutar muchas búsquedas a la vez (por ejemplo, trabajos nocturnos de
+mapeo de la literatura con miles de consultas).
+
+Las consultas se procesan en lotes: los embeddings de cada lote se calculan en una
+sola pasada del modelo, las búsquedas se resuelven de forma vectorizada cuando el
+almacén lo permite y el umbral de confianza se aplica a todo el lote de una vez. Los
+resultados se escriben en JSONL o Parquet a medida que se completan, y opcionalmente
+cada resultado se procesa con un LLM con un número acotado de llamadas simultáneas.
+
+Uso:
+    python batch_search.py consultas.txt resultados.jsonl [--respond]
+"""
+
+import argparse
+import asyncio
+import json
+from itertools import islice
+from pathlib import Path
+from typing import Any, Awaitable, Callable, Iterable, Iterator, List, Optional
+
+import numpy as np
+from config import settings
+from doc_list import DocListResponse, build_doc_list_response
+from pydantic import BaseModel
+
+PostProcess = Callable[[str, List[DocListResponse]], Awaitable[Any]]
+
+
+class BatchSearchResult(BaseModel):
+    """
+    Resultado de una consulta de una búsqueda por lotes.
+
+    Atributos:
+    ----------
+    query : str
+        La consulta.
+    documents : List[DocListResponse]
+        Los documentos recuperados que superan el umbral de confianza.
+    post_processed : Any, opcional
+        El resultado del post-procesado con LLM, si se ha solicitado.
+    error : str, opcional
+        El error del post-procesado, si ha fallado.
+    """
+
+    query: str
+    documents: List[DocListResponse]
+    post_processed: Optional[Any] = None
+    error: Optional[str] = None
+
+
+def filter_by_confidence(
+    doc_lists: List[List[DocListResponse]], threshold: Optional[float] = None
+) -> List[List[DocListResponse]]:
+    """
+    Aplica el umbral de confianza a las listas de documentos de todas las consultas
+    con una única comparación vectorizada.
+
+    Parámetros:
+    -----------
+    doc_lists : list
+        Lista de documentos de cada consulta.
+    threshold : float, opcional
+        Similitud mínima (por defecto, `settings.RETRIEVER_CONFIDENCE_THRESHOLD`).
+
+    Devuelve:
+    --------
+    list
+        Las listas de documentos filtradas.
+    """
+    threshold = (
+        settings.RETRIEVER_CONFIDENCE_THRESHOLD if threshold is None else threshold
+    )
+
+    lengths = [len(docs) for docs in doc_lists]
+    similarities = np.fromiter(
+        (doc.similarity for docs in doc_lists for doc in docs),
+        dtype=np.float64,
+        count=sum(lengths),
+    )
+    keep = similarities >= threshold
+
+    filtered = []
+    start = 0
+    for docs, length in zip(doc_lists, lengths):
+        filtered.append(
+            [doc for doc, kept in zip(docs, keep[start : start + length]) if kept]
+        )
+        start += length
+    return filtered
+
+
+def batch_retrieve(
+    query_strs: List[str], retriever, threshold: Optional[float] = None
+) -> List[BatchSearchResult]:
+    """
+    Recupera los documentos de un lote de consultas con `retriever.retrieve_many`.
+
+    Parámetros:
+    -----------
+    query_strs : list
+        Textos de las consultas.
+    retriever : VectorDBRetriever
+        El recuperador de documentos.
+    threshold : float, opcional
+        Similitud mínima (por defecto, `settings.RETRIEVER_CONFIDENCE_THRESHOLD`).
+
+    Devuelve:
+    --------
+    List[BatchSearchResult]
+        Un resultado por consulta, en el mismo orden.
+    """
+    node_lists = retriever.retrieve_many(query_strs)
+    doc_lists = filter_by_confidence(
+        [build_doc_list_response(nodes) for nodes in node_lists], threshold
+    )
+    return [
+        BatchSearchResult(query=query_str, documents=docs)
+        for query_str, docs in zip(query_strs, doc_lists)
+    ]
+
+
+async def apost_process(
+    results: List[BatchSearchResult],
+    process: PostProcess,
+    max_in_flight: Optional[int] = None,
+) -> List[BatchSearchResult]:
+    """
+    Post-procesa los resultados con un LLM de forma concurrente, con un número
+    acotado de llamadas simultáneas. Un fallo se registra en el campo `error` del
+    resultado y no detiene el resto del lote.
+
+    Parámetros:
+    -----------
+    results : list
+        Resultados a post-procesar. Se modifican en el sitio.
+    process : callable
+        Corrutina que recibe la consulta y sus documentos (por ejemplo, una llamada
+        a `arun_response_maker`).
+    max_in_flight : int, opcional
+        Número máximo de llamadas simultáneas
+        (por defecto, `settings.BATCH_SEARCH_MAX_IN_FLIGHT`).
+
+    Devuelve:
+    --------
+    List[BatchSearchResult]
+        Los mismos resultados, post-procesados.
+    """
+    semaphore = asyncio.Semaphore(max_in_flight or settings.BATCH_SEARCH_MAX_IN_FLIGHT)
+
+    async def _process(result):
+        async with semaphore:
+            try:
+                result.post_processed = await process(result.query, result.documents)
+            except Exception as exc:
+                result.error = f"{type(exc).__name__}: {exc}"
+
+    await asyncio.gather(*(_process(result) for result in results))
+    return results
+
+
+def iter_batch_search(
+    query_strs: Iterable[str],
+    retriever,
+    post_process: Optional[PostProcess] = None,
+    batch_size: Optional[int] = None,
+    max_in_flight: Optional[int] = None,
+    threshold: Optional[float] = None,
+) -> Iterator[List[BatchSearchResult]]:
+    """
+    Ejecuta la búsqueda por lotes de forma perezosa, lote a lote.
+
+    Parámetros:
+    -----------
+    query_strs : iterable
+        Textos de las consultas. Se leen de lote en lote, sin cargarlos todos.
+    retriever : VectorDBRetriever
+        El recuperador de documentos.
+    post_process : callable, opcional
+        Corrutina de post-procesado de cada resultado (ver `apost_process`).
+    batch_size : int, opcional
+        Consultas por lote (por defecto, `settings.BATCH_SEARCH_SIZE`).
+    max_in_flight : int, opcional
+        Llamadas simultáneas de post-procesado.
+    threshold : float, opcional
+        Similitud mínima de los documentos.
+
+    Devuelve:
+    --------
+    generator
+        Un generador con la lista de resultados de cada lote.
+    """
+    from search_pipeline import run_coroutine
+
+    batch_size = batch_size or settings.BATCH_SEARCH_SIZE
+    query_iterator = iter(query_strs)
+
+    while True:
+        batch = [query_str.strip() for query_str in islice(query_iterator, batch_size)]
+        batch = [query_str for query_str in batch if query_str]
+        if not batch:
+            return
+
+        results = batch_retrieve(batch, retriever, threshold)
+        if post_process is not None:
+            run_coroutine(apost_process(results, post_process, max_in_flight))
+        yield results
+
+
+class BatchResultWriter:
+    """
+    Escribe resultados de búsquedas por lotes en JSONL o Parquet, según la
+    extensión del fichero. Parquet requiere `pyarrow`.
+
+    Parámetros:
+    -----------
+    path : Path
+        Ruta del fichero de salida (.jsonl o .parquet).
+    """
+
+    def __init__(self, path: Path) -> None:
+        self.path = Path(path)
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        self._file = None
+        self._parquet_writer = None
+
+        if self.path.suffix == ".parquet":
+            try:
+                import pyarrow as pa
+                import pyarrow.parquet as pq
+            except ImportError as exc:
+                raise ImportError("Writing Parquet files requires pyarrow.") from exc
+
+            self._pa = pa
+            self._schema = pa.schema(
+                [
+                    ("query", pa.string()),
+                    (
+                        "documents",
+                        pa.list_(
+                            pa.struct(
+                                [
+                                    ("index", pa.int64()),
+                                    ("title", pa.string()),
+                                    ("abstract", pa.string()),
+                                    ("source_id", pa.string()),
+                                    ("similarity", pa.float64()),
+                                ]
+                            )
+                        ),
+                    ),
+                    ("post_processed", pa.string()),
+                    ("error", pa.string()),
+                ]
+            )
+            self._parquet_writer = pq.ParquetWriter(str(self.path), self._schema)
+        elif self.path.suffix == ".jsonl":
+            self._file = open(self.path, "w", encoding="utf-8")
+        else:
+            raise ValueError(f"Unsupported output format: {self.path.suffix}")
+
+    def write(self, results: List[BatchSearchResult]) -> None:
+        """
+        Escribe un lote de resultados.
+        """
+        if self._file is not None:
+            for result in results:
+                self._file.write(result.model_dump_json() + "\n")
+            self._file.flush()
+            return
+
+        rows = []
+        for result in results:
+            row = result.model_dump()
+            # Free-form LLM output is stored as JSON text to keep the schema fixed
+            if row["post_processed"] is not None:
+                row["post_processed"] = json.dumps(
+                    row["post_processed"], ensure_ascii=False
+                )
+            rows.append(row)
+        self._parquet_writer.write_table(
+            self._pa.Table.from_pylist(rows, schema=self._schema)
+        )
+
+    def close(self) -> None:
+        """
+        Cierra el fichero de salida.
+        """
+        if self._file is not None:
+            self._file.close()
+        if self._parquet_writer is not None:
+            self._parquet_writer.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+
+def run_batch_search(
+    query_strs: Iterable[str],
+    retriever,
+    output_path: Path,
+    post_process: Optional[PostProcess] = None,
+    batch_size: Optional[int] = None,
+    max_in_flight: Optional[int] = None,
+) -> int:
+    """
+    Ejecuta una búsqueda por lotes y escribe los resultados en `output_path`
+    (JSONL o Parquet) a medida que se completa cada lote.
+
+    Parámetros:
+    -----------
+    query_strs : iterable
+        Textos de las consultas.
+    retriever : VectorDBRetriever
+        El recuperador de documentos.
+    output_path : Path
+        Fichero de salida (.jsonl o .parquet).
+    post_process : callable, opcional
+        Corrutina de post-procesado de cada resultado (ver `apost_process`).
+    batch_size : int, opcional
+        Consultas por lote (por defecto, `settings.BATCH_SEARCH_SIZE`).
+    max_in_flight : int, opcional
+        Llamadas simultáneas de post-procesado.
+
+    Devuelve:
+    --------
+    int
+        El número de consultas procesadas.
+    """
+    total = 0
+    with BatchResultWriter(output_path) as writer:
+        for results in iter_batch_search(
+            query_strs, retriever, post_process, batch_size, max_in_flight
+        ):
+            writer.write(results)
+            total += len(results)
+            print(f"Processed {total} queries...")
+    return total
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Run many research queries in batch.")
+    parser.add_argument("queries", type=Path, help="Text file with one query per line.")
+    parser.add_argument("output", type=Path, help="Output file (.jsonl or .parquet).")
+    parser.add_argument(
+        "--respond",
+        action="store_true",
+        help="Generate an LLM answer for every query from its documents.",
+    )
+    args = parser.parse_args()
+
+    from resources import (
+        get_shared_language_detection_model,
+        get_shared_llm,
+        get_shared_retriever,
+    )
+
+    post_process = None
+    if args.respond:
+        from language_engine import detect_language
+        from response_maker import arun_response_maker
+
+        llm = get_shared_llm()
+        language_detection_model = get_shared_language_detection_model()
+
+        async def post_process(query_str, documents):
+            language = await asyncio.to_thread(
+                detect_language, query_str, language_detection_model
+            )
+            return await arun_response_maker(query_str, language, documents, llm)
+
+    with open(args.queries, "r", encoding="utf-8") as queries_file:
+        total = run_batch_search(
+            queries_file, get_shared_retriever(), args.output, post_process
+        )
+    print(f"Wrote {total} results to {args.output}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,10 @@
+"""
+Paquete: benchmarks
+
+Pruebas de rendimiento reproducibles que se ejecutan sin conexión: las etapas con LLM
+se sustituyen por un cliente simulado y, por defecto, los embeddings se calculan con
+un modelo determinista por hashing de palabras. Se ejecutan desde el directorio
+`project`:
+
+    python -m benchmarks.latency --sizes 1000 10000 --concurrency 1 8
+"""
@@ -0,0 +1,407 @@
+"""
+Módulo: benchmarks/common.py
+
+Utilidades compartidas por las pruebas de rendimiento:
+- Un corpus fijo de documentos de arXiv: una muestra reproducible del fichero
+  configurado en `ARXIV_SNAPSHOT_PATH` o, si no hay fichero, documentos sintéticos
+  agrupados por temas.
+- Un modelo de embeddings determinista (`HashingEmbedding`) y un cliente de LLM
+  simulado (`StubLLMClient`), para medir sin red ni GPU.
+- La construcción de un almacén vectorial aislado en un directorio temporal.
+- Percentiles de latencia y memoria residente máxima del proceso.
+"""
+
+import re
+import resource
+import sys
+import time
+import zlib
+from pathlib import Path
+from typing import Dict, List
+
+import numpy as np
+from config import settings
+from llama_index.core.embeddings import BaseEmbedding
+from pydantic import PrivateAttr
+
+_WORD_PATTERN = re.compile(r"[a-z0-9]+")
+
+# Vocabulary of the synthetic corpus: one group of terms per category
+_SYNTHETIC_TOPICS = {
+    "cs.CL": "language model translation token corpus parsing dialogue summarization",
+    "cs.CV": "image segmentation detection convolutional pixel video recognition camera",
+    "cs.LG": "gradient optimization generalization regularization training loss kernel",
+    "math.CO": "graph combinatorial permutation coloring partition matroid enumeration",
+    "hep-th": "string gauge duality brane supersymmetry holographic anomaly field",
+    "astro-ph": "galaxy stellar redshift cosmological supernova telescope dark halo",
+    "q-bio": "protein gene expression cell sequencing evolution neural tissue",
+    "cond-mat": "superconducting lattice spin phase magnetic quantum electron transition",
+}
+_SYNTHETIC_FILLER = (
+    "we propose study novel method results show approach analysis present new framework "
+    "based using model data performance experiments demonstrate effective significant"
+).split()
+
+
+def generate_synthetic_documents(num_docs: int, seed: int = 0) -> List[dict]:
+    """
+    Genera documentos sintéticos con el formato de `data_loader.parse_document_line`.
+
+    Cada documento pertenece a una categoría y su título y resumen mezclan términos
+    de esa categoría con palabras de relleno, de modo que los documentos de una misma
+    categoría son parecidos entre sí.
+
+    Parámetros:
+    -----------
+    num_docs : int
+        Número de documentos.
+    seed : int, opcional
+        Semilla del generador (por defecto es 0).
+
+    Devuelve:
+    --------
+    List[dict]
+        Los documentos generados.
+    """
+    rng = np.random.default_rng(seed)
+    categories = sorted(_SYNTHETIC_TOPICS)
+    topic_words = {
+        category: _SYNTHETIC_TOPICS[category].split() for category in categories
+    }
+
+    documents = []
+    for index in range(num_docs):
+        category = categories[rng.integers(len(categories))]
+        words = topic_words[category]
+        title = " ".join(rng.choice(words, size=5)).capitalize()
+        abstract_words = np.where(
+            rng.random(120) < 0.4,
+            rng.choice(words, size=120),
+            rng.choice(_SYNTHETIC_FILLER, size=120),
+        )
+        abstract = " ".join(abstract_words).capitalize() + "."
+        source = f"synthetic.{index:07d}"
+        documents.append(
+            {
+                "text": title + "\n\n" + abstract,
+                "metadata": {"source": source, "title": title, "abstract": abstract},
+                "categories": [category],
+                "index": index,
+            }
+        )
+    return documents
+
+
+def sample_snapshot_documents(num_docs: int, seed: int = 0) -> List[dict]:
+    """
+    Toma una muestra reproducible de `num_docs` documentos del fichero de arXiv.
+
+    Parámetros:
+    -----------
+    num_docs : int
+        Número de documentos.
+    seed : int, opcional
+        Semilla de la muestra (por defecto es 0).
+
+    Devuelve:
+    --------
+    List[dict]
+        Los documentos, en el orden del fichero.
+    """
+    from data_loader import ArxivSnapshot
+
+    with ArxivSnapshot(str(settings.ARXIV_SNAPSHOT_PATH)) as snapshot:
+        num_docs = min(num_docs, len(snapshot))
+        rng = np.random.default_rng(seed)
+        indexes = np.sort(rng.choice(len(snapshot), size=num_docs, replace=False))
+        return [snapshot[int(index)] for index in indexes]
+
+
+def load_corpus(num_docs: int, seed: int = 0, source: str = "auto") -> List[dict]:
+    """
+    Devuelve el corpus fijo de una prueba.
+
+    Parámetros:
+    -----------
+    num_docs : int
+        Número de documentos.
+    seed : int, opcional
+        Semilla (por defecto es 0).
+    source : str, opcional
+        "snapshot" (muestra del fichero de arXiv), "synthetic" o "auto" (el fichero
+        si `ARXIV_SNAPSHOT_PATH` existe y, si no, documentos sintéticos).
+
+    Devuelve:
+    --------
+    List[dict]
+        Los documentos.
+    """
+    if source == "auto":
+        snapshot_path = settings.ARXIV_SNAPSHOT_PATH
+        source = (
+            "snapshot"
+            if snapshot_path and Path(snapshot_path).exists()
+            else "synthetic"
+        )
+    if source == "snapshot":
+        return sample_snapshot_documents(num_docs, seed)
+    if source == "synthetic":
+        return generate_synthetic_documents(num_docs, seed)
+    raise ValueError(f"Unknown corpus source: {source}")
+
+
+class HashingEmbedding(BaseEmbedding):
+    """
+    Modelo de embeddings determinista y sin dependencias: cada palabra se proyecta
+    con hashing en una dimensión con signo y el vector se normaliza. Conserva la
+    similitud léxica entre textos, suficiente para medir el rendimiento del
+    almacén y el recuperador sin cargar un modelo real.
+
+    Parámetros:
+    -----------
+    embed_dim : int, opcional
+        Dimensión de los vectores (por defecto es 384, la de bge-small-en).
+    """
+
+    _embed_dim: int = PrivateAttr()
+
+    def __init__(self, embed_dim: int = 384, **kwargs) -> None:
+        super().__init__(model_name="hashing", **kwargs)
+        self._embed_dim = embed_dim
+
+    def _embed(self, text: str) -> List[float]:
+        vector = np.zeros(self._embed_dim, dtype=np.float32)
+        for word in _WORD_PATTERN.findall(text.lower()):
+            code = zlib.crc32(word.encode("utf-8"))
+            vector[code % self._embed_dim] += 1.0 if code & 0x80000000 else -1.0
+        norm = np.linalg.norm(vector)
+        if norm > 0:
+            vector /= norm
+        return vector.tolist()
+
+    def _get_query_embedding(self, query: str) -> List[float]:
+        return self._embed(query)
+
+    async def _aget_query_embedding(self, query: str) -> List[float]:
+        return self._embed(query)
+
+    def _get_text_embedding(self, text: str) -> List[float]:
+        return self._embed(text)
+
+    def _get_text_embeddings(self, texts: List[str]) -> List[List[float]]:
+        return [self._embed(text) for text in texts]
+
+
+def get_benchmark_embedding_model(name: str = "hashing"):
+    """
+    Devuelve el modelo de embeddings de una prueba: "hashing" (`HashingEmbedding`) o
+    "configured" (el modelo real de `EMBED_MODEL_NAME`).
+    """
+    if name == "hashing":
+        return HashingEmbedding()
+    if name == "configured":
+        from embedding_setup import get_embedding_model
+
+        return get_embedding_model()
+    raise ValueError(f"Unknown benchmark embedding model: {name}")
+
+
+class StubLLMClient:
+    """
+    Cliente de LLM simulado con la interfaz de `LLMGateway` (`complete`, `acomplete`
+    y `stream`). Devuelve una respuesta fija tras `latency` segundos; con un
+    `response_format`, un objeto vacío válido de ese modelo.
+
+    Parámetros:
+    -----------
+    latency : float, opcional
+        Segundos de espera simulados por llamada (por defecto es 0).
+    """
+
+    model = "stub"
+
+    def __init__(self, latency: float = 0.0) -> None:
+        self.latency = latency
+        self.calls = 0
+
+    def _respond(self, messages, response_format):
+        self.calls += 1
+        if self.latency:
+            time.sleep(self.latency)
+        if response_format is not None:
+            # Every structured output of the pipeline is a model with a single list field
+            field_name = next(iter(response_format.model_fields))
+            return response_format(**{field_name: []})
+        from llm_gateway import to_openai_messages
+
+        return "Stub response for: " + to_openai_messages(messages)[-1]["content"][:80]
+
+    def complete(
+        self,
+        messages,
+        model=None,
+        response_format=None,
+        timeout=None,
+        temperature=None,
+        max_retries=None,
+    ):
+        return self._respond(messages, response_format)
+
+    async def acomplete(
+        self,
+        messages,
+        model=None,
+        response_format=None,
+        timeout=None,
+        temperature=None,
+        max_retries=None,
+    ):
+        return self._respond(messages, response_format)
+
+    def stream(self, messages, model=None, timeout=None, temperature=None):
+        yield self._respond(messages, None)
+
+
+def install_stub_llm(latency: float = 0.0) -> StubLLMClient:
+    """
+    Sustituye los backends de LLM de todas las etapas por un `StubLLMClient`, de modo
+    que ninguna prueba llama a la API de OpenAI ni carga un modelo local.
+    """
+    import llm_setup
+
+    stub = StubLLMClient(latency)
+    llm_setup.get_llm_gateway = lambda: stub
+    llm_setup.get_local_llm = lambda: stub
+    return stub
+
+
+# Settings that build_isolated_store points at its working directory
+ISOLATED_STORE_SETTINGS = (
+    "DATABASE_PATH",
+    "LOCAL_VECTOR_STORE_PATH",
+    "DOCUMENT_STORE_BACKEND",
+    "DOCUMENT_STORE_PATH",
+)
+
+
+def reset_document_store() -> None:
+    """
+    Cierra la tabla de documentos compartida y la descarta, de modo que la siguiente
+    llamada a `get_document_store` la abre con la configuración actual.
+    """
+    from document_store import get_document_store
+
+    if get_document_store.cache_info().currsize:
+        get_document_store().close()
+    get_document_store.cache_clear()
+
+
+def build_isolated_store(documents: List[dict], embed_model, work_dir: Path) -> dict:
+    """
+    Ingiere `documents` en un almacén vectorial nuevo dentro de `work_dir` (con el
+    backend de `VECTOR_STORE_BACKEND`) y mide cada fase de la ingesta:
+    `chunk_documents`, `create_nodes` y `embed_and_add_nodes`.
+
+    Los parámetros de `ISOLATED_STORE_SETTINGS` quedan apuntando a `work_dir`: quien
+    la llama debe restaurarlos si el proceso sigue usándolos.
+
+    Parámetros:
+    -----------
+    documents : list
+        Documentos a ingerir.
+    embed_model : object
+        Modelo de embeddings.
+    work_dir : Path
+        Directorio de trabajo (almacén vectorial y tabla de documentos).
+
+    Devuelve:
+    --------
+    dict
+        Diccionario con 'collection', 'vector_store', 'num_chunks' y 'timings'
+        (segundos de cada fase).
+    """
+    import document_store
+    from vector_store_setup import (
+        chunk_documents,
+        create_nodes,
+        create_vector_store,
+        embed_and_add_nodes,
+    )
+
+    work_dir = Path(work_dir)
+    settings.DATABASE_PATH = work_dir / "chroma"
+    settings.LOCAL_VECTOR_STORE_PATH = work_dir / "local_store"
+    settings.DOCUMENT_STORE_BACKEND = "sqlite"
+    settings.DOCUMENT_STORE_PATH = work_dir / "documents.sqlite"
+    reset_document_store()
+
+    collection, vector_store = create_vector_store()
+    document_store.get_document_store().put_many(doc["metadata"] for doc in documents)
+
+    timings = {}
+    start = time.perf_counter()
+    text_chunks, doc_idxs = chunk_documents(documents)
+    timings["chunk_documents"] = time.perf_counter() - start
+
+    start = time.perf_counter()
+    nodes = create_nodes(documents, text_chunks, doc_idxs)
+    timings["create_nodes"] = time.perf_counter() - start
+
+    start = time.perf_counter()
+    embed_and_add_nodes(nodes, embed_model, vector_store)
+    timings["embed_and_add_nodes"] = time.perf_counter() - start
+
+    return {
+        "collection": collection,
+        "vector_store": vector_store,
+        "num_chunks": len(nodes),
+        "timings": timings,
+    }
+
+
+def summarize_latencies(latencies: List[float]) -> Dict[str, float]:
+    """
+    Resume una lista de latencias (en segundos) con la media y los percentiles 50,
+    95 y 99, en milisegundos.
+    """
+    values = np.asarray(latencies, dtype=np.float64) * 1000.0
+    if not len(values):
+        return {"mean_ms": 0.0, "p50_ms": 0.0, "p95_ms": 0.0, "p99_ms": 0.0}
+    p50, p95, p99 = np.percentile(values, [50, 95, 99])
+    return {
+        "mean_ms": float(values.mean()),
+        "p50_ms": float(p50),
+        "p95_ms": float(p95),
+        "p99_ms": float(p99),
+    }
+
+
+def peak_rss_mb() -> float:
+    """
+    Devuelve la memoria residente máxima alcanzada por el proceso, en MB.
+    """
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # ru_maxrss is in bytes on macOS and in kilobytes elsewhere
+    return peak / (1024 * 1024) if sys.platform == "darwin" else peak / 1024
+
+
+def settings_snapshot(*names: str) -> Dict[str, str]:
+    """
+    Devuelve los valores de los parámetros de configuración indicados, para
+    guardarlos junto a los resultados de una prueba.
+    """
+    return {name: str(getattr(settings, name)) for name in names}
+
+
+def get_query_documents(
+    documents: List[dict], num_queries: int, seed: int = 0
+) -> List[dict]:
+    """
+    Elige de forma reproducible los documentos cuyos títulos se usan como consultas.
+    """
+    rng = np.random.default_rng(seed + 1)
+    num_queries = min(num_queries, len(documents))
+    return [
+        documents[int(index)]
+        for index in rng.choice(len(documents), num_queries, replace=False)
+    ]
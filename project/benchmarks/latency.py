@@ -0,0 +1,362 @@
+"""
+Módulo: benchmarks/latency.py
+
+Prueba de rendimiento de la ingesta y de la latencia de las consultas.
+
+Para cada tamaño de corpus se construye un almacén vectorial nuevo en un directorio
+temporal y se mide:
+- El rendimiento de `chunk_documents`, `create_nodes` y `embed_and_add_nodes`.
+- La latencia (media y percentiles 50, 95 y 99) y el rendimiento de
+  `VectorDBRetriever._retrieve` y `query_with_confidence` con distintos niveles de
+  concurrencia.
+- La memoria residente máxima. Cada tamaño se ejecuta en un proceso nuevo, de modo
+  que la medida no arrastra el máximo de los tamaños anteriores.
+
+Los resultados se guardan en JSON y se pueden comparar con una ejecución anterior
+guardada como referencia; la comparación falla si alguna métrica empeora más de la
+tolerancia indicada.
+
+Uso (desde el directorio `project`):
+    python -m benchmarks.latency --sizes 1000 10000 --concurrency 1 8 \\
+        --output results.json --baseline baseline.json
+"""
+
+import argparse
+import json
+import multiprocessing
+import platform
+import sys
+import tempfile
+import time
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+from pathlib import Path
+from typing import Callable, Dict, List
+
+from benchmarks.common import (
+    build_isolated_store,
+    get_benchmark_embedding_model,
+    get_query_documents,
+    install_stub_llm,
+    load_corpus,
+    peak_rss_mb,
+    settings_snapshot,
+    summarize_latencies,
+)
+from config import settings
+
+# Settings that change the benchmark results, stored with every run
+_RELEVANT_SETTINGS = (
+    "CHUNK_SIZE",
+    "CHUNK_OVERLAP",
+    "NODE_TOP_K",
+    "DOCUMENT_TOP_K",
+    "MAX_NODE_TOP_K",
+    "DOCUMENT_AGGREGATION",
+    "EMBED_MODEL_NAME",
+    "EMBED_BATCH_SIZE",
+    "VECTOR_STORE_BATCH_SIZE",
+    "VECTOR_STORE_BACKEND",
+    "LOCAL_STORE_QUANTIZATION",
+    "LOCAL_STORE_INDEX",
+    "RETRIEVAL_MODE",
+    "RETRIEVER_CONFIDENCE_THRESHOLD",
+)
+
+
+def measure_latencies(
+    function: Callable[[str], object], queries: List[str], concurrency: int
+) -> Dict[str, float]:
+    """
+    Ejecuta `function` para cada consulta con `concurrency` hilos y mide la latencia
+    de cada llamada.
+
+    Parámetros:
+    -----------
+    function : callable
+        Función que recibe el texto de una consulta.
+    queries : list
+        Textos de las consultas.
+    concurrency : int
+        Número de llamadas simultáneas.
+
+    Devuelve:
+    --------
+    dict
+        Latencias resumidas (`summarize_latencies`), número de consultas y
+        consultas por segundo.
+    """
+
+    def _timed_call(query_str):
+        start = time.perf_counter()
+        function(query_str)
+        return time.perf_counter() - start
+
+    start = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=concurrency) as executor:
+        latencies = list(executor.map(_timed_call, queries))
+    elapsed = time.perf_counter() - start
+
+    return {
+        **summarize_latencies(latencies),
+        "queries": len(queries),
+        "queries_per_second": len(queries) / elapsed if elapsed > 0 else 0.0,
+    }
+
+
+def run_corpus_benchmark(
+    num_docs: int,
+    embed_model,
+    concurrency_levels: List[int],
+    num_queries: int,
+    seed: int,
+    corpus_source: str,
+    work_dir: Path,
+) -> dict:
+    """
+    Ejecuta la prueba completa (ingesta y consultas) para un tamaño de corpus.
+
+    Devuelve:
+    --------
+    dict
+        Resultados de la ingesta, de las consultas y memoria máxima.
+    """
+    from confidence_filter import query_with_confidence
+    from llama_index.core import QueryBundle
+    from retriever import VectorDBRetriever
+
+    documents = load_corpus(num_docs, seed, corpus_source)
+    store = build_isolated_store(documents, embed_model, work_dir)
+    ingestion_seconds = sum(store["timings"].values())
+
+    retriever = VectorDBRetriever(
+        vector_store=store["vector_store"],
+        embed_model=embed_model,
+        query_mode=settings.QUERY_MODE,
+        node_top_k=settings.NODE_TOP_K,
+        document_top_k=settings.DOCUMENT_TOP_K,
+    )
+    queries = [
+        doc["metadata"]["title"]
+        for doc in get_query_documents(documents, num_queries, seed)
+    ]
+
+    # One untimed pass so that lazy loading does not count as query latency
+    for query_str in queries[:5]:
+        retriever._retrieve(QueryBundle(query_str))
+
+    query_results = []
+    for concurrency in concurrency_levels:
+        for name, function in (
+            ("retrieve", lambda query_str: retriever._retrieve(QueryBundle(query_str))),
+            (
+                "query_with_confidence",
+                lambda query_str: query_with_confidence(query_str, retriever),
+            ),
+        ):
+            result = measure_latencies(function, queries, concurrency)
+            query_results.append(
+                {"function": name, "concurrency": concurrency, **result}
+            )
+            print(
+                f"[{num_docs} docs] {name} x{concurrency}: "
+                f"p50={result['p50_ms']:.2f}ms p95={result['p95_ms']:.2f}ms "
+                f"p99={result['p99_ms']:.2f}ms ({result['queries_per_second']:.1f} q/s)"
+            )
+
+    return {
+        "corpus_size": len(documents),
+        "num_chunks": store["num_chunks"],
+        "ingestion": {
+            "seconds": store["timings"],
+            "documents_per_second": len(documents) / ingestion_seconds
+            if ingestion_seconds > 0
+            else 0.0,
+            "chunks_per_second": store["num_chunks"] / ingestion_seconds
+            if ingestion_seconds > 0
+            else 0.0,
+        },
+        "queries": query_results,
+        "peak_rss_mb": peak_rss_mb(),
+    }
+
+
+def _run_corpus_benchmark_process(
+    num_docs: int,
+    embed_model_name: str,
+    concurrency_levels: List[int],
+    num_queries: int,
+    seed: int,
+    corpus_source: str,
+) -> dict:
+    # Entry point of the per-size process: everything is created from scratch
+    install_stub_llm()
+    embed_model = get_benchmark_embedding_model(embed_model_name)
+    with tempfile.TemporaryDirectory(prefix="benchmark-") as work_dir:
+        return run_corpus_benchmark(
+            num_docs,
+            embed_model,
+            concurrency_levels,
+            num_queries,
+            seed,
+            corpus_source,
+            Path(work_dir),
+        )
+
+
+def compare_to_baseline(results: dict, baseline: dict, tolerance: float) -> List[str]:
+    """
+    Compara una ejecución con la de referencia.
+
+    Se comparan, para cada tamaño de corpus presente en ambas, el rendimiento de la
+    ingesta (fragmentos por segundo), la latencia p95 de cada función y nivel de
+    concurrencia y la memoria máxima.
+
+    Parámetros:
+    -----------
+    results : dict
+        Resultados de la ejecución actual.
+    baseline : dict
+        Resultados de referencia (el mismo formato).
+    tolerance : float
+        Empeoramiento relativo admitido (por ejemplo, 0.1 para un 10 %).
+
+    Devuelve:
+    --------
+    List[str]
+        Descripción de cada métrica que empeora más de la tolerancia.
+    """
+    regressions = []
+    baseline_runs = {run["corpus_size"]: run for run in baseline.get("runs", [])}
+
+    for run in results["runs"]:
+        reference = baseline_runs.get(run["corpus_size"])
+        if reference is None:
+            continue
+        size = run["corpus_size"]
+
+        current_rate = run["ingestion"]["chunks_per_second"]
+        reference_rate = reference["ingestion"]["chunks_per_second"]
+        if current_rate < reference_rate * (1 - tolerance):
+            regressions.append(
+                f"[{size} docs] ingestion: {current_rate:.1f} chunks/s "
+                f"(baseline {reference_rate:.1f})"
+            )
+
+        reference_queries = {
+            (query["function"], query["concurrency"]): query
+            for query in reference["queries"]
+        }
+        for query in run["queries"]:
+            reference_query = reference_queries.get(
+                (query["function"], query["concurrency"])
+            )
+            if reference_query is None:
+                continue
+            if query["p95_ms"] > reference_query["p95_ms"] * (1 + tolerance):
+                regressions.append(
+                    f"[{size} docs] {query['function']} x{query['concurrency']}: "
+                    f"p95 {query['p95_ms']:.2f}ms (baseline {reference_query['p95_ms']:.2f}ms)"
+                )
+
+        if run["peak_rss_mb"] > reference["peak_rss_mb"] * (1 + tolerance):
+            regressions.append(
+                f"[{size} docs] peak RSS: {run['peak_rss_mb']:.1f}MB "
+                f"(baseline {reference['peak_rss_mb']:.1f}MB)"
+            )
+    return regressions
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description="Benchmark ingestion and query latency."
+    )
+    parser.add_argument(
+        "--sizes", type=int, nargs="+", default=[1000], help="Corpus sizes (documents)."
+    )
+    parser.add_argument(
+        "--concurrency", type=int, nargs="+", default=[1, 8], help="Concurrent queries."
+    )
+    parser.add_argument(
+        "--queries", type=int, default=200, help="Queries per measurement."
+    )
+    parser.add_argument(
+        "--seed", type=int, default=0, help="Seed of the corpus and queries."
+    )
+    parser.add_argument(
+        "--corpus",
+        choices=["auto", "snapshot", "synthetic"],
+        default="auto",
+        help="Sample ARXIV_SNAPSHOT_PATH or generate synthetic documents.",
+    )
+    parser.add_argument(
+        "--embed-model",
+        choices=["hashing", "configured"],
+        default="hashing",
+        help="Deterministic hashing embeddings or the configured EMBED_MODEL_NAME.",
+    )
+    parser.add_argument(
+        "--output", type=Path, help="Write the results to this JSON file."
+    )
+    parser.add_argument(
+        "--baseline", type=Path, help="Compare against this results file."
+    )
+    parser.add_argument(
+        "--tolerance",
+        type=float,
+        default=0.1,
+        help="Allowed relative regression (0.1 = 10%%).",
+    )
+    args = parser.parse_args()
+
+    # ru_maxrss is a high-water mark of the whole process: measure every corpus size
+    # in a fresh (spawned, not forked) process so that each reports its own peak
+    runs = []
+    for num_docs in args.sizes:
+        with ProcessPoolExecutor(
+            max_workers=1, mp_context=multiprocessing.get_context("spawn")
+        ) as executor:
+            runs.append(
+                executor.submit(
+                    _run_corpus_benchmark_process,
+                    num_docs,
+                    args.embed_model,
+                    args.concurrency,
+                    args.queries,
+                    args.seed,
+                    args.corpus,
+                ).result()
+            )
+
+    results = {
+        "created_at": time.strftime("%Y-%m-%dT%H:%M:%S"),
+        "environment": {
+            "python": platform.python_version(),
+            "platform": platform.platform(),
+            "embed_model": args.embed_model,
+            "corpus": args.corpus,
+            "seed": args.seed,
+        },
+        "settings": settings_snapshot(*_RELEVANT_SETTINGS),
+        "runs": runs,
+    }
+
+    if args.output:
+        args.output.parent.mkdir(parents=True, exist_ok=True)
+        with open(args.output, "w", encoding="utf-8") as file:
+            json.dump(results, file, indent=2)
+        print(f"Results written to {args.output}")
+
+    if args.baseline:
+        with open(args.baseline, "r", encoding="utf-8") as file:
+            baseline = json.load(file)
+        regressions = compare_to_baseline(results, baseline, args.tolerance)
+        if regressions:
+            print("Regressions against the baseline:")
+            for regression in regressions:
+                print(f"  - {regression}")
+            sys.exit(1)
+        print("No regressions against the baseline.")
+
+
+if __name__ == "__main__":
+    main()
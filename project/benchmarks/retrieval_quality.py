@@ -0,0 +1,399 @@
+"""
+Módulo: benchmarks/retrieval_quality.py
+
+Evaluación sin conexión de la calidad de la recuperación frente a su coste.
+
+Se construyen pares consulta -> artículos relevantes a partir del propio corpus y,
+para cada configuración de recuperación (cualquier combinación de parámetros de
+`config.Settings`, como `CHUNK_SIZE`, `LOCAL_STORE_QUANTIZATION` o
+`LOCAL_STORE_INDEX`), se ingiere el corpus en un almacén nuevo y se mide:
+- Recall@k, MRR y nDCG@k de `VectorDBRetriever`.
+- La latencia de las consultas (percentiles 50 y 95).
+- El tamaño en disco del índice.
+Las configuraciones que no son superadas a la vez en calidad y en latencia forman
+la frontera de Pareto.
+
+Tipos de pares (`--pairs`):
+- "title": el título de un artículo indexado es la consulta y el artículo es el
+  único relevante (búsqueda de un elemento conocido).
+- "category": el título de un artículo que no se indexa es la consulta y son
+  relevantes los artículos indexados con su misma categoría principal.
+- Un fichero JSONL con líneas {"query": ..., "relevant": [ids]}, para usar pares
+  obtenidos de otras fuentes (por ejemplo, citas, que el fichero de arXiv no
+  incluye).
+
+Uso (desde el directorio `project`):
+    python -m benchmarks.retrieval_quality --docs 5000 \\
+        --config baseline \\
+        --config int8:LOCAL_STORE_QUANTIZATION=int8 \\
+        --config ivf:LOCAL_STORE_INDEX=ivf,LOCAL_STORE_QUANTIZATION=int8
+"""
+
+import argparse
+import json
+import tempfile
+import time
+from pathlib import Path
+from typing import Dict, List, Sequence, Tuple
+
+import numpy as np
+from benchmarks.common import (
+    ISOLATED_STORE_SETTINGS,
+    build_isolated_store,
+    get_benchmark_embedding_model,
+    get_query_documents,
+    install_stub_llm,
+    load_corpus,
+    reset_document_store,
+    summarize_latencies,
+)
+from config import settings
+from pydantic import TypeAdapter
+
+
+def build_title_pairs(documents: List[dict], num_queries: int, seed: int = 0):
+    """
+    Construye pares de búsqueda de un elemento conocido: el título de un documento
+    y su identificador.
+
+    Devuelve:
+    --------
+    tuple
+        Tupla (indexed_documents, pairs), donde `pairs` es una lista de tuplas
+        (query, relevant_sources).
+    """
+    pairs = [
+        (doc["metadata"]["title"], {doc["metadata"]["source"]})
+        for doc in get_query_documents(documents, num_queries, seed)
+    ]
+    return documents, pairs
+
+
+def build_category_pairs(documents: List[dict], num_queries: int, seed: int = 0):
+    """
+    Construye pares por categoría: se reservan `num_queries` documentos, que no se
+    indexan, y cada uno aporta su título como consulta y como relevantes los
+    documentos indexados con su misma categoría principal.
+
+    Devuelve:
+    --------
+    tuple
+        Tupla (indexed_documents, pairs).
+    """
+    held_out = get_query_documents(documents, num_queries, seed)
+    held_out_sources = {doc["metadata"]["source"] for doc in held_out}
+    indexed = [
+        doc for doc in documents if doc["metadata"]["source"] not in held_out_sources
+    ]
+
+    sources_by_category: Dict[str, set] = {}
+    for doc in indexed:
+        if doc["categories"]:
+            sources_by_category.setdefault(doc["categories"][0], set()).add(
+                doc["metadata"]["source"]
+            )
+
+    pairs = [
+        (doc["metadata"]["title"], sources_by_category.get(doc["categories"][0], set()))
+        for doc in held_out
+        if doc["categories"]
+    ]
+    return indexed, [(query, relevant) for query, relevant in pairs if relevant]
+
+
+def load_pairs_file(path: Path) -> List[Tuple[str, set]]:
+    """
+    Lee pares consulta -> identificadores relevantes de un fichero JSONL. Se
+    descartan las consultas sin ningún relevante, con las que el recall y el nDCG no
+    están definidos.
+    """
+    pairs = []
+    skipped = 0
+    with open(path, "r", encoding="utf-8") as file:
+        for line in file:
+            if line.strip():
+                record = json.loads(line)
+                relevant = set(record["relevant"])
+                if relevant:
+                    pairs.append((record["query"], relevant))
+                else:
+                    skipped += 1
+    if skipped:
+        print(f"Skipped {skipped} queries without relevant documents")
+    return pairs
+
+
+def compute_quality_metrics(
+    retrieved: List[List[str]], relevant: List[set], ks: Sequence[int]
+) -> Dict[str, float]:
+    """
+    Calcula Recall@k, MRR y nDCG@k (relevancia binaria) de un conjunto de consultas.
+
+    El recall se normaliza con min(k, número de relevantes), de modo que vale 1 si
+    los k primeros resultados son relevantes aunque haya más de k documentos
+    relevantes (habitual con los pares por categoría).
+
+    Parámetros:
+    -----------
+    retrieved : list
+        Identificadores recuperados de cada consulta, en orden.
+    relevant : list
+        Conjunto de identificadores relevantes de cada consulta.
+    ks : sequence
+        Valores de k.
+
+    Devuelve:
+    --------
+    dict
+        Diccionario métrica -> valor medio ("recall@k", "ndcg@k" y "mrr").
+    """
+    depth = max(ks)
+    hits = np.zeros((len(retrieved), depth), dtype=bool)
+    for row, (sources, relevant_sources) in enumerate(zip(retrieved, relevant)):
+        for column, source in enumerate(sources[:depth]):
+            hits[row, column] = source in relevant_sources
+    num_relevant = np.fromiter((len(sources) for sources in relevant), dtype=np.float64)
+
+    discounts = 1.0 / np.log2(np.arange(2, depth + 2))
+    metrics = {}
+    for k in ks:
+        metrics[f"recall@{k}"] = float(
+            (hits[:, :k].sum(axis=1) / np.minimum(num_relevant, k)).mean()
+        )
+        # Ideal DCG: every one of the first min(k, |relevant|) positions is relevant
+        ideal = np.cumsum(discounts[:k])[np.minimum(num_relevant, k).astype(int) - 1]
+        metrics[f"ndcg@{k}"] = float(
+            ((hits[:, :k] * discounts[:k]).sum(axis=1) / ideal).mean()
+        )
+
+    first_hit = np.where(hits.any(axis=1), hits.argmax(axis=1) + 1, np.inf)
+    metrics["mrr"] = float((1.0 / first_hit).mean())
+    return metrics
+
+
+def parse_config(spec: str) -> Tuple[str, Dict[str, object]]:
+    """
+    Convierte una configuración "nombre:CLAVE=valor,CLAVE=valor" en un nombre y un
+    diccionario de parámetros de `config.Settings`, validados con su tipo.
+    """
+    name, _, assignments = spec.partition(":")
+    overrides = {}
+    for assignment in filter(None, assignments.split(",")):
+        key, _, value = assignment.partition("=")
+        key = key.strip()
+        if key not in type(settings).model_fields:
+            raise ValueError(f"Unknown setting: {key}")
+        annotation = type(settings).model_fields[key].annotation
+        overrides[key] = TypeAdapter(annotation).validate_python(value.strip())
+    return name, overrides
+
+
+def directory_size_bytes(path: Path) -> int:
+    """
+    Devuelve el tamaño total de los ficheros de un directorio.
+    """
+    path = Path(path)
+    if not path.exists():
+        return 0
+    return sum(file.stat().st_size for file in path.rglob("*") if file.is_file())
+
+
+def evaluate_configuration(
+    name: str,
+    overrides: Dict[str, object],
+    indexed_documents: List[dict],
+    pairs: List[Tuple[str, set]],
+    embed_model,
+    ks: Sequence[int],
+) -> dict:
+    """
+    Evalúa una configuración de recuperación: aplica los parámetros, ingiere el
+    corpus en un almacén nuevo y mide la calidad, la latencia y el tamaño del
+    índice. Los parámetros se restauran al terminar.
+
+    Devuelve:
+    --------
+    dict
+        Resultados de la configuración.
+    """
+    from llama_index.core import QueryBundle
+    from retriever import VectorDBRetriever
+
+    # The store paths are saved too: they point into the deleted working directory
+    previous = {
+        key: getattr(settings, key) for key in (*overrides, *ISOLATED_STORE_SETTINGS)
+    }
+    for key, value in overrides.items():
+        setattr(settings, key, value)
+
+    try:
+        with tempfile.TemporaryDirectory(prefix="retrieval-quality-") as work_dir:
+            store = build_isolated_store(indexed_documents, embed_model, Path(work_dir))
+            if hasattr(store["vector_store"], "build_index"):
+                # Build the ANN index up front, so that queries do not pay for it
+                store["vector_store"].build_index()
+
+            retriever = VectorDBRetriever(
+                vector_store=store["vector_store"],
+                embed_model=embed_model,
+                query_mode=settings.QUERY_MODE,
+                node_top_k=max(settings.NODE_TOP_K, max(ks)),
+                document_top_k=max(ks),
+            )
+
+            retrieved, latencies = [], []
+            for query_str, _ in pairs:
+                start = time.perf_counter()
+                nodes = retriever._retrieve(QueryBundle(query_str))
+                latencies.append(time.perf_counter() - start)
+                retrieved.append([node.node.metadata.get("source") for node in nodes])
+
+            index_bytes = directory_size_bytes(settings.LOCAL_VECTOR_STORE_PATH) + (
+                directory_size_bytes(settings.DATABASE_PATH)
+            )
+    finally:
+        reset_document_store()
+        for key, value in previous.items():
+            setattr(settings, key, value)
+
+    latency = summarize_latencies(latencies)
+    return {
+        "name": name,
+        "overrides": {key: str(value) for key, value in overrides.items()},
+        "quality": compute_quality_metrics(
+            retrieved, [relevant for _, relevant in pairs], ks
+        ),
+        "latency": {"p50_ms": latency["p50_ms"], "p95_ms": latency["p95_ms"]},
+        "index_size_mb": index_bytes / (1024 * 1024),
+        "num_chunks": store["num_chunks"],
+    }
+
+
+def mark_pareto_front(results: List[dict], quality_metric: str) -> None:
+    """
+    Marca (`pareto: True`) las configuraciones que ninguna otra supera a la vez en
+    `quality_metric` y en latencia p95.
+    """
+    for result in results:
+        quality = result["quality"][quality_metric]
+        latency = result["latency"]["p95_ms"]
+        result["pareto"] = not any(
+            other["quality"][quality_metric] >= quality
+            and other["latency"]["p95_ms"] <= latency
+            and (
+                other["quality"][quality_metric] > quality
+                or other["latency"]["p95_ms"] < latency
+            )
+            for other in results
+        )
+
+
+def print_report(results: List[dict], ks: Sequence[int]) -> None:
+    """
+    Muestra una tabla con la calidad, la latencia y el tamaño de cada configuración.
+    """
+    quality_columns = [f"recall@{k}" for k in ks] + ["mrr"] + [f"ndcg@{k}" for k in ks]
+    header = ["config"] + quality_columns + ["p50_ms", "p95_ms", "index_mb", "pareto"]
+    print(" | ".join(header))
+    for result in results:
+        row = [result["name"]]
+        row += [f"{result['quality'][column]:.3f}" for column in quality_columns]
+        row += [
+            f"{result['latency']['p50_ms']:.2f}",
+            f"{result['latency']['p95_ms']:.2f}",
+            f"{result['index_size_mb']:.1f}",
+            "*" if result["pareto"] else "",
+        ]
+        print(" | ".join(row))
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description="Evaluate retrieval quality against latency."
+    )
+    parser.add_argument(
+        "--docs", type=int, default=2000, help="Corpus size (documents)."
+    )
+    parser.add_argument(
+        "--queries", type=int, default=200, help="Number of evaluation queries."
+    )
+    parser.add_argument(
+        "--seed", type=int, default=0, help="Seed of the corpus and queries."
+    )
+    parser.add_argument(
+        "--corpus",
+        choices=["auto", "snapshot", "synthetic"],
+        default="auto",
+        help="Sample ARXIV_SNAPSHOT_PATH or generate synthetic documents.",
+    )
+    parser.add_argument(
+        "--pairs",
+        default="title",
+        help='Evaluation pairs: "title", "category" or a JSONL file with query/relevant.',
+    )
+    parser.add_argument(
+        "--embed-model",
+        choices=["hashing", "configured"],
+        default="hashing",
+        help="Deterministic hashing embeddings or the configured EMBED_MODEL_NAME.",
+    )
+    parser.add_argument(
+        "--k", type=int, nargs="+", default=[1, 5, 10], help="Cut-offs."
+    )
+    parser.add_argument(
+        "--config",
+        action="append",
+        default=None,
+        help='Configuration "name:SETTING=value,SETTING=value" (repeatable).',
+    )
+    parser.add_argument(
+        "--output", type=Path, help="Write the results to this JSON file."
+    )
+    args = parser.parse_args()
+
+    install_stub_llm()
+    embed_model = get_benchmark_embedding_model(args.embed_model)
+    ks = sorted(set(args.k))
+
+    documents = load_corpus(args.docs, args.seed, args.corpus)
+    if args.pairs == "title":
+        indexed_documents, pairs = build_title_pairs(documents, args.queries, args.seed)
+    elif args.pairs == "category":
+        indexed_documents, pairs = build_category_pairs(
+            documents, args.queries, args.seed
+        )
+    else:
+        indexed_documents, pairs = documents, load_pairs_file(Path(args.pairs))
+    print(f"Evaluating {len(pairs)} queries over {len(indexed_documents)} documents")
+
+    results = []
+    for spec in args.config or ["default"]:
+        name, overrides = parse_config(spec)
+        print(f"Evaluating configuration '{name}'...")
+        results.append(
+            evaluate_configuration(
+                name, overrides, indexed_documents, pairs, embed_model, ks
+            )
+        )
+
+    mark_pareto_front(results, f"ndcg@{ks[-1]}")
+    print_report(results, ks)
+
+    if args.output:
+        args.output.parent.mkdir(parents=True, exist_ok=True)
+        with open(args.output, "w", encoding="utf-8") as file:
+            json.dump(
+                {
+                    "pairs": args.pairs,
+                    "num_queries": len(pairs),
+                    "num_documents": len(indexed_documents),
+                    "results": results,
+                },
+                file,
+                indent=2,
+            )
+        print(f"Results written to {args.output}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,117 @@
+"""
+Módulo: chroma_http_client.py
+
+Cliente de un servidor de Chroma remoto (el servicio `chromadb` de
+`docker-compose.yml`), para que varios procesos de consulta sin estado compartan una
+misma base de datos vectorial en lugar de abrir cada uno el fichero SQLite.
+
+El cliente HTTP de Chroma abre las conexiones sin tiempo de espera ni reintentos.
+`create_chroma_http_client` sustituye su sesión por una con:
+- Un conjunto de conexiones keep-alive de tamaño fijo (`CHROMADB_MAX_CONNECTIONS`).
+- Tiempos de espera de conexión y de petición (`CHROMADB_CONNECT_TIMEOUT` y
+  `CHROMADB_TIMEOUT`).
+- Reintentos con espera exponencial aleatoria ante errores transitorios: tiempos de
+  espera agotados, conexiones perdidas y respuestas 429, 502, 503 y 504.
+"""
+
+import random
+import time
+from typing import Optional
+
+import chromadb
+import httpx
+from config import settings
+
+# Responses worth retrying: overload and gateway errors of the server or its proxy
+_RETRYABLE_STATUS_CODES = frozenset({429, 502, 503, 504})
+
+
+class RetryTransport(httpx.HTTPTransport):
+    """
+    Transporte de httpx que reintenta las peticiones fallidas por errores
+    transitorios, con espera exponencial aleatoria (full jitter).
+
+    Las operaciones que usa el proyecto sobre Chroma (`get_or_create_collection`,
+    `add`, `query`, `get`, `delete` y `count`) se pueden repetir sin efectos
+    adicionales, por lo que también se reintentan las escrituras.
+
+    Parámetros:
+    -----------
+    max_retries : int, opcional
+        Reintentos por petición (por defecto, `settings.CHROMADB_MAX_RETRIES`).
+    **kwargs :
+        Argumentos de `httpx.HTTPTransport` (por ejemplo, `limits` o `verify`).
+    """
+
+    def __init__(self, max_retries: Optional[int] = None, **kwargs) -> None:
+        super().__init__(**kwargs)
+        self._max_retries = (
+            settings.CHROMADB_MAX_RETRIES if max_retries is None else max_retries
+        )
+        self.retries = 0
+
+    def _retry_delay(self, attempt: int) -> float:
+        return random.uniform(
+            0,
+            min(
+                settings.CHROMADB_RETRY_MAX_DELAY,
+                settings.CHROMADB_RETRY_BASE_DELAY * 2**attempt,
+            ),
+        )
+
+    def handle_request(self, request: httpx.Request) -> httpx.Response:
+        for attempt in range(self._max_retries + 1):
+            try:
+                response = super().handle_request(request)
+            except httpx.TransportError:
+                if attempt == self._max_retries:
+                    raise
+            else:
+                if (
+                    response.status_code not in _RETRYABLE_STATUS_CODES
+                    or attempt == self._max_retries
+                ):
+                    return response
+                # Release the connection before sending the request again
+                response.close()
+            self.retries += 1
+            time.sleep(self._retry_delay(attempt))
+
+
+def create_chroma_http_client() -> chromadb.ClientAPI:
+    """
+    Crea un cliente del servidor de Chroma configurado en `CHROMADB_HOST` y
+    `CHROMADB_PORT`, con conexiones persistentes, tiempos de espera y reintentos.
+
+    Devuelve:
+    --------
+    chromadb.ClientAPI
+        El cliente de Chroma.
+    """
+    client = chromadb.HttpClient(
+        host=settings.CHROMADB_HOST,
+        port=settings.CHROMADB_PORT,
+        ssl=settings.CHROMADB_SSL,
+    )
+
+    # chromadb builds its own httpx session without timeouts or retries: replace it,
+    # keeping its headers (custom and authentication ones). Request bodies are JSON,
+    # but chromadb does not declare it and recent servers reject them otherwise
+    server = client._server
+    session = server._session
+    headers = {"Content-Type": "application/json", **session.headers}
+    server._session = httpx.Client(
+        headers=headers,
+        timeout=httpx.Timeout(
+            settings.CHROMADB_TIMEOUT, connect=settings.CHROMADB_CONNECT_TIMEOUT
+        ),
+        transport=RetryTransport(
+            limits=httpx.Limits(
+                max_connections=settings.CHROMADB_MAX_CONNECTIONS,
+                max_keepalive_connections=settings.CHROMADB_MAX_CONNECTIONS,
+                keepalive_expiry=settings.CHROMADB_KEEPALIVE_EXPIRY,
+            ),
+        ),
+    )
+    session.close()
+    return client
@@ -4,11 +4,15 @@ Módulo: get_docs_from_query.py
 Módulo para realizar querys con un umbral de confianza mínimo.
 """
 
+import asyncio
+
 from config import settings
 from doc_list import build_doc_list_response
 from llama_index.core import QueryBundle
+from metrics import COUNT_BUCKETS, observe, timed
 
 
+@timed("query_with_confidence")
 def query_with_confidence(query_str: str, retriever) -> str:
     """
     Realiza una query utilizando un umbral de confianza.
@@ -50,5 +54,28 @@ def query_with_confidence(query_str: str, retriever) -> str:
         for doc in retrieved_docs
         if doc.similarity >= settings.RETRIEVER_CONFIDENCE_THRESHOLD
     ]
+    observe("confident_documents", len(retrieved_docs), buckets=COUNT_BUCKETS)
 
     return retrieved_docs
+
+
+async def aquery_with_confidence(query_str: str, retriever) -> list:
+    """
+    Versión asíncrona de `query_with_confidence`.
+
+    El embedding de la consulta y la búsqueda en el almacén vectorial son operaciones
+    bloqueantes, por lo que se ejecutan en un hilo para no detener el bucle de eventos.
+
+    Parámetros:
+    -----------
+    query_str : str
+        El texto de la query a realizar.
+    retriever : object
+        Un objeto encargado de realizar las búsquedas en el índice de datos.
+
+    Devuelve:
+    --------
+    list
+        Una lista de documentos cuya similitud con la consulta supera el umbral de confianza.
+    """
+    return await asyncio.to_thread(query_with_confidence, query_str, retriever)
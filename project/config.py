@@ -1,7 +1,7 @@
 from pathlib import Path
-from typing import Dict
+from typing import Dict, List, Optional
 
-from pydantic import Field
+from pydantic import Field, model_validator
 from pydantic_settings import BaseSettings, SettingsConfigDict
 
 
@@ -15,6 +15,30 @@ class Settings(BaseSettings):
     DATABASE_PATH: Path = Field(
         default=Path("./data/llama.db"), description="Path to the database file."
     )
+    ARXIV_SNAPSHOT_PATH: Optional[Path] = Field(
+        default=None,
+        description="Local arXiv snapshot JSON file. If unset, the Kaggle dataset is downloaded.",
+    )
+    SNAPSHOT_INDEX_PATH: Path = Field(
+        default=Path("./data/arxiv_snapshot_index.npy"),
+        description="Path to the byte-offset index of the arXiv snapshot.",
+    )
+    ARXIV_CATEGORIES: List[str] = Field(
+        default=[],
+        description="arXiv categories to ingest (e.g. cs.CL or hep-th). Empty means all.",
+    )
+    INGESTION_LEDGER_PATH: Optional[Path] = Field(
+        default=None,
+        description="Path to the ingestion checkpoint ledger. If unset, ingestion_ledger.sqlite next to DATABASE_PATH.",
+    )
+    DOCUMENT_STORE_BACKEND: str = Field(
+        default="auto",
+        description="Store of the per-document metadata (title and abstract): sqlite, chroma_http (collection of the remote Chroma server) or auto (chroma_http when VECTOR_STORE_BACKEND is chroma_http, sqlite otherwise).",
+    )
+    DOCUMENT_STORE_PATH: Optional[Path] = Field(
+        default=None,
+        description="Path to the sqlite table of per-document metadata. If unset, documents.sqlite next to DATABASE_PATH.",
+    )
     MODELS_PATH: Path = Field(
         default=Path("./models/"), description="Path to the models directory."
     )
@@ -24,6 +48,20 @@ class Settings(BaseSettings):
         default="BAAI/bge-small-en", description="Name of the embedding model."
     )
 
+    # Query embedding cache
+    QUERY_EMBEDDING_CACHE_SIZE: int = Field(
+        default=1024,
+        description="Maximum number of query embeddings kept in the in-process LRU cache.",
+    )
+    QUERY_EMBEDDING_CACHE_PATH: Optional[Path] = Field(
+        default=None,
+        description="SQLite file for the on-disk query embedding cache. If unset, only memory is used.",
+    )
+    QUERY_EMBEDDING_CACHE_MAX_DISK_ENTRIES: int = Field(
+        default=100000,
+        description="Maximum number of query embeddings kept in the on-disk cache.",
+    )
+
     # OpenAI model
     OPENAI_GENERATOR_MODEL: str = Field(
         default="gpt-4o-mini",
@@ -35,6 +73,91 @@ class Settings(BaseSettings):
     )
     OPENAI_API_KEY: str = Field(default="", description="API key for OpenAI access.")
 
+    # LLM backend of each stage
+    TRANSFORM_LLM_BACKEND: str = Field(
+        default="openai",
+        description="Backend of the query transformation: openai or local.",
+    )
+    CORRELATION_LLM_BACKEND: str = Field(
+        default="openai",
+        description="Backend of the correlation filter: openai or local.",
+    )
+    RESPONSE_LLM_BACKEND: str = Field(
+        default="openai",
+        description="Backend of the response generation: openai or local.",
+    )
+    LOCAL_LLM_MODEL: str = Field(
+        default="qwen2.5-1.5b-instruct-q4_k_m.gguf",
+        description="GGUF model file, inside MODELS_PATH, used by the local LLM backend (requires llama-cpp-python).",
+    )
+    LOCAL_LLM_CONTEXT_SIZE: int = Field(
+        default=4096, description="Context size of the local LLM."
+    )
+    LOCAL_LLM_THREADS: int = Field(
+        default=0, description="CPU threads of the local LLM (0 = chosen by llama.cpp)."
+    )
+    LOCAL_LLM_MAX_TOKENS: int = Field(
+        default=512,
+        description="Maximum number of tokens generated per local LLM call.",
+    )
+
+    # LLM response cache
+    LLM_CACHE_BACKEND: str = Field(
+        default="memory",
+        description="Backend of the LLM response cache: none, memory, sqlite or redis.",
+    )
+    LLM_CACHE_TTL: float = Field(
+        default=86400.0,
+        description="Seconds a cached LLM response stays valid (0 = no expiration).",
+    )
+    LLM_CACHE_MAX_ENTRIES: int = Field(
+        default=10000,
+        description="Maximum number of cached LLM responses (memory and sqlite backends).",
+    )
+    LLM_CACHE_PATH: Path = Field(
+        default=Path("./data/llm_cache.sqlite"),
+        description="Path to the SQLite LLM response cache.",
+    )
+    LLM_CACHE_REDIS_URL: str = Field(
+        default="redis://localhost:6379/0",
+        description="URL of the Redis server used by the redis LLM cache backend.",
+    )
+
+    # LLM gateway
+    LLM_MAX_CONCURRENCY: int = Field(
+        default=8, description="Maximum number of concurrent calls to the OpenAI API."
+    )
+    LLM_REQUESTS_PER_MINUTE: int = Field(
+        default=0,
+        description="Requests per minute allowed by the rate limiter (0 = unlimited).",
+    )
+    LLM_TOKENS_PER_MINUTE: int = Field(
+        default=0,
+        description="Estimated tokens per minute allowed by the rate limiter (0 = unlimited).",
+    )
+    LLM_EXPECTED_OUTPUT_TOKENS: int = Field(
+        default=256,
+        description="Output tokens assumed per call when estimating token usage.",
+    )
+    LLM_TIMEOUT: float = Field(
+        default=30.0, description="Timeout, in seconds, of each LLM API call."
+    )
+    LLM_MAX_RETRIES: int = Field(
+        default=4,
+        description="Retries of a failed LLM call (429, 5xx, timeouts, connection errors).",
+    )
+    LLM_RETRY_BASE_DELAY: float = Field(
+        default=0.5,
+        description="Base delay, in seconds, of the jittered exponential backoff.",
+    )
+    LLM_RETRY_MAX_DELAY: float = Field(
+        default=20.0, description="Maximum delay, in seconds, between two retries."
+    )
+    LLM_HEDGE_AFTER: float = Field(
+        default=0.0,
+        description="Seconds after which a slow async LLM call is duplicated, keeping the first answer (0 = disabled).",
+    )
+
     # Vector store configuration
     CHUNK_SIZE: int = Field(
         default=128, description="Size of text chunks for processing."
@@ -46,11 +169,216 @@ class Settings(BaseSettings):
     DOCUMENT_TOP_K: int = Field(
         default=3, description="Number of top documents to retrieve."
     )
+    MAX_NODE_TOP_K: int = Field(
+        default=160,
+        description="Upper bound of the adaptive over-fetch when NODE_TOP_K nodes span fewer than DOCUMENT_TOP_K documents.",
+    )
+    DOCUMENT_AGGREGATION: str = Field(
+        default="max",
+        description="Per-document aggregation of chunk scores: max, mean_top_n or rrf.",
+    )
+    DOCUMENT_AGGREGATION_TOP_N: int = Field(
+        default=3,
+        description="Number of chunks averaged by the mean_top_n aggregation.",
+    )
+    RRF_K: int = Field(
+        default=60, description="Smoothing constant of Reciprocal Rank Fusion."
+    )
+    EMBED_BATCH_SIZE: int = Field(
+        default=64,
+        description="Number of chunks embedded per call to the embedding model.",
+    )
+    VECTOR_STORE_BATCH_SIZE: int = Field(
+        default=1000,
+        description="Number of embedded nodes written per vector store add call.",
+    )
+    INGEST_WORKERS: int = Field(
+        default=1,
+        description="Number of worker processes used to parse, split and embed during ingestion (1 = serial).",
+    )
+    INGEST_BLOCK_SIZE: int = Field(
+        default=256,
+        description="Number of documents sent to a worker process per task in parallel ingestion.",
+    )
+    VECTOR_STORE_BACKEND: str = Field(
+        default="chroma",
+        description="Vector store backend: chroma (embedded), chroma_http (remote Chroma server) or local (memory-mapped, optionally quantized).",
+    )
+    CHROMADB_HOST: str = Field(
+        default="localhost",
+        description="Host of the Chroma server (chroma_http backend).",
+    )
+    CHROMADB_PORT: int = Field(
+        default=8000, description="Port of the Chroma server (chroma_http backend)."
+    )
+    CHROMADB_SSL: bool = Field(
+        default=False, description="Connect to the Chroma server over HTTPS."
+    )
+    CHROMADB_TIMEOUT: float = Field(
+        default=30.0,
+        description="Timeout, in seconds, of each request to the Chroma server.",
+    )
+    CHROMADB_CONNECT_TIMEOUT: float = Field(
+        default=5.0,
+        description="Timeout, in seconds, to open a connection to the Chroma server.",
+    )
+    CHROMADB_MAX_CONNECTIONS: int = Field(
+        default=16,
+        description="Size of the keep-alive connection pool to the Chroma server.",
+    )
+    CHROMADB_KEEPALIVE_EXPIRY: float = Field(
+        default=30.0,
+        description="Seconds an idle pooled connection to the Chroma server is kept open.",
+    )
+    CHROMADB_MAX_RETRIES: int = Field(
+        default=3,
+        description="Retries of a failed Chroma request (timeouts, connection errors, 429, 502-504).",
+    )
+    CHROMADB_RETRY_BASE_DELAY: float = Field(
+        default=0.2,
+        description="Base delay, in seconds, of the jittered exponential backoff.",
+    )
+    CHROMADB_RETRY_MAX_DELAY: float = Field(
+        default=5.0,
+        description="Maximum delay, in seconds, between two Chroma retries.",
+    )
+    LOCAL_VECTOR_STORE_PATH: Path = Field(
+        default=Path("./data/local_store"),
+        description="Directory of the local vector store backend.",
+    )
+    LOCAL_STORE_QUANTIZATION: str = Field(
+        default="int8",
+        description="Quantization of the local vector store: int8 or none.",
+    )
+    LOCAL_STORE_RERANK_FACTOR: int = Field(
+        default=4,
+        description="Quantized candidates re-ranked with float32 vectors, as a multiple of the requested top k.",
+    )
+    LOCAL_STORE_INDEX: str = Field(
+        default="auto",
+        description="Search index of the local vector store: flat, ivf, hnsw or auto (flat for small stores, ivf above LOCAL_STORE_EXACT_MAX_VECTORS).",
+    )
+    LOCAL_STORE_EXACT_MAX_VECTORS: int = Field(
+        default=200000,
+        description="Largest local store searched exactly when LOCAL_STORE_INDEX is auto.",
+    )
+    LOCAL_STORE_IVF_NLIST: int = Field(
+        default=0,
+        description="Number of IVF clusters (0 = 4 * sqrt(number of vectors)).",
+    )
+    LOCAL_STORE_IVF_NPROBE: int = Field(
+        default=8, description="Number of IVF clusters scanned per query."
+    )
+    LOCAL_STORE_HNSW_M: int = Field(
+        default=16,
+        description="Connections per node of the HNSW graph (requires hnswlib).",
+    )
+    LOCAL_STORE_HNSW_EF_SEARCH: int = Field(
+        default=64, description="Minimum candidate list size of HNSW searches."
+    )
     QUERY_MODE: str = Field(default="default", description="Mode for querying.")
+    RETRIEVAL_MODE: str = Field(
+        default="default",
+        description="Retrieval mode: default (query embedding), hyde (query fused with hypothetical abstracts) or multi_query (query and paraphrases fused with RRF).",
+    )
+    HYDE_LLM_BACKEND: str = Field(
+        default="openai",
+        description="LLM backend that writes the HyDE abstracts: openai or local.",
+    )
+    HYDE_NUM_HYPOTHESES: int = Field(
+        default=3,
+        description="Hypothetical abstracts generated per query in HyDE mode.",
+    )
+    HYDE_TEMPERATURE: float = Field(
+        default=0.7, description="Sampling temperature of the HyDE abstracts."
+    )
+    HYDE_LATENCY_BUDGET: float = Field(
+        default=3.0,
+        description="Seconds to wait for the HyDE abstracts before falling back to the query embedding (0 waits indefinitely).",
+    )
+    MULTI_QUERY_LLM_BACKEND: str = Field(
+        default="openai",
+        description="LLM backend that writes the query paraphrases: openai or local.",
+    )
+    MULTI_QUERY_NUM_PARAPHRASES: int = Field(
+        default=3,
+        description="Paraphrases searched alongside the query in multi_query mode.",
+    )
     RETRIEVER_CONFIDENCE_THRESHOLD: float = Field(
         default=0.7, description="Confidence threshold for retriever."
     )
 
+    # Relevance filter
+    RELEVANCE_FILTER_MODE: str = Field(
+        default="none",
+        description="Relevance filter applied after retrieval: none, llm, embedding or hybrid (LLM only for borderline documents).",
+    )
+    RELEVANCE_CROSS_ENCODER_MODEL: str = Field(
+        default="",
+        description="CPU cross-encoder used to score relevance (e.g. cross-encoder/ms-marco-MiniLM-L-6-v2). Empty uses the calibrated retrieval similarity.",
+    )
+    RELEVANCE_CALIBRATION_MIDPOINT: float = Field(
+        default=0.8,
+        description="Cosine similarity mapped to a 0.5 relevance probability.",
+    )
+    RELEVANCE_CALIBRATION_SLOPE: float = Field(
+        default=30.0,
+        description="Slope of the logistic calibration of the cosine similarity.",
+    )
+    RELEVANCE_KEEP_THRESHOLD: float = Field(
+        default=0.75,
+        description="Relevance probability above which a document is kept without asking the LLM.",
+    )
+    RELEVANCE_DROP_THRESHOLD: float = Field(
+        default=0.25,
+        description="Relevance probability below which a document is dropped without asking the LLM.",
+    )
+
+    # Search pipeline
+    SEARCH_MAX_CONCURRENCY: int = Field(
+        default=16,
+        description="Maximum number of searches run concurrently by search_many.",
+    )
+    BATCH_SEARCH_SIZE: int = Field(
+        default=256,
+        description="Number of queries embedded and searched together by the batch search.",
+    )
+    BATCH_SEARCH_MAX_IN_FLIGHT: int = Field(
+        default=8,
+        description="Maximum number of concurrent LLM post-processing calls in the batch search.",
+    )
+
+    # HTTP service
+    API_HOST: str = Field(
+        default="127.0.0.1", description="Interface of the HTTP search service."
+    )
+    API_PORT: int = Field(default=8080, description="Port of the HTTP search service.")
+    API_BATCH_MAX_SIZE: int = Field(
+        default=32,
+        description="Maximum number of concurrent requests retrieved together in one batch.",
+    )
+    API_BATCH_MAX_WAIT_MS: float = Field(
+        default=5.0,
+        description="Maximum milliseconds a request waits for others to fill its retrieval batch.",
+    )
+
+    # Metrics and tracing
+    METRICS_HOST: str = Field(
+        default="127.0.0.1",
+        description="Interface of the Prometheus /metrics endpoint.",
+    )
+    METRICS_PORT: int = Field(
+        default=0,
+        description="Port of the Prometheus /metrics endpoint (0 disables it).",
+    )
+    OTEL_ENABLED: bool = Field(
+        default=False,
+        description="Export a span per search stage with OpenTelemetry (OTLP exporter, configured with the OTEL_EXPORTER_OTLP_* variables).",
+    )
+    OTEL_SERVICE_NAME: str = Field(
+        default="hyde-rag", description="Service name of the OpenTelemetry spans."
+    )
+
     # Language model configuration
     FASTTEXT_MODEL: str = Field(
         default="lid.176.ftz", description="Path to the FastText model file."
@@ -236,5 +564,16 @@ class Settings(BaseSettings):
         }
     )
 
+    @model_validator(mode="after")
+    def _derive_paths_from_database(self) -> "Settings":
+        # Files that belong to the database live next to it unless set explicitly
+        if self.INGESTION_LEDGER_PATH is None:
+            self.INGESTION_LEDGER_PATH = (
+                self.DATABASE_PATH.parent / "ingestion_ledger.sqlite"
+            )
+        if self.DOCUMENT_STORE_PATH is None:
+            self.DOCUMENT_STORE_PATH = self.DATABASE_PATH.parent / "documents.sqlite"
+        return self
+
 
 settings = Settings()
@@ -2,11 +2,11 @@ from typing import List
 
 from config import settings
 from doc_list import DocListResponse
-from openai import OpenAI
+from llm_cache import build_cache_key, get_llm_cache
+from llm_setup import get_stage_client
+from metrics import timed
 from pydantic import BaseModel
 
-correlation_llm_client = OpenAI(api_key=settings.OPENAI_API_KEY)
-
 
 class Correlation(BaseModel):
     indexes: list[int]
@@ -46,15 +46,11 @@ def build_correlation_prompt(
     return prompt
 
 
-def run_correlation_filter(
+def build_correlation_messages(
     query_str: str, retrieved_docs: List[DocListResponse]
-) -> Correlation:
+) -> List[dict]:
     """
-    Ejecuta un filtro de correlación entre la consulta del usuario y los documentos recuperados.
-    Llama a un modelo de lenguaje que retornará un objeto JSON con el campo 'indexes'
-    (list[int]) para indicar cuáles documentos coinciden con la consulta del usuario.
-
-    Si no existe coincidencia, el modelo debe retornar una lista vacía.
+    Construye los mensajes de la llamada al filtro de correlación.
 
     Parámetros:
     -----------
@@ -65,9 +61,8 @@ def run_correlation_filter(
 
     Devuelve:
     --------
-    Correlation
-        Un objeto con la lista de índices (list[int]) que el modelo ha identificado.
-        Los índices se basan en 1 y deben corresponder a la enumeración dada en el prompt.
+    List[dict]
+        Los mensajes (rol y contenido) para el modelo de lenguaje.
     """
 
     # 1. Construir el prompt
@@ -100,20 +95,118 @@ def run_correlation_filter(
         '4. If all documents are relevant, return an empty list: {"indexes": []}.\n'
     )
 
-    # 4. Llamar a la API, usando la función parse con el modelo pydantic 'Correlation'
-    response = correlation_llm_client.beta.chat.completions.parse(
-        model=settings.OPENAI_CORRELATION_MODEL,
-        messages=[
-            {"role": "system", "content": system_content},
-            {"role": "user", "content": prompt_text},
-            {"role": "system", "content": user_instructions},
-        ],
-        response_format=Correlation,
-    )
+    messages = [
+        {"role": "system", "content": system_content},
+        {"role": "user", "content": prompt_text},
+        {"role": "system", "content": user_instructions},
+    ]
 
-    filter_indexes = response.choices[0].message.parsed.indexes
-    filter_indexes = [index - 1 for index in filter_indexes if index - 1 > 0]
+    return messages
+
+
+def apply_correlation_indexes(
+    retrieved_docs: List[DocListResponse], filter_indexes: List[int]
+) -> List[DocListResponse]:
+    """
+    Elimina de la lista los documentos marcados como irrelevantes por el modelo.
+
+    Parámetros:
+    -----------
+    retrieved_docs : List[DocListResponse]
+        Documentos relevantes recuperados previamente.
+    filter_indexes : List[int]
+        Índices (basados en 1) de los documentos irrelevantes.
+
+    Devuelve:
+    --------
+    List[DocListResponse]
+        Los documentos que no se han descartado.
+    """
+    # Indexes are 1-based; ignore any the model made up outside the list
+    filter_indexes = {
+        index - 1 for index in filter_indexes if 0 <= index - 1 < len(retrieved_docs)
+    }
 
     return [
         doc for index, doc in enumerate(retrieved_docs) if index not in filter_indexes
     ]
+
+
+@timed("correlation_filter")
+def run_correlation_filter(
+    query_str: str, retrieved_docs: List[DocListResponse]
+) -> Correlation:
+    """
+    Ejecuta un filtro de correlación entre la consulta del usuario y los documentos recuperados.
+    Llama a un modelo de lenguaje que retornará un objeto JSON con el campo 'indexes'
+    (list[int]) para indicar cuáles documentos coinciden con la consulta del usuario.
+
+    Si no existe coincidencia, el modelo debe retornar una lista vacía.
+
+    Parámetros:
+    -----------
+    query_str : str
+        El texto de la consulta del usuario.
+    retrieved_docs : List[DocListResponse]
+        Documentos relevantes recuperados previamente.
+
+    Devuelve:
+    --------
+    Correlation
+        Un objeto con la lista de índices (list[int]) que el modelo ha identificado.
+        Los índices se basan en 1 y deben corresponder a la enumeración dada en el prompt.
+    """
+
+    messages = build_correlation_messages(query_str, retrieved_docs)
+
+    # Llamar a la API, usando la función parse con el modelo pydantic 'Correlation'
+    # (la respuesta se cachea por modelo, mensajes y formato de respuesta)
+    client, model = get_stage_client(
+        settings.CORRELATION_LLM_BACKEND, settings.OPENAI_CORRELATION_MODEL
+    )
+
+    def _parse():
+        return client.complete(
+            messages, model=model, response_format=Correlation
+        ).indexes
+
+    cache_key = build_cache_key(model, messages, response_format=Correlation)
+    filter_indexes = get_llm_cache().get_or_compute(cache_key, _parse)
+    return apply_correlation_indexes(retrieved_docs, filter_indexes)
+
+
+@timed("correlation_filter")
+async def arun_correlation_filter(
+    query_str: str, retrieved_docs: List[DocListResponse]
+) -> List[DocListResponse]:
+    """
+    Versión asíncrona de `run_correlation_filter`, basada en el método `acomplete`
+    del backend configurado (`CORRELATION_LLM_BACKEND`).
+
+    Parámetros:
+    -----------
+    query_str : str
+        El texto de la consulta del usuario.
+    retrieved_docs : List[DocListResponse]
+        Documentos relevantes recuperados previamente.
+
+    Devuelve:
+    --------
+    List[DocListResponse]
+        Los documentos que el modelo no ha marcado como irrelevantes.
+    """
+    messages = build_correlation_messages(query_str, retrieved_docs)
+
+    client, model = get_stage_client(
+        settings.CORRELATION_LLM_BACKEND, settings.OPENAI_CORRELATION_MODEL
+    )
+
+    async def _aparse():
+        correlation = await client.acomplete(
+            messages, model=model, response_format=Correlation
+        )
+        return correlation.indexes
+
+    cache_key = build_cache_key(model, messages, response_format=Correlation)
+    filter_indexes = await get_llm_cache().aget_or_compute(cache_key, _aparse)
+    return apply_correlation_indexes(retrieved_docs, filter_indexes)
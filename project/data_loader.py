@@ -4,60 +4,374 @@ Módulo: data_loader.py
 Módulo para cargar documentos desde el conjunto de datos 'arxiv' disponible en Kaggle.
 Permite descargar el dataset, procesar su contenido y devolver una lista de documentos
 con su texto y metadatos relevantes.
+
+El fichero se lee a través de `ArxivSnapshot`, que construye una única vez un índice
+con la posición en bytes de cada línea y proyecta el fichero en memoria (mmap), de
+modo que cualquier documento o rango de documentos se puede leer sin recorrer el
+fichero desde el principio.
 """
 
 import json
+import mmap
 import os
+from functools import lru_cache
+from pathlib import Path
+from typing import Iterable, Optional
 
 import kagglehub
+import numpy as np
+from config import settings
+
+try:
+    import orjson
+
+    _json_loads = orjson.loads
+except ImportError:
+    _json_loads = json.loads
+
+# Size of the blocks scanned for newlines while building the offset index
+_INDEX_SCAN_BLOCK_SIZE = 64 * 1024 * 1024
 
 
-def load_documents(max_docs = None):
+@lru_cache(maxsize=None)
+def get_dataset_path() -> str:
     """
-    Descarga y procesa el conjunto de datos 'arxiv' desde Kaggle.
+    Descarga (si es necesario) el conjunto de datos 'arxiv' y devuelve la ruta del
+    fichero JSON con los metadatos.
+
+    Si `ARXIV_SNAPSHOT_PATH` apunta a un fichero existente, se usa directamente sin
+    consultar Kaggle. El resultado se cachea durante la vida del proceso.
+
+    Devuelve:
+    --------
+    str
+        Ruta al fichero 'arxiv-metadata-oai-snapshot.json'.
+    """
+    if (
+        settings.ARXIV_SNAPSHOT_PATH is not None
+        and settings.ARXIV_SNAPSHOT_PATH.exists()
+    ):
+        return str(settings.ARXIV_SNAPSHOT_PATH)
+
+    # Download the dataset to a local folder
+    data_folder = kagglehub.dataset_download("Cornell-University/arxiv")
+
+    # The dataset includes a large JSON file: 'arxiv-metadata-oai-snapshot.json'
+    return os.path.join(data_folder, "arxiv-metadata-oai-snapshot.json")
 
-    Este método descarga el dataset, extrae sus líneas en formato JSON, y procesa cada línea
-    para crear una lista de diccionarios. Cada diccionario incluye el texto combinado
-    (título y abstract) y los metadatos asociados.
+
+def compute_snapshot_fingerprint(file_path: str) -> str:
+    """
+    Calcula una huella del fichero de datos a partir de su ruta, tamaño y fecha
+    de modificación. Si la huella cambia, las posiciones en bytes guardadas dejan
+    de ser válidas y el fichero debe recorrerse de nuevo.
 
     Parámetros:
     -----------
-    max_docs : int, opcional
-        Número máximo de documentos a procesar (por defecto es None).
+    file_path : str
+        Ruta al fichero de datos.
 
     Devuelve:
     --------
-    list
-        Una lista de diccionarios, cada uno con las claves:
+    str
+        La huella del fichero.
+    """
+    stat = os.stat(file_path)
+    return f"{os.path.abspath(file_path)}:{stat.st_size}:{stat.st_mtime_ns}"
+
+
+def parse_document_line(line: bytes, index: int, offset: int, end_offset: int) -> dict:
+    """
+    Convierte una línea del fichero JSON de arXiv en un documento.
+
+    Sólo se conservan los campos necesarios; si `orjson` está instalado se utiliza
+    como decodificador, al ser bastante más rápido que `json`.
+
+    Parámetros:
+    -----------
+    line : bytes
+        Línea del fichero con un objeto JSON.
+    index : int
+        Posición del documento dentro del fichero.
+    offset : int
+        Posición en bytes del inicio de la línea.
+    end_offset : int
+        Posición en bytes del final de la línea.
+
+    Devuelve:
+    --------
+    dict
+        Un diccionario con las claves:
         - 'text': Título y resumen combinados.
         - 'metadata': Metadatos relevantes como 'source', 'title', y 'abstract'.
+        - 'categories': Lista de categorías de arXiv del documento.
+        - 'index': Posición del documento dentro del fichero.
+        - 'offset' y 'end_offset': Rango en bytes de la línea del documento.
     """
-    
-    # Download the dataset to a local folder
-    data_folder = kagglehub.dataset_download("Cornell-University/arxiv")
+    content = _json_loads(line)
 
-    # The dataset includes a large JSON file: 'arxiv-metadata-oai-snapshot.json'
-    file_path = os.path.join(data_folder, "arxiv-metadata-oai-snapshot.json")
+    # Combine title + abstract as the text
+    doc_text = content["title"] + "\n\n" + content["abstract"]
+
+    # Keep relevant metadata
+    doc_metadata = {
+        "source": content["id"],
+        "title": content["title"],
+        "abstract": content["abstract"],
+    }
+
+    return {
+        "text": doc_text,
+        "metadata": doc_metadata,
+        "categories": content.get("categories", "").split(),
+        "index": index,
+        "offset": offset,
+        "end_offset": end_offset,
+    }
+
+
+def matches_categories(
+    doc_categories: Iterable[str], categories: Iterable[str]
+) -> bool:
+    """
+    Comprueba si un documento pertenece a alguna de las categorías indicadas.
+
+    Una categoría sin subcategoría (por ejemplo, "cs") incluye todas sus
+    subcategorías ("cs.CL", "cs.LG", ...).
+
+    Parámetros:
+    -----------
+    doc_categories : iterable
+        Categorías del documento.
+    categories : iterable
+        Categorías buscadas.
+
+    Devuelve:
+    --------
+    bool
+        True si alguna categoría del documento coincide.
+    """
+    for doc_category in doc_categories:
+        for category in categories:
+            if doc_category == category or doc_category.startswith(category + "."):
+                return True
+    return False
+
+
+class ArxivSnapshot:
+    """
+    Lector con acceso aleatorio del fichero JSON de arXiv.
+
+    La primera vez que se abre un fichero se construye un índice con el rango en
+    bytes de cada línea no vacía, que se guarda en `SNAPSHOT_INDEX_PATH` junto con
+    la huella del fichero. Las aperturas posteriores cargan el índice proyectado en
+    memoria, por lo que `len`, el acceso por posición y los rangos no requieren
+    recorrer el fichero.
 
-    documents = []
-    count = 0
+    Parámetros:
+    -----------
+    file_path : str, opcional
+        Ruta al fichero JSON. Si no se indica, se obtiene con `get_dataset_path`.
+    index_path : Path, opcional
+        Ruta del índice (por defecto, `settings.SNAPSHOT_INDEX_PATH`).
+    """
+
+    def __init__(
+        self, file_path: Optional[str] = None, index_path: Optional[Path] = None
+    ) -> None:
+        self.file_path = file_path or get_dataset_path()
+        self.fingerprint = compute_snapshot_fingerprint(self.file_path)
+
+        self._file = open(self.file_path, "rb")
+        self._mmap = mmap.mmap(self._file.fileno(), 0, access=mmap.ACCESS_READ)
+        self._index = self._load_or_build_index(
+            Path(index_path or settings.SNAPSHOT_INDEX_PATH)
+        )
+
+    def _load_or_build_index(self, index_path: Path) -> np.ndarray:
+        fingerprint_path = index_path.with_suffix(".json")
+        if index_path.exists() and fingerprint_path.exists():
+            with open(fingerprint_path, "r", encoding="utf-8") as file:
+                if json.load(file).get("fingerprint") == self.fingerprint:
+                    return np.load(index_path, mmap_mode="r")
+
+        print("Building snapshot offset index...")
+        index = self._build_index()
+
+        index_path.parent.mkdir(parents=True, exist_ok=True)
+        np.save(index_path, index)
+        with open(fingerprint_path, "w", encoding="utf-8") as file:
+            json.dump({"fingerprint": self.fingerprint, "documents": len(index)}, file)
+
+        return index
+
+    def _build_index(self) -> np.ndarray:
+        size = len(self._mmap)
+
+        # Vectorized newline search over large blocks of the file
+        newlines = []
+        for block_start in range(0, size, _INDEX_SCAN_BLOCK_SIZE):
+            block = np.frombuffer(
+                self._mmap[block_start : block_start + _INDEX_SCAN_BLOCK_SIZE],
+                dtype=np.uint8,
+            )
+            newlines.append(np.flatnonzero(block == ord("\n")) + block_start)
+        newlines = np.concatenate(newlines) if newlines else np.empty(0, dtype=np.int64)
+
+        starts = np.concatenate(([0], newlines + 1))
+        ends = np.concatenate((newlines, [size]))
+
+        # Keep only the non-empty lines
+        non_empty = ends > starts
+        return np.stack((starts[non_empty], ends[non_empty]), axis=1).astype(np.int64)
+
+    def __len__(self) -> int:
+        return len(self._index)
 
-    with open(file_path, "r", encoding="utf-8") as file:
-        for line in file:
-            content = json.loads(line.strip())
+    def __getitem__(self, index):
+        if isinstance(index, slice):
+            start, stop, step = index.indices(len(self))
+            if step != 1:
+                return [self[i] for i in range(start, stop, step)]
+            return list(self.iter_documents(start, stop))
 
-            # Combine title + abstract as the text
-            doc_text = content["title"] + "\n\n" + content["abstract"]
+        if index < 0:
+            index += len(self)
+        return parse_document_line(*self.get_raw(index))
 
-            # Keep relevant metadata
-            doc_metadata = {"source": content["id"], "title": content["title"], "abstract": content["abstract"]}
+    def get_raw(self, index: int):
+        """
+        Devuelve la línea en crudo de un documento y su posición.
 
-            # Store everything in a dict
-            documents.append({"text": doc_text, "metadata": doc_metadata})
-            count += 1
+        Devuelve:
+        --------
+        tuple
+            Tupla (line, index, offset, end_offset).
+        """
+        offset, end_offset = (int(value) for value in self._index[index])
+        return self._mmap[offset:end_offset], index, offset, end_offset
 
-            # Stop after 'max_docs' documents
-            if max_docs is not None and count >= max_docs:
-                break
+    def iter_raw(self, start: int = 0, stop: Optional[int] = None):
+        """
+        Recorre las líneas en crudo del rango de documentos [start, stop).
 
-    return documents
+        Devuelve:
+        --------
+        generator
+            Un generador de tuplas (line, index, offset, end_offset).
+        """
+        stop = len(self) if stop is None else min(stop, len(self))
+        for index in range(start, stop):
+            yield self.get_raw(index)
+
+    def iter_documents(
+        self,
+        start: int = 0,
+        stop: Optional[int] = None,
+        categories: Optional[Iterable[str]] = None,
+    ):
+        """
+        Recorre los documentos del rango [start, stop), filtrando opcionalmente
+        por categorías.
+
+        Parámetros:
+        -----------
+        start : int, opcional
+            Posición del primer documento (por defecto es 0).
+        stop : int, opcional
+            Posición siguiente al último documento (por defecto, el final).
+        categories : iterable, opcional
+            Categorías de arXiv a conservar (por ejemplo, ["cs.CL", "hep-th"]).
+
+        Devuelve:
+        --------
+        generator
+            Un generador de documentos con el formato de `parse_document_line`.
+        """
+        categories = list(categories or [])
+        for raw_line in self.iter_raw(start, stop):
+            doc = parse_document_line(*raw_line)
+            if categories and not matches_categories(doc["categories"], categories):
+                continue
+            yield doc
+
+    def shard(
+        self, shard_id: int, num_shards: int, start: int = 0, stop: Optional[int] = None
+    ):
+        """
+        Calcula el rango de documentos de una partición, para repartir la lectura
+        entre varios procesos sin que ninguno tenga que recorrer el fichero.
+
+        Devuelve:
+        --------
+        tuple
+            Tupla (start, stop) de la partición.
+        """
+        stop = len(self) if stop is None else min(stop, len(self))
+        bounds = np.linspace(start, stop, num_shards + 1).astype(int)
+        return int(bounds[shard_id]), int(bounds[shard_id + 1])
+
+    def close(self) -> None:
+        """
+        Libera la proyección en memoria y cierra el fichero.
+        """
+        self._mmap.close()
+        self._file.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+
+def iter_documents(max_docs=None, start=0, categories=None, file_path=None):
+    """
+    Recorre el conjunto de datos 'arxiv' de forma perezosa, documento a documento.
+
+    A diferencia de `load_documents`, no construye ninguna lista: cada documento se
+    lee, se procesa y se entrega al consumidor antes de leer el siguiente, por lo que
+    la memoria utilizada no depende del tamaño del corpus.
+
+    Parámetros:
+    -----------
+    max_docs : int, opcional
+        Número máximo de líneas del fichero a considerar, contando desde el inicio
+        (por defecto es None).
+    start : int, opcional
+        Posición del primer documento a leer (por defecto es 0).
+    categories : iterable, opcional
+        Categorías de arXiv a conservar (por defecto, todas).
+    file_path : str, opcional
+        Ruta al fichero JSON. Si no se indica, se obtiene con `get_dataset_path`.
+
+    Devuelve:
+    --------
+    generator
+        Un generador de documentos con el formato de `parse_document_line`.
+    """
+    with ArxivSnapshot(file_path) as snapshot:
+        yield from snapshot.iter_documents(start, max_docs, categories)
+
+
+def load_documents(max_docs=None):
+    """
+    Descarga y procesa el conjunto de datos 'arxiv' desde Kaggle.
+
+    Este método descarga el dataset, extrae sus líneas en formato JSON, y procesa cada línea
+    para crear una lista de diccionarios. Cada diccionario incluye el texto combinado
+    (título y abstract) y los metadatos asociados.
+
+    Parámetros:
+    -----------
+    max_docs : int, opcional
+        Número máximo de documentos a procesar (por defecto es None).
+
+    Devuelve:
+    --------
+    list
+        Una lista de diccionarios, cada uno con las claves:
+        - 'text': Título y resumen combinados.
+        - 'metadata': Metadatos relevantes como 'source', 'title', y 'abstract'.
+    """
+    return list(iter_documents(max_docs=max_docs))
@@ -4,6 +4,7 @@ Módulo: doc_list.py
 Módulo para construir una lista estructurada de documentos.
 """
 
+from document_store import get_document_store
 from pydantic import BaseModel
 
 
@@ -24,6 +25,7 @@ class DocListResponse(BaseModel):
     similarity : float
         El puntaje de similitud asociado al documento.
     """
+
     index: int
     title: str
     abstract: str
@@ -31,7 +33,9 @@ class DocListResponse(BaseModel):
     similarity: float
 
 
-def build_doc_list_response(nodes_with_scores) -> list[DocListResponse]:
+def build_doc_list_response(
+    nodes_with_scores, document_store=None
+) -> list[DocListResponse]:
     """
     Construye una lista estructurada de documentos.
 
@@ -39,19 +43,33 @@ def build_doc_list_response(nodes_with_scores) -> list[DocListResponse]:
     una lista de objetos `DocListResponse`, que incluyen el índice, título,
     resumen, identificador de fuente, y puntaje de similitud.
 
+    El título y el resumen se obtienen de la tabla de documentos con una única
+    consulta por lote. Los nodos de colecciones antiguas, que aún llevan esos
+    campos en sus metadatos, se siguen resolviendo desde el propio nodo.
+
     Parámetros:
     -----------
     nodes_with_scores : list
         Una lista de objetos que contienen nodos recuperados y sus puntajes de similitud.
+    document_store : DocumentStore, opcional
+        Tabla de documentos (por defecto, la compartida por el proceso).
 
     Devuelve:
     --------
     list[DocListResponse]
         Una lista de objetos `DocListResponse` con los datos estructurados de los documentos.
     """
+    document_store = document_store or get_document_store()
+    documents = document_store.get_many(
+        nws.node.metadata["source"]
+        for nws in nodes_with_scores
+        if nws.node.metadata and "source" in nws.node.metadata
+    )
+
     doc_list = []
     for i, nws in enumerate(nodes_with_scores):
         metadata = nws.node.metadata or {}
+        metadata = {**metadata, **documents.get(metadata.get("source"), {})}
         doc_score = nws.score if nws.score else 0
         doc_list.append(
             DocListResponse(
@@ -0,0 +1,236 @@
+"""
+Módulo: document_store.py
+
+Módulo que guarda los metadatos de cada documento (título y resumen) una sola vez,
+indexados por el identificador de arXiv. Los fragmentos del almacén vectorial sólo
+llevan ese identificador y sus posiciones dentro del texto, de modo que el resumen
+no se repite en cada fragmento ni se mezcla con el texto que se incrusta.
+
+Los metadatos se guardan donde los pueden leer todos los procesos de consulta
+(`DOCUMENT_STORE_BACKEND`):
+- "sqlite": una tabla SQLite local (`DOCUMENT_STORE_PATH`, junto a la base de datos).
+- "chroma_http": la colección "documents" del servidor de Chroma remoto, compartida
+  por todos los procesos que usan ese servidor.
+- "auto": "chroma_http" si el almacén vectorial es el servidor de Chroma remoto
+  (`VECTOR_STORE_BACKEND=chroma_http`) y "sqlite" en otro caso.
+"""
+
+import sqlite3
+import threading
+from functools import lru_cache
+from pathlib import Path
+from typing import Dict, Iterable, Optional
+
+from chroma_http_client import create_chroma_http_client
+from config import settings
+
+# SQLite limits the number of parameters per statement
+_LOOKUP_BATCH_SIZE = 900
+
+# Collection of the Chroma server that holds the document metadata
+_CHROMA_COLLECTION = "documents"
+
+
+class DocumentStore:
+    """
+    Tabla de documentos con clave el identificador de arXiv.
+
+    Parámetros:
+    -----------
+    path : Path, opcional
+        Ruta de la base de datos (por defecto, `settings.DOCUMENT_STORE_PATH`).
+    """
+
+    def __init__(self, path: Optional[Path] = None) -> None:
+        self.path = Path(path or settings.DOCUMENT_STORE_PATH)
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        self._lock = threading.Lock()
+        self._connection = sqlite3.connect(str(self.path), check_same_thread=False)
+        self._connection.execute(
+            "CREATE TABLE IF NOT EXISTS documents ("
+            "source TEXT PRIMARY KEY, "
+            "title TEXT NOT NULL, "
+            "abstract TEXT NOT NULL)"
+        )
+        self._connection.commit()
+
+    def put_many(self, metadatas: Iterable[dict]) -> None:
+        """
+        Guarda o actualiza los metadatos de varios documentos.
+
+        Parámetros:
+        -----------
+        metadatas : iterable
+            Diccionarios con las claves 'source', 'title' y 'abstract' (el campo
+            'metadata' de los documentos de `data_loader`).
+        """
+        rows = [
+            (metadata["source"], metadata["title"], metadata["abstract"])
+            for metadata in metadatas
+        ]
+        if not rows:
+            return
+
+        with self._lock, self._connection:
+            self._connection.executemany(
+                "INSERT OR REPLACE INTO documents (source, title, abstract) VALUES (?, ?, ?)",
+                rows,
+            )
+
+    def get_many(self, sources: Iterable[str]) -> Dict[str, dict]:
+        """
+        Recupera los metadatos de varios documentos con una consulta por lote.
+
+        Parámetros:
+        -----------
+        sources : iterable
+            Identificadores de arXiv.
+
+        Devuelve:
+        --------
+        dict
+            Diccionario identificador -> {'source', 'title', 'abstract'}. Los
+            documentos desconocidos no aparecen.
+        """
+        sources = list(dict.fromkeys(sources))
+        documents = {}
+
+        with self._lock:
+            for start in range(0, len(sources), _LOOKUP_BATCH_SIZE):
+                batch = sources[start : start + _LOOKUP_BATCH_SIZE]
+                for source, title, abstract in self._connection.execute(
+                    "SELECT source, title, abstract FROM documents "
+                    f"WHERE source IN ({','.join('?' * len(batch))})",
+                    batch,
+                ):
+                    documents[source] = {
+                        "source": source,
+                        "title": title,
+                        "abstract": abstract,
+                    }
+        return documents
+
+    def count(self) -> int:
+        """
+        Devuelve el número de documentos guardados.
+        """
+        with self._lock:
+            return self._connection.execute(
+                "SELECT COUNT(*) FROM documents"
+            ).fetchone()[0]
+
+    def close(self) -> None:
+        """
+        Cierra la base de datos.
+        """
+        self._connection.close()
+
+
+class ChromaDocumentStore:
+    """
+    Tabla de documentos guardada en una colección del servidor de Chroma remoto,
+    para que todos los procesos de consulta que comparten el servidor lean los
+    mismos títulos y resúmenes. Ofrece la misma interfaz que `DocumentStore`.
+
+    Parámetros:
+    -----------
+    client : chromadb.ClientAPI, opcional
+        Cliente del servidor (por defecto, `create_chroma_http_client()`).
+    """
+
+    def __init__(self, client=None) -> None:
+        self._client = client or create_chroma_http_client()
+        # No embedding function: the collection is only read by id
+        self._collection = self._client.get_or_create_collection(
+            _CHROMA_COLLECTION, embedding_function=None
+        )
+
+    def put_many(self, metadatas: Iterable[dict]) -> None:
+        """
+        Guarda o actualiza los metadatos de varios documentos.
+
+        Parámetros:
+        -----------
+        metadatas : iterable
+            Diccionarios con las claves 'source', 'title' y 'abstract'.
+        """
+        metadatas = list(metadatas)
+        if not metadatas:
+            return
+
+        self._collection.upsert(
+            ids=[metadata["source"] for metadata in metadatas],
+            # Chroma requires an embedding per record; lookups never use it
+            embeddings=[[0.0]] * len(metadatas),
+            metadatas=[
+                {"title": metadata["title"], "abstract": metadata["abstract"]}
+                for metadata in metadatas
+            ],
+        )
+
+    def get_many(self, sources: Iterable[str]) -> Dict[str, dict]:
+        """
+        Recupera los metadatos de varios documentos con una petición por lote.
+
+        Parámetros:
+        -----------
+        sources : iterable
+            Identificadores de arXiv.
+
+        Devuelve:
+        --------
+        dict
+            Diccionario identificador -> {'source', 'title', 'abstract'}. Los
+            documentos desconocidos no aparecen.
+        """
+        sources = list(dict.fromkeys(sources))
+        documents = {}
+
+        for start in range(0, len(sources), _LOOKUP_BATCH_SIZE):
+            result = self._collection.get(
+                ids=sources[start : start + _LOOKUP_BATCH_SIZE],
+                include=["metadatas"],
+            )
+            for source, metadata in zip(result["ids"], result["metadatas"]):
+                documents[source] = {
+                    "source": source,
+                    "title": metadata["title"],
+                    "abstract": metadata["abstract"],
+                }
+        return documents
+
+    def count(self) -> int:
+        """
+        Devuelve el número de documentos guardados.
+        """
+        return self._collection.count()
+
+    def close(self) -> None:
+        """
+        No hace nada: las conexiones pertenecen al cliente de Chroma.
+        """
+
+
+@lru_cache(maxsize=None)
+def get_document_store():
+    """
+    Devuelve la tabla de documentos compartida por todo el proceso, según
+    `DOCUMENT_STORE_BACKEND`.
+
+    Devuelve:
+    --------
+    DocumentStore o ChromaDocumentStore
+        La tabla de documentos.
+    """
+    backend = settings.DOCUMENT_STORE_BACKEND
+    if backend == "auto":
+        backend = (
+            "chroma_http"
+            if settings.VECTOR_STORE_BACKEND == "chroma_http"
+            else "sqlite"
+        )
+    if backend == "chroma_http":
+        return ChromaDocumentStore()
+    if backend == "sqlite":
+        return DocumentStore()
+    raise ValueError(f"Unknown document store backend: {backend}")
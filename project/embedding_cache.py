@@ -0,0 +1,225 @@
+"""
+Módulo: embedding_cache.py
+
+Módulo que implementa una caché de embeddings de consultas. Las consultas repetidas
+(muy habituales tras la transformación de la query) reutilizan el vector ya calculado
+y evitan una pasada completa del modelo de embeddings.
+
+La caché tiene dos niveles: un LRU en memoria y, opcionalmente, una base de datos
+SQLite en disco que sobrevive a los reinicios. Ambos niveles se acotan por número de
+entradas y llevan contadores de aciertos y fallos.
+"""
+
+import hashlib
+import sqlite3
+import threading
+import time
+import unicodedata
+from collections import OrderedDict
+from pathlib import Path
+from typing import Callable, List, Optional
+
+import numpy as np
+from config import settings
+from metrics import increment
+
+
+def normalize_query(query_str: str) -> str:
+    """
+    Normaliza el texto de una consulta para usarlo como clave de la caché.
+
+    Se aplica la normalización Unicode NFC y se colapsan los espacios, sin cambiar
+    mayúsculas ni puntuación, que sí pueden alterar el embedding.
+
+    Parámetros:
+    -----------
+    query_str : str
+        El texto de la consulta.
+
+    Devuelve:
+    --------
+    str
+        El texto normalizado.
+    """
+    return " ".join(unicodedata.normalize("NFC", query_str).split())
+
+
+class QueryEmbeddingCache:
+    """
+    Caché de embeddings de consultas con clave (modelo, consulta normalizada).
+
+    Parámetros:
+    -----------
+    model_name : str, opcional
+        Nombre del modelo de embeddings (por defecto, `settings.EMBED_MODEL_NAME`).
+    max_entries : int, opcional
+        Número máximo de entradas en memoria
+        (por defecto, `settings.QUERY_EMBEDDING_CACHE_SIZE`).
+    path : Path, opcional
+        Ruta de la base de datos SQLite en disco
+        (por defecto, `settings.QUERY_EMBEDDING_CACHE_PATH`; None la desactiva).
+    max_disk_entries : int, opcional
+        Número máximo de entradas en disco
+        (por defecto, `settings.QUERY_EMBEDDING_CACHE_MAX_DISK_ENTRIES`).
+    """
+
+    def __init__(
+        self,
+        model_name: Optional[str] = None,
+        max_entries: Optional[int] = None,
+        path: Optional[Path] = None,
+        max_disk_entries: Optional[int] = None,
+    ) -> None:
+        self._model_name = model_name or settings.EMBED_MODEL_NAME
+        self._max_entries = max_entries or settings.QUERY_EMBEDDING_CACHE_SIZE
+        self._max_disk_entries = (
+            max_disk_entries or settings.QUERY_EMBEDDING_CACHE_MAX_DISK_ENTRIES
+        )
+        self._memory = OrderedDict()
+        self._lock = threading.Lock()
+
+        self.hits = 0
+        self.disk_hits = 0
+        self.misses = 0
+
+        path = path or settings.QUERY_EMBEDDING_CACHE_PATH
+        self._connection = None
+        if path is not None:
+            Path(path).parent.mkdir(parents=True, exist_ok=True)
+            self._connection = sqlite3.connect(str(path), check_same_thread=False)
+            self._connection.execute(
+                "CREATE TABLE IF NOT EXISTS query_embeddings ("
+                "key TEXT PRIMARY KEY, "
+                "embedding BLOB NOT NULL, "
+                "last_used REAL NOT NULL)"
+            )
+            self._connection.execute(
+                "CREATE INDEX IF NOT EXISTS query_embeddings_last_used "
+                "ON query_embeddings (last_used)"
+            )
+            self._connection.commit()
+
+    def _key(self, query_str: str) -> str:
+        raw_key = f"{self._model_name}\x00{normalize_query(query_str)}"
+        return hashlib.sha1(raw_key.encode("utf-8")).hexdigest()
+
+    def _remember(self, key: str, embedding: List[float]) -> None:
+        self._memory[key] = embedding
+        self._memory.move_to_end(key)
+        while len(self._memory) > self._max_entries:
+            self._memory.popitem(last=False)
+
+    def get(self, query_str: str) -> Optional[List[float]]:
+        """
+        Devuelve el embedding cacheado de una consulta, o None si no existe.
+        """
+        key = self._key(query_str)
+        with self._lock:
+            embedding = self._memory.get(key)
+            if embedding is not None:
+                self._memory.move_to_end(key)
+                self.hits += 1
+                increment(
+                    "query_embedding_cache_requests_total", labels={"result": "hit"}
+                )
+                return embedding
+
+            if self._connection is not None:
+                row = self._connection.execute(
+                    "SELECT embedding FROM query_embeddings WHERE key = ?", (key,)
+                ).fetchone()
+                if row is not None:
+                    embedding = np.frombuffer(row[0], dtype=np.float32).tolist()
+                    with self._connection:
+                        self._connection.execute(
+                            "UPDATE query_embeddings SET last_used = ? WHERE key = ?",
+                            (time.time(), key),
+                        )
+                    self._remember(key, embedding)
+                    self.hits += 1
+                    self.disk_hits += 1
+                    increment(
+                        "query_embedding_cache_requests_total",
+                        labels={"result": "disk_hit"},
+                    )
+                    return embedding
+
+            self.misses += 1
+            increment("query_embedding_cache_requests_total", labels={"result": "miss"})
+            return None
+
+    def put(self, query_str: str, embedding: List[float]) -> None:
+        """
+        Guarda el embedding de una consulta en memoria y, si está activado, en disco.
+        """
+        key = self._key(query_str)
+        with self._lock:
+            self._remember(key, embedding)
+
+            if self._connection is not None:
+                blob = np.asarray(embedding, dtype=np.float32).tobytes()
+                with self._connection:
+                    self._connection.execute(
+                        "INSERT OR REPLACE INTO query_embeddings (key, embedding, last_used) "
+                        "VALUES (?, ?, ?)",
+                        (key, blob, time.time()),
+                    )
+                    # Size-based eviction of the least recently used entries
+                    self._connection.execute(
+                        "DELETE FROM query_embeddings WHERE key IN ("
+                        "SELECT key FROM query_embeddings ORDER BY last_used DESC "
+                        "LIMIT -1 OFFSET ?)",
+                        (self._max_disk_entries,),
+                    )
+
+    def get_or_compute(
+        self, query_str: str, compute: Callable[[str], List[float]]
+    ) -> List[float]:
+        """
+        Devuelve el embedding cacheado o lo calcula con `compute` y lo guarda.
+
+        Parámetros:
+        -----------
+        query_str : str
+            El texto de la consulta.
+        compute : callable
+            Función que calcula el embedding (por ejemplo,
+            `embed_model.get_query_embedding`).
+
+        Devuelve:
+        --------
+        List[float]
+            El embedding de la consulta.
+        """
+        embedding = self.get(query_str)
+        if embedding is None:
+            embedding = compute(query_str)
+            self.put(query_str, embedding)
+        return embedding
+
+    def stats(self) -> dict:
+        """
+        Devuelve los contadores de la caché.
+
+        Devuelve:
+        --------
+        dict
+            Diccionario con las claves 'hits', 'disk_hits', 'misses', 'hit_rate' y
+            'memory_entries'.
+        """
+        total = self.hits + self.misses
+        return {
+            "hits": self.hits,
+            "disk_hits": self.disk_hits,
+            "misses": self.misses,
+            "hit_rate": self.hits / total if total else 0.0,
+            "memory_entries": len(self._memory),
+        }
+
+    def close(self) -> None:
+        """
+        Cierra la base de datos en disco, si existe.
+        """
+        if self._connection is not None:
+            self._connection.close()
+            self._connection = None
@@ -4,8 +4,9 @@ Módulo: embedding_setup.py
 Módulo para configurar y devolver un modelo de embeddings basado en HuggingFace.
 """
 
-from llama_index.embeddings.huggingface import HuggingFaceEmbedding
 from config import settings
+from llama_index.embeddings.huggingface import HuggingFaceEmbedding
+
 
 def get_embedding_model():
     """
@@ -18,3 +19,34 @@ def get_embedding_model():
         Una instancia del modelo de embeddings configurado.
     """
     return HuggingFaceEmbedding(model_name=settings.EMBED_MODEL_NAME)
+
+
+def get_query_embedding_batch(embed_model, queries):
+    """
+    Calcula los embeddings de varias consultas en una sola pasada del modelo.
+
+    LlamaIndex sólo ofrece `get_query_embedding` para consultas sueltas, así que se
+    usa `get_text_embedding_batch` añadiendo antes la instrucción de consulta del
+    modelo (por ejemplo, la de los modelos BGE), de modo que el resultado coincide
+    con el de `get_query_embedding`.
+
+    Parámetros:
+    -----------
+    embed_model : object
+        Modelo de embeddings.
+    queries : list
+        Textos de las consultas.
+
+    Devuelve:
+    --------
+    list
+        Los embeddings de las consultas, en el mismo orden.
+    """
+    if isinstance(embed_model, HuggingFaceEmbedding):
+        from llama_index.embeddings.huggingface.utils import format_query
+
+        queries = [
+            format_query(query, embed_model.model_name, embed_model.query_instruction)
+            for query in queries
+        ]
+    return embed_model.get_text_embedding_batch(list(queries))
@@ -0,0 +1,309 @@
+"""
+Módulo: hyde.py
+
+Módulo que implementa la recuperación HyDE (Hypothetical Document Embeddings): un
+modelo de lenguaje escribe varios resúmenes hipotéticos de artículos que responderían
+a la consulta, se calculan sus embeddings en una sola pasada del modelo y se
+promedian con el embedding de la consulta. La búsqueda se realiza con ese vector,
+más parecido a los resúmenes reales que la propia consulta.
+
+Los resúmenes se generan con llamadas simultáneas al backend de `HYDE_LLM_BACKEND`,
+se guardan en la caché de respuestas de LLM y están sujetos a un presupuesto de
+latencia (`HYDE_LATENCY_BUDGET`): si no termina ninguno a tiempo, se usa sólo el
+embedding de la consulta.
+"""
+
+import threading
+import time
+from concurrent.futures import Future, ThreadPoolExecutor, wait
+from functools import lru_cache
+from typing import Any, List, Optional
+
+import numpy as np
+from config import settings
+from llama_index.core.base.llms.types import ChatMessage, MessageRole
+from llm_cache import build_cache_key, get_llm_cache
+from llm_setup import get_stage_client
+from metrics import timed
+
+
+def build_hypothesis_messages(query_str: str) -> List[ChatMessage]:
+    """
+    Construye los mensajes de la llamada que genera un resumen hipotético.
+
+    Parámetros:
+    -----------
+    query_str : str
+        La consulta (ya transformada) del usuario.
+
+    Devuelve:
+    --------
+    List[ChatMessage]
+        Los mensajes para el modelo de lenguaje.
+    """
+    system_content = (
+        "You are a scientific writing assistant. Given a research query, write the abstract of a "
+        "plausible arXiv paper that addresses it. Use the vocabulary and style of real abstracts."
+    )
+    user_content = (
+        f'Research query: "{query_str}"\n\n'
+        "Write a single abstract of 100 to 150 words, in English. Return only the abstract, "
+        "without a title or additional commentary."
+    )
+    return [
+        ChatMessage(role=MessageRole.SYSTEM, content=system_content),
+        ChatMessage(role=MessageRole.USER, content=user_content),
+    ]
+
+
+@lru_cache(maxsize=None)
+def _get_executor() -> ThreadPoolExecutor:
+    # Shared by all queries; the gateway still enforces the global LLM limits
+    return ThreadPoolExecutor(
+        max_workers=settings.LLM_MAX_CONCURRENCY, thread_name_prefix="hyde"
+    )
+
+
+def generate_hypotheses_many(
+    query_strs: List[str],
+    num_hypotheses: Optional[int] = None,
+    latency_budget: Optional[float] = None,
+) -> List[List[str]]:
+    """
+    Genera resúmenes hipotéticos para varias consultas con llamadas simultáneas al
+    LLM.
+
+    Cada resumen es una llamada independiente con temperatura `HYDE_TEMPERATURE`, de
+    modo que funciona igual con la pasarela de OpenAI y con el modelo local. Las
+    llamadas de todas las consultas se envían a la vez y comparten un único
+    presupuesto de latencia, que también es el tiempo máximo de cada llamada. El
+    conjunto completo de cada consulta se guarda en la caché de respuestas de LLM,
+    también si termina tras agotarse el presupuesto; en ese caso se devuelven los
+    resúmenes terminados a tiempo.
+
+    Parámetros:
+    -----------
+    query_strs : list
+        Las consultas de los usuarios.
+    num_hypotheses : int, opcional
+        Número de resúmenes por consulta (por defecto, `settings.HYDE_NUM_HYPOTHESES`).
+    latency_budget : float, opcional
+        Segundos máximos de espera (por defecto, `settings.HYDE_LATENCY_BUDGET`;
+        0 espera sin límite).
+
+    Devuelve:
+    --------
+    List[List[str]]
+        Los resúmenes de cada consulta, en el mismo orden. Una lista puede estar
+        vacía si no termina ninguno a tiempo o si las llamadas fallan.
+    """
+    num_hypotheses = num_hypotheses or settings.HYDE_NUM_HYPOTHESES
+    latency_budget = (
+        settings.HYDE_LATENCY_BUDGET if latency_budget is None else latency_budget
+    )
+
+    client, model = get_stage_client(
+        settings.HYDE_LLM_BACKEND, settings.OPENAI_GENERATOR_MODEL
+    )
+    cache = get_llm_cache()
+
+    # With a budget, every call gets the time left as its timeout and no retries,
+    # so that a late call does not hold an LLM slot long after the search moved on
+    deadline = time.monotonic() + latency_budget if latency_budget else None
+
+    def _complete(messages):
+        timeout = None
+        if deadline is not None:
+            timeout = deadline - time.monotonic()
+            if timeout <= 0:
+                raise TimeoutError("The HyDE latency budget ran out before the call")
+        return client.complete(
+            messages,
+            model=model,
+            temperature=settings.HYDE_TEMPERATURE,
+            timeout=timeout,
+            max_retries=0 if deadline is not None else None,
+        )
+
+    hypotheses_by_query = {}
+    futures_by_query = {}
+    for query_str in dict.fromkeys(query_strs):
+        messages = build_hypothesis_messages(query_str)
+        # The sample count is part of the key: a cached set is reused only as a whole
+        cache_key = build_cache_key(model, messages, {"hypotheses": num_hypotheses})
+        cached = cache.get(cache_key)
+        if cached is not None:
+            cache.record_hit()
+            hypotheses_by_query[query_str] = cached
+            continue
+        cache.record_miss()
+        futures = [
+            _get_executor().submit(_complete, messages) for _ in range(num_hypotheses)
+        ]
+        _cache_when_complete(cache, cache_key, futures)
+        futures_by_query[query_str] = futures
+
+    all_futures = [
+        future for futures in futures_by_query.values() for future in futures
+    ]
+    done, pending = wait(all_futures, timeout=latency_budget or None)
+    # Calls that have not started yet are dropped; running ones finish within the
+    # budget and, if their whole set succeeds, still fill the cache
+    for future in pending:
+        future.cancel()
+
+    for query_str, futures in futures_by_query.items():
+        hypotheses_by_query[query_str] = _collect_hypotheses(
+            future for future in futures if future in done
+        )
+
+    return [hypotheses_by_query[query_str] for query_str in query_strs]
+
+
+def _collect_hypotheses(futures) -> List[str]:
+    return [
+        future.result().strip()
+        for future in futures
+        if not future.cancelled()
+        and future.exception() is None
+        and future.result().strip()
+    ]
+
+
+def _cache_when_complete(cache, cache_key: str, futures: List[Future]) -> None:
+    """
+    Guarda en la caché el conjunto de resúmenes de una consulta cuando terminan
+    todas sus llamadas, aunque sea después de agotarse el presupuesto de latencia.
+    Los conjuntos incompletos (fallos, cancelaciones) no se guardan, de modo que las
+    búsquedas posteriores vuelven a intentarlo.
+    """
+    remaining = [len(futures)]
+    lock = threading.Lock()
+
+    def _on_done(_):
+        with lock:
+            remaining[0] -= 1
+            if remaining[0]:
+                return
+        hypotheses = _collect_hypotheses(futures)
+        if len(hypotheses) == len(futures):
+            cache.set(cache_key, hypotheses)
+
+    for future in futures:
+        future.add_done_callback(_on_done)
+
+
+def generate_hypotheses(
+    query_str: str,
+    num_hypotheses: Optional[int] = None,
+    latency_budget: Optional[float] = None,
+) -> List[str]:
+    """
+    Genera resúmenes hipotéticos para una consulta (ver `generate_hypotheses_many`).
+
+    Devuelve:
+    --------
+    List[str]
+        Los resúmenes generados. Puede estar vacía si no termina ninguno a tiempo o
+        si las llamadas fallan.
+    """
+    return generate_hypotheses_many([query_str], num_hypotheses, latency_budget)[0]
+
+
+def fuse_embeddings(
+    query_embedding: List[float], hypothesis_embeddings: List[Any]
+) -> List[float]:
+    """
+    Combina el embedding de la consulta con los de los resúmenes hipotéticos: la
+    media de los vectores normalizados, normalizada de nuevo. La consulta cuenta como
+    un resumen más.
+
+    Parámetros:
+    -----------
+    query_embedding : list
+        Embedding de la consulta.
+    hypothesis_embeddings : list
+        Embeddings de los resúmenes hipotéticos.
+
+    Devuelve:
+    --------
+    List[float]
+        El embedding combinado.
+    """
+    vectors = np.asarray([query_embedding, *hypothesis_embeddings], dtype=np.float32)
+    vectors /= np.maximum(np.linalg.norm(vectors, axis=1, keepdims=True), 1e-12)
+    fused = vectors.mean(axis=0)
+    fused /= max(float(np.linalg.norm(fused)), 1e-12)
+    return fused.tolist()
+
+
+@timed("hyde")
+def build_hyde_embeddings(
+    query_strs: List[str],
+    query_embeddings: List[List[float]],
+    embed_model,
+    num_hypotheses: Optional[int] = None,
+    latency_budget: Optional[float] = None,
+) -> List[List[float]]:
+    """
+    Calcula los embeddings de búsqueda HyDE de varias consultas.
+
+    Los resúmenes de todas las consultas se generan a la vez, dentro de un único
+    presupuesto de latencia, y se incrustan en un solo lote.
+
+    Parámetros:
+    -----------
+    query_strs : list
+        Las consultas de los usuarios.
+    query_embeddings : list
+        Embeddings de las consultas, en el mismo orden.
+    embed_model : Any
+        Modelo de embeddings. Los resúmenes se incrustan como documentos.
+    num_hypotheses : int, opcional
+        Número de resúmenes por consulta (por defecto, `settings.HYDE_NUM_HYPOTHESES`).
+    latency_budget : float, opcional
+        Segundos máximos de generación (por defecto, `settings.HYDE_LATENCY_BUDGET`).
+
+    Devuelve:
+    --------
+    List[List[float]]
+        Para cada consulta, el embedding combinado o, si no se ha generado ningún
+        resumen, el embedding de la consulta sin cambios.
+    """
+    hypotheses = generate_hypotheses_many(query_strs, num_hypotheses, latency_budget)
+    texts = [text for query_hypotheses in hypotheses for text in query_hypotheses]
+    if not texts:
+        return list(query_embeddings)
+
+    text_embeddings = iter(embed_model.get_text_embedding_batch(texts))
+    fused = []
+    for query_embedding, query_hypotheses in zip(query_embeddings, hypotheses):
+        hypothesis_embeddings = [next(text_embeddings) for _ in query_hypotheses]
+        fused.append(
+            fuse_embeddings(query_embedding, hypothesis_embeddings)
+            if hypothesis_embeddings
+            else query_embedding
+        )
+    return fused
+
+
+def build_hyde_embedding(
+    query_str: str,
+    query_embedding: List[float],
+    embed_model,
+    num_hypotheses: Optional[int] = None,
+    latency_budget: Optional[float] = None,
+) -> List[float]:
+    """
+    Calcula el embedding de búsqueda HyDE de una consulta (ver
+    `build_hyde_embeddings`).
+
+    Devuelve:
+    --------
+    List[float]
+        El embedding combinado o, si no se ha generado ningún resumen, el embedding
+        de la consulta sin cambios.
+    """
+    return build_hyde_embeddings(
+        [query_str], [query_embedding], embed_model, num_hypotheses, latency_budget
+    )[0]
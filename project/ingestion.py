@@ -0,0 +1,354 @@
+"""
+Módulo: ingestion.py
+
+Módulo que encadena la carga, división, creación de nodos e incrustación de los
+documentos en un único flujo en streaming. Cada documento se lee, se divide en
+fragmentos, se convierte en nodos, se incrusta y se escribe en el almacén vectorial
+en lotes acotados, de forma que la memoria máxima depende del tamaño de lote y no
+del tamaño del corpus.
+
+Si se proporciona un `IngestionLedger`, la ingesta es reanudable e incremental: se
+continúa desde el último punto de control y sólo se incrustan los documentos nuevos
+o cuyo contenido ha cambiado.
+
+Con `INGEST_WORKERS > 1` el fichero se reparte en rangos de documentos (según el
+índice de `ArxivSnapshot`) entre un conjunto de procesos que decodifican, dividen e incrustan los documentos, mientras el proceso
+principal actúa como único escritor del almacén vectorial. Los bloques se consumen
+en el orden del fichero y los identificadores de los nodos son deterministas, por lo
+que el resultado no depende del número de procesos.
+"""
+
+import os
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+
+from config import settings
+from data_loader import ArxivSnapshot, matches_categories, parse_document_line
+from document_store import get_document_store
+from ingestion_ledger import IngestionLedger, compute_content_hash
+from vector_store_setup import (
+    build_document_nodes,
+    embed_and_add_nodes,
+    embed_nodes,
+    get_text_parser,
+)
+
+# Per-process state of the parallel ingestion workers
+_worker_state = {}
+
+
+class _LedgerTracker:
+    """
+    Sigue el progreso de los documentos en curso y los registra en el ledger en
+    cuanto todos sus nodos se han escrito en el almacén vectorial, respetando el
+    orden del fichero para que el punto de control sea siempre consistente.
+    """
+
+    def __init__(self, ledger, fingerprint, start_offset, start_count):
+        self._ledger = ledger
+        self._fingerprint = fingerprint
+        self._offset = start_offset
+        self.doc_count = start_count
+
+        # Entries: [source, offset, end_offset, index, content_hash, remaining_chunks]
+        self._pending = deque()
+        self._in_flight = {}
+
+    def register(self, doc, content_hash, num_chunks):
+        entry = [
+            doc["metadata"]["source"],
+            doc["offset"],
+            doc["end_offset"],
+            doc["index"],
+            content_hash,
+            num_chunks,
+        ]
+        self._pending.append(entry)
+        if num_chunks > 0:
+            self._in_flight.setdefault(entry[0], deque()).append(entry)
+
+    def on_flush(self, nodes):
+        for node in nodes:
+            entries = self._in_flight[node.ref_doc_id]
+            entries[0][5] -= 1
+            if entries[0][5] == 0:
+                entries.popleft()
+                if not entries:
+                    del self._in_flight[node.ref_doc_id]
+        self.commit()
+
+    def commit(self, exhausted=False):
+        completed = []
+        while self._pending and self._pending[0][5] == 0:
+            source, offset, end_offset, index, content_hash, _ = self._pending.popleft()
+            if content_hash is not None:
+                completed.append((source, offset, content_hash))
+            self._offset = end_offset
+            self.doc_count = index + 1
+
+        self._ledger.record(
+            completed, self._fingerprint, self._offset, self.doc_count, exhausted
+        )
+
+    def finish(self, doc_count, offset, exhausted):
+        """
+        Registra el final del rango recorrido, incluidos los documentos descartados
+        por el filtro de categorías, que nunca llegan a registrarse.
+        """
+        self.commit()
+        self.doc_count, self._offset = doc_count, offset
+        self.commit(exhausted)
+
+
+def open_ledger(collection):
+    """
+    Abre el registro de ingesta asociado a una colección.
+
+    Si la colección está vacía, el registro se reinicia (por ejemplo, tras borrar la
+    base de datos). Si la colección contiene nodos pero el registro no tiene punto de
+    control, la colección se creó sin ledger y no se puede reanudar con seguridad.
+
+    Parámetros:
+    -----------
+    collection : Collection
+        Colección de Chroma donde se almacenan los nodos.
+
+    Devuelve:
+    --------
+    IngestionLedger
+        El registro de ingesta, o None si la colección no está gestionada por él.
+    """
+    ledger = IngestionLedger()
+    if collection.count() == 0:
+        ledger.reset()
+    elif ledger.get_checkpoint() is None:
+        ledger.close()
+        return None
+    return ledger
+
+
+def _process_documents(documents, text_parser, ledger=None, categories=None):
+    """
+    Divide cada documento en nodos y, si hay ledger, compara su hash con el registrado.
+
+    Devuelve:
+    --------
+    generator
+        Tuplas (doc, content_hash, previous_hash, nodes). Los documentos sin cambios
+        se entregan con una lista de nodos vacía.
+    """
+    for doc in documents:
+        if categories and not matches_categories(doc["categories"], categories):
+            continue
+
+        content_hash, previous_hash = None, None
+        if ledger is not None:
+            content_hash = compute_content_hash(doc["text"])
+            previous_hash = ledger.get_content_hash(doc["metadata"]["source"])
+            if previous_hash == content_hash:
+                yield doc, content_hash, previous_hash, []
+                continue
+
+        yield doc, content_hash, previous_hash, build_document_nodes(doc, text_parser)
+
+
+def _init_worker(file_path, ledger_path, categories, torch_threads):
+    """
+    Inicializa un proceso de trabajo: abre el fichero y carga el modelo de
+    embeddings una única vez.
+    """
+    import torch
+    from embedding_setup import get_embedding_model
+
+    # Avoid oversubscribing the cores when several workers run torch in parallel
+    torch.set_num_threads(torch_threads)
+
+    _worker_state["snapshot"] = ArxivSnapshot(file_path)
+    _worker_state["embed_model"] = get_embedding_model()
+    _worker_state["text_parser"] = get_text_parser()
+    _worker_state["ledger"] = IngestionLedger(ledger_path) if ledger_path else None
+    _worker_state["categories"] = categories
+
+
+def _process_block(block_range):
+    """
+    Decodifica, divide e incrusta un rango de documentos en un proceso de trabajo.
+    """
+    snapshot = _worker_state["snapshot"]
+    documents = (
+        parse_document_line(*raw_line) for raw_line in snapshot.iter_raw(*block_range)
+    )
+    results = list(
+        _process_documents(
+            documents,
+            _worker_state["text_parser"],
+            _worker_state["ledger"],
+            _worker_state["categories"],
+        )
+    )
+
+    embed_nodes(
+        [node for *_, doc_nodes in results for node in doc_nodes],
+        _worker_state["embed_model"],
+    )
+
+    # The full text is already inside the nodes, no need to send it back
+    for doc, *_ in results:
+        doc.pop("text")
+    return results
+
+
+def _iter_processed_parallel(snapshot, start, stop, workers, ledger, categories):
+    """
+    Reparte rangos de documentos entre los procesos de trabajo y entrega los
+    resultados en el orden del fichero, con un número acotado de bloques en vuelo.
+    """
+    ledger_path = str(ledger.path) if ledger is not None else None
+    torch_threads = max(1, (os.cpu_count() or 1) // workers)
+    max_in_flight = workers * 2
+    block_size = settings.INGEST_BLOCK_SIZE
+
+    with ProcessPoolExecutor(
+        max_workers=workers,
+        initializer=_init_worker,
+        initargs=(snapshot.file_path, ledger_path, categories, torch_threads),
+    ) as executor:
+        futures = deque()
+        for block_start in range(start, stop, block_size):
+            block_range = (block_start, min(block_start + block_size, stop))
+            futures.append(executor.submit(_process_block, block_range))
+            if len(futures) >= max_in_flight:
+                yield from futures.popleft().result()
+
+        while futures:
+            yield from futures.popleft().result()
+
+
+def ingest_documents(
+    embed_model,
+    vector_store,
+    max_docs=None,
+    ledger=None,
+    workers=None,
+    categories=None,
+):
+    """
+    Ejecuta la ingesta completa de documentos en el almacén vectorial.
+
+    Parámetros:
+    -----------
+    embed_model : object
+        Modelo utilizado para generar incrustaciones de texto. Sólo se utiliza en
+        modo serie; cada proceso de trabajo carga su propia instancia.
+    vector_store : ChromaVectorStore
+        Instancia del almacén vectorial donde se almacenarán los nodos incrustados.
+    max_docs : int, opcional
+        Número máximo de líneas del fichero a considerar (por defecto es None).
+    ledger : IngestionLedger, opcional
+        Registro de ingesta. Si se indica, la ingesta se reanuda desde el último
+        punto de control y omite los documentos ya incrustados sin cambios.
+    workers : int, opcional
+        Número de procesos de trabajo. Por defecto, `settings.INGEST_WORKERS`.
+    categories : list, opcional
+        Categorías de arXiv a ingerir. Por defecto, `settings.ARXIV_CATEGORIES`.
+
+    Devuelve:
+    --------
+    dict
+        Estadísticas de la ingesta devueltas por `embed_and_add_nodes`.
+    """
+    workers = workers or settings.INGEST_WORKERS
+    categories = list(
+        categories if categories is not None else settings.ARXIV_CATEGORIES
+    )
+
+    with ArxivSnapshot() as snapshot:
+        stop = len(snapshot) if max_docs is None else min(max_docs, len(snapshot))
+
+        start, start_offset = 0, 0
+        tracker = None
+        if ledger is not None:
+            # A different category filter invalidates the checkpoint as well
+            fingerprint = f"{snapshot.fingerprint}|{','.join(sorted(categories))}"
+            checkpoint = ledger.get_checkpoint()
+
+            if checkpoint is not None and checkpoint["fingerprint"] == fingerprint:
+                if checkpoint["exhausted"] or checkpoint["doc_count"] >= stop:
+                    print(
+                        f"Skipping ingestion because the ledger already covers "
+                        f"{checkpoint['doc_count']} documents of this snapshot."
+                    )
+                    return {"chunks": 0, "seconds": 0.0, "chunks_per_second": 0.0}
+
+                start, start_offset = checkpoint["doc_count"], checkpoint["offset"]
+                print(f"Resuming ingestion after {start} documents...")
+            elif checkpoint is not None:
+                print(
+                    "New snapshot detected, embedding only new or changed documents..."
+                )
+
+            tracker = _LedgerTracker(ledger, fingerprint, start_offset, start)
+
+        if workers > 1:
+            print(f"Ingesting with {workers} worker processes...")
+            processed = _iter_processed_parallel(
+                snapshot, start, stop, workers, ledger, categories
+            )
+        else:
+            processed = _process_documents(
+                snapshot.iter_documents(start, stop),
+                get_text_parser(),
+                ledger,
+                categories,
+            )
+
+        document_store = get_document_store()
+        pending_metadatas = []
+
+        def _save_document(doc):
+            # Title and abstract are stored once per document, not on every chunk.
+            # Writes are batched; a search racing the ingestion may briefly miss a
+            # row and fall back to the defaults of build_doc_list_response.
+            pending_metadatas.append(doc["metadata"])
+            if len(pending_metadatas) >= settings.EMBED_BATCH_SIZE:
+                document_store.put_many(pending_metadatas)
+                pending_metadatas.clear()
+
+        def _iter_pending_nodes():
+            for doc, content_hash, previous_hash, doc_nodes in processed:
+                if tracker is None:
+                    _save_document(doc)
+                    yield from doc_nodes
+                    continue
+
+                if previous_hash == content_hash:
+                    # Already embedded and unchanged
+                    tracker.register(doc, None, 0)
+                    continue
+
+                if previous_hash is not None:
+                    # The abstract changed: drop the stale nodes before re-embedding
+                    vector_store.delete(doc["metadata"]["source"])
+
+                _save_document(doc)
+                tracker.register(doc, content_hash, len(doc_nodes))
+                yield from doc_nodes
+
+        stats = embed_and_add_nodes(
+            _iter_pending_nodes(),
+            embed_model,
+            vector_store,
+            on_flush=tracker.on_flush if tracker is not None else None,
+        )
+        document_store.put_many(pending_metadatas)
+
+        if hasattr(vector_store, "refresh_index"):
+            # Build the ANN index now rather than on the first search
+            vector_store.refresh_index()
+
+        if tracker is not None:
+            # Record the end of the range, including unchanged or filtered documents
+            end_offset = snapshot.get_raw(stop - 1)[3] if stop > 0 else 0
+            tracker.finish(stop, end_offset, exhausted=stop >= len(snapshot))
+
+    return stats
@@ -0,0 +1,151 @@
+"""
+Módulo: ingestion_ledger.py
+
+Módulo que implementa un registro (ledger) persistente de la ingesta de documentos.
+Guarda, en una base de datos SQLite junto a `DATABASE_PATH`, qué documentos de arXiv
+ya se han incrustado (identificador, posición en bytes y hash del contenido) y el
+punto de control desde el que reanudar la lectura del fichero.
+"""
+
+import hashlib
+import sqlite3
+from pathlib import Path
+from typing import Iterable, Optional, Tuple
+
+from config import settings
+
+
+def compute_content_hash(text: str) -> str:
+    """
+    Calcula el hash del contenido de un documento.
+
+    Parámetros:
+    -----------
+    text : str
+        Texto del documento (título y resumen combinados).
+
+    Devuelve:
+    --------
+    str
+        El hash SHA-1 del texto en hexadecimal.
+    """
+    return hashlib.sha1(text.encode("utf-8")).hexdigest()
+
+
+class IngestionLedger:
+    """
+    Registro persistente de los documentos ya incrustados en el almacén vectorial.
+
+    Parámetros:
+    -----------
+    path : Path, opcional
+        Ruta del fichero SQLite (por defecto, `settings.INGESTION_LEDGER_PATH`).
+    """
+
+    def __init__(self, path: Optional[Path] = None) -> None:
+        self.path = Path(path or settings.INGESTION_LEDGER_PATH)
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        self._connection = sqlite3.connect(str(self.path))
+        self._connection.execute(
+            "CREATE TABLE IF NOT EXISTS documents ("
+            "source TEXT PRIMARY KEY, "
+            "offset INTEGER NOT NULL, "
+            "content_hash TEXT NOT NULL)"
+        )
+        self._connection.execute(
+            "CREATE TABLE IF NOT EXISTS checkpoint ("
+            "id INTEGER PRIMARY KEY CHECK (id = 0), "
+            "fingerprint TEXT NOT NULL, "
+            "offset INTEGER NOT NULL, "
+            "doc_count INTEGER NOT NULL, "
+            "exhausted INTEGER NOT NULL)"
+        )
+        self._connection.commit()
+
+    def get_content_hash(self, source: str) -> Optional[str]:
+        """
+        Devuelve el hash registrado para un documento, o None si no se ha ingerido.
+        """
+        row = self._connection.execute(
+            "SELECT content_hash FROM documents WHERE source = ?", (source,)
+        ).fetchone()
+        return row[0] if row else None
+
+    def record(
+        self,
+        entries: Iterable[Tuple[str, int, str]],
+        fingerprint: str,
+        offset: int,
+        doc_count: int,
+        exhausted: bool = False,
+    ) -> None:
+        """
+        Registra documentos completamente escritos y actualiza el punto de control
+        en una única transacción.
+
+        Parámetros:
+        -----------
+        entries : iterable
+            Tuplas (source, offset, content_hash) de los documentos completados.
+        fingerprint : str
+            Huella del fichero de datos que se está ingiriendo.
+        offset : int
+            Posición en bytes desde la que reanudar la lectura.
+        doc_count : int
+            Número de documentos del fichero anteriores a `offset`.
+        exhausted : bool, opcional
+            Indica si se ha llegado al final del fichero.
+        """
+        with self._connection:
+            self._connection.executemany(
+                "INSERT OR REPLACE INTO documents (source, offset, content_hash) "
+                "VALUES (?, ?, ?)",
+                entries,
+            )
+            self._connection.execute(
+                "INSERT OR REPLACE INTO checkpoint "
+                "(id, fingerprint, offset, doc_count, exhausted) VALUES (0, ?, ?, ?, ?)",
+                (fingerprint, offset, doc_count, int(exhausted)),
+            )
+
+    def get_checkpoint(self) -> Optional[dict]:
+        """
+        Devuelve el último punto de control, o None si no existe.
+
+        Devuelve:
+        --------
+        dict
+            Diccionario con las claves 'fingerprint', 'offset', 'doc_count' y
+            'exhausted'.
+        """
+        row = self._connection.execute(
+            "SELECT fingerprint, offset, doc_count, exhausted FROM checkpoint"
+        ).fetchone()
+        if row is None:
+            return None
+        return {
+            "fingerprint": row[0],
+            "offset": row[1],
+            "doc_count": row[2],
+            "exhausted": bool(row[3]),
+        }
+
+    def count(self) -> int:
+        """
+        Devuelve el número de documentos registrados.
+        """
+        return self._connection.execute("SELECT COUNT(*) FROM documents").fetchone()[0]
+
+    def reset(self) -> None:
+        """
+        Elimina todos los documentos registrados y el punto de control.
+        """
+        with self._connection:
+            self._connection.execute("DELETE FROM documents")
+            self._connection.execute("DELETE FROM checkpoint")
+
+    def close(self) -> None:
+        """
+        Cierra la conexión con la base de datos del registro.
+        """
+        self._connection.close()
@@ -7,6 +7,8 @@ Incluye funciones para cargar el modelo y detectar el idioma de un texto dado.
 
 import fasttext as ft
 from config import settings
+from metrics import timed
+
 
 def load_language_detection_model() -> ft.FastText:
     """
@@ -24,6 +26,7 @@ def load_language_detection_model() -> ft.FastText:
     return model
 
 
+@timed("detect_language")
 def detect_language(query: str, model: ft.FastText) -> str:
     """
     Detecta el idioma de un texto dado utilizando un modelo de FastText.
@@ -44,4 +47,4 @@ def detect_language(query: str, model: ft.FastText) -> str:
         El código del idioma detectado, como 'es' (español) o 'en' (inglés).
     """
     prediction = model.predict(query, k=1)
-    return settings.FASTTEXT_LANGUAGES_MAP[prediction[0][0].replace('__label__', '')]
+    return settings.FASTTEXT_LANGUAGES_MAP[prediction[0][0].replace("__label__", "")]
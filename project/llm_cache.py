@@ -0,0 +1,375 @@
+"""
+Módulo: llm_cache.py
+
+Módulo que implementa una caché direccionada por contenido para las llamadas a los
+modelos de lenguaje (transformación de la query, filtro de correlación y generación
+de la respuesta). La clave se calcula a partir del modelo, los mensajes y el formato
+de respuesta, por lo que búsquedas repetidas devuelven el resultado en milisegundos.
+
+El almacenamiento es intercambiable (`LLM_CACHE_BACKEND`):
+- "memory": LRU en memoria del proceso.
+- "sqlite": base de datos SQLite local, compartida entre procesos.
+- "redis": servidor Redis (por ejemplo, una instancia local).
+- "none": sin caché.
+Todas las implementaciones admiten caducidad (TTL).
+"""
+
+import hashlib
+import json
+import sqlite3
+import threading
+import time
+from abc import ABC, abstractmethod
+from collections import OrderedDict
+from functools import lru_cache
+from pathlib import Path
+from typing import Any, Awaitable, Callable, Optional
+
+from config import settings
+from metrics import increment
+
+
+def _message_to_dict(message) -> dict:
+    if isinstance(message, dict):
+        role, content = message["role"], message["content"]
+    else:
+        role, content = message.role, message.content
+
+    role = getattr(role, "value", role)
+    # Whitespace differences do not change the meaning of a prompt
+    return {"role": str(role), "content": " ".join(str(content).split())}
+
+
+def build_cache_key(
+    model: str, messages, response_format=None, temperature: Optional[float] = None
+) -> str:
+    """
+    Calcula la clave de caché de una llamada a un modelo de lenguaje.
+
+    Parámetros:
+    -----------
+    model : str
+        Nombre del modelo.
+    messages : list
+        Mensajes de la llamada (`ChatMessage` o diccionarios con 'role' y 'content').
+    response_format : object, opcional
+        Formato de respuesta estructurada (por ejemplo, un modelo de pydantic).
+    temperature : float, opcional
+        Temperatura de muestreo de la llamada.
+
+    Devuelve:
+    --------
+    str
+        El hash SHA-256 de la llamada en hexadecimal.
+    """
+    if response_format is not None and hasattr(response_format, "model_json_schema"):
+        response_format = response_format.model_json_schema()
+
+    call = {
+        "model": model,
+        "messages": [_message_to_dict(message) for message in messages],
+        "response_format": response_format,
+    }
+    # Only part of the key when set, so that existing entries keep their keys
+    if temperature is not None:
+        call["temperature"] = temperature
+    payload = json.dumps(
+        call,
+        sort_keys=True,
+        ensure_ascii=False,
+        default=str,
+    )
+    return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+
+class LLMCache(ABC):
+    """
+    Interfaz común de los almacenes de la caché de respuestas de LLM.
+
+    Parámetros:
+    -----------
+    ttl : float, opcional
+        Segundos de validez de cada entrada (por defecto, `settings.LLM_CACHE_TTL`;
+        0 significa sin caducidad).
+    """
+
+    def __init__(self, ttl: Optional[float] = None) -> None:
+        self._ttl = settings.LLM_CACHE_TTL if ttl is None else ttl
+        self.hits = 0
+        self.misses = 0
+
+    def _expires_at(self) -> Optional[float]:
+        return time.time() + self._ttl if self._ttl else None
+
+    def record_hit(self) -> None:
+        """
+        Registra un acierto de la caché (contador propio y métrica del proceso).
+        """
+        self.hits += 1
+        increment("llm_cache_requests_total", labels={"result": "hit"})
+
+    def record_miss(self) -> None:
+        """
+        Registra un fallo de la caché (contador propio y métrica del proceso).
+        """
+        self.misses += 1
+        increment("llm_cache_requests_total", labels={"result": "miss"})
+
+    @abstractmethod
+    def get(self, key: str) -> Optional[Any]:
+        """
+        Devuelve el valor guardado para `key`, o None si no existe o ha caducado.
+        """
+
+    @abstractmethod
+    def set(self, key: str, value: Any) -> None:
+        """
+        Guarda `value` para `key` con la caducidad configurada.
+        """
+
+    def get_or_compute(self, key: str, compute: Callable[[], Any]) -> Any:
+        """
+        Devuelve el valor cacheado para `key` o lo calcula con `compute` y lo guarda.
+
+        Parámetros:
+        -----------
+        key : str
+            Clave calculada con `build_cache_key`.
+        compute : callable
+            Función sin argumentos que realiza la llamada al modelo. Su resultado
+            debe poder serializarse como JSON.
+
+        Devuelve:
+        --------
+        Any
+            El resultado de la llamada.
+        """
+        value = self.get(key)
+        if value is not None:
+            self.record_hit()
+            return value
+
+        self.record_miss()
+        value = compute()
+        self.set(key, value)
+        return value
+
+    async def aget_or_compute(
+        self, key: str, acompute: Callable[[], Awaitable[Any]]
+    ) -> Any:
+        """
+        Versión asíncrona de `get_or_compute`: `acompute` es una corrutina sin
+        argumentos que realiza la llamada al modelo.
+        """
+        value = self.get(key)
+        if value is not None:
+            self.record_hit()
+            return value
+
+        self.record_miss()
+        value = await acompute()
+        self.set(key, value)
+        return value
+
+    def stats(self) -> dict:
+        """
+        Devuelve los contadores de aciertos y fallos de la caché.
+        """
+        total = self.hits + self.misses
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": self.hits / total if total else 0.0,
+        }
+
+
+class NullLLMCache(LLMCache):
+    """
+    Caché desactivada: todas las llamadas llegan al modelo.
+    """
+
+    def get(self, key: str) -> Optional[Any]:
+        return None
+
+    def set(self, key: str, value: Any) -> None:
+        pass
+
+
+class MemoryLLMCache(LLMCache):
+    """
+    Caché LRU en la memoria del proceso.
+
+    Parámetros:
+    -----------
+    max_entries : int, opcional
+        Número máximo de entradas (por defecto, `settings.LLM_CACHE_MAX_ENTRIES`).
+    ttl : float, opcional
+        Segundos de validez de cada entrada.
+    """
+
+    def __init__(
+        self, max_entries: Optional[int] = None, ttl: Optional[float] = None
+    ) -> None:
+        super().__init__(ttl)
+        self._max_entries = max_entries or settings.LLM_CACHE_MAX_ENTRIES
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key: str) -> Optional[Any]:
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                return None
+
+            value, expires_at = entry
+            if expires_at is not None and expires_at < time.time():
+                del self._entries[key]
+                return None
+
+            self._entries.move_to_end(key)
+            return value
+
+    def set(self, key: str, value: Any) -> None:
+        with self._lock:
+            self._entries[key] = (value, self._expires_at())
+            self._entries.move_to_end(key)
+            while len(self._entries) > self._max_entries:
+                self._entries.popitem(last=False)
+
+
+class SQLiteLLMCache(LLMCache):
+    """
+    Caché persistente en una base de datos SQLite local.
+
+    Parámetros:
+    -----------
+    path : Path, opcional
+        Ruta de la base de datos (por defecto, `settings.LLM_CACHE_PATH`).
+    max_entries : int, opcional
+        Número máximo de entradas (por defecto, `settings.LLM_CACHE_MAX_ENTRIES`).
+    ttl : float, opcional
+        Segundos de validez de cada entrada.
+    """
+
+    def __init__(
+        self,
+        path: Optional[Path] = None,
+        max_entries: Optional[int] = None,
+        ttl: Optional[float] = None,
+    ) -> None:
+        super().__init__(ttl)
+        self._max_entries = max_entries or settings.LLM_CACHE_MAX_ENTRIES
+        self._lock = threading.Lock()
+
+        path = Path(path or settings.LLM_CACHE_PATH)
+        path.parent.mkdir(parents=True, exist_ok=True)
+        self._connection = sqlite3.connect(str(path), check_same_thread=False)
+        self._connection.execute(
+            "CREATE TABLE IF NOT EXISTS llm_responses ("
+            "key TEXT PRIMARY KEY, "
+            "value TEXT NOT NULL, "
+            "expires_at REAL, "
+            "last_used REAL NOT NULL)"
+        )
+        self._connection.execute(
+            "CREATE INDEX IF NOT EXISTS llm_responses_last_used "
+            "ON llm_responses (last_used)"
+        )
+        self._connection.commit()
+
+    def get(self, key: str) -> Optional[Any]:
+        with self._lock:
+            row = self._connection.execute(
+                "SELECT value, expires_at FROM llm_responses WHERE key = ?", (key,)
+            ).fetchone()
+            if row is None:
+                return None
+
+            value, expires_at = row
+            with self._connection:
+                if expires_at is not None and expires_at < time.time():
+                    self._connection.execute(
+                        "DELETE FROM llm_responses WHERE key = ?", (key,)
+                    )
+                    return None
+
+                self._connection.execute(
+                    "UPDATE llm_responses SET last_used = ? WHERE key = ?",
+                    (time.time(), key),
+                )
+            return json.loads(value)
+
+    def set(self, key: str, value: Any) -> None:
+        with self._lock, self._connection:
+            self._connection.execute(
+                "INSERT OR REPLACE INTO llm_responses (key, value, expires_at, last_used) "
+                "VALUES (?, ?, ?, ?)",
+                (
+                    key,
+                    json.dumps(value, ensure_ascii=False),
+                    self._expires_at(),
+                    time.time(),
+                ),
+            )
+            # Size-based eviction of the least recently used entries
+            self._connection.execute(
+                "DELETE FROM llm_responses WHERE key IN ("
+                "SELECT key FROM llm_responses ORDER BY last_used DESC "
+                "LIMIT -1 OFFSET ?)",
+                (self._max_entries,),
+            )
+
+
+class RedisLLMCache(LLMCache):
+    """
+    Caché en un servidor Redis. La caducidad se delega en Redis y el desalojo LRU
+    en su política `maxmemory-policy` (por ejemplo, `allkeys-lru`).
+
+    Parámetros:
+    -----------
+    url : str, opcional
+        URL del servidor (por defecto, `settings.LLM_CACHE_REDIS_URL`).
+    ttl : float, opcional
+        Segundos de validez de cada entrada.
+    """
+
+    def __init__(self, url: Optional[str] = None, ttl: Optional[float] = None) -> None:
+        super().__init__(ttl)
+        import redis
+
+        self._client = redis.Redis.from_url(url or settings.LLM_CACHE_REDIS_URL)
+
+    def get(self, key: str) -> Optional[Any]:
+        value = self._client.get(f"llm:{key}")
+        return json.loads(value) if value is not None else None
+
+    def set(self, key: str, value: Any) -> None:
+        self._client.set(
+            f"llm:{key}",
+            json.dumps(value, ensure_ascii=False),
+            ex=int(self._ttl) if self._ttl else None,
+        )
+
+
+@lru_cache(maxsize=None)
+def get_llm_cache() -> LLMCache:
+    """
+    Devuelve la caché de respuestas de LLM configurada en `LLM_CACHE_BACKEND`.
+
+    La instancia se comparte en todo el proceso.
+
+    Devuelve:
+    --------
+    LLMCache
+        La caché configurada.
+    """
+    backend = settings.LLM_CACHE_BACKEND
+    if backend == "memory":
+        return MemoryLLMCache()
+    if backend == "sqlite":
+        return SQLiteLLMCache()
+    if backend == "redis":
+        return RedisLLMCache()
+    if backend == "none":
+        return NullLLMCache()
+    raise ValueError(f"Unknown LLM cache backend: {backend}")
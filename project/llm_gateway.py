@@ -0,0 +1,585 @@
+"""
+Módulo: llm_gateway.py
+
+Módulo que implementa una pasarela única para todas las llamadas a la API de OpenAI
+(transformación de la query, filtro de correlación y generación de la respuesta).
+
+La pasarela comparte en todo el proceso:
+- Un conjunto de conexiones HTTP reutilizables (uno síncrono y uno asíncrono por
+  bucle de eventos).
+- Un único límite de llamadas simultáneas para las llamadas síncronas, las
+  asíncronas y las respuestas en streaming.
+- Limitación de ritmo con cubetas de fichas (peticiones y tokens por minuto).
+- Reintentos con espera exponencial aleatoria ante errores 429, 5xx, tiempos de
+  espera agotados y fallos de conexión, respetando la cabecera `Retry-After`.
+- Un tiempo máximo por llamada.
+- Peticiones duplicadas opcionales (hedging) en la versión asíncrona: si una llamada
+  no ha terminado tras `LLM_HEDGE_AFTER` segundos, se lanza una segunda y se usa la
+  que termine antes, para recortar la latencia de cola.
+"""
+
+import asyncio
+import random
+import threading
+import time
+import weakref
+from collections import deque
+from functools import lru_cache
+from typing import Iterator, List, Optional
+
+import httpx
+import openai
+from config import settings
+from metrics import increment
+from openai import AsyncOpenAI, OpenAI
+
+# Errors worth retrying: rate limits, server errors, timeouts and dropped connections
+_RETRYABLE_ERRORS = (
+    openai.RateLimitError,
+    openai.InternalServerError,
+    openai.APITimeoutError,
+    openai.APIConnectionError,
+)
+
+
+def to_openai_messages(messages) -> List[dict]:
+    """
+    Convierte mensajes de LlamaIndex (`ChatMessage`) o diccionarios al formato de la
+    API de OpenAI.
+    """
+    converted = []
+    for message in messages:
+        if isinstance(message, dict):
+            converted.append({"role": message["role"], "content": message["content"]})
+        else:
+            role = getattr(message.role, "value", message.role)
+            converted.append({"role": str(role), "content": message.content})
+    return converted
+
+
+def estimate_tokens(messages: List[dict]) -> int:
+    """
+    Estima los tokens de una llamada (unos 4 caracteres por token) más la salida
+    esperada, para la limitación por tokens por minuto.
+    """
+    prompt_chars = sum(len(message["content"] or "") for message in messages)
+    return prompt_chars // 4 + settings.LLM_EXPECTED_OUTPUT_TOKENS
+
+
+class TokenBucket:
+    """
+    Cubeta de fichas compartida entre hilos y corrutinas.
+
+    Parámetros:
+    -----------
+    rate_per_minute : float
+        Fichas que se reponen por minuto.
+    capacity : float, opcional
+        Fichas máximas acumuladas (por defecto, `rate_per_minute`).
+    """
+
+    def __init__(
+        self, rate_per_minute: float, capacity: Optional[float] = None
+    ) -> None:
+        self._rate = rate_per_minute / 60.0
+        self._capacity = capacity or rate_per_minute
+        self._tokens = self._capacity
+        self._updated = time.monotonic()
+        self._lock = threading.Lock()
+
+    def reserve(self, amount: float = 1.0) -> float:
+        """
+        Reserva `amount` fichas y devuelve los segundos que hay que esperar antes de
+        usarlas. Las reservas se encolan: el saldo puede quedar negativo.
+        """
+        with self._lock:
+            now = time.monotonic()
+            self._tokens = min(
+                self._capacity, self._tokens + (now - self._updated) * self._rate
+            )
+            self._updated = now
+
+            self._tokens -= min(amount, self._capacity)
+            return max(0.0, -self._tokens / self._rate)
+
+
+class ConcurrencyLimiter:
+    """
+    Límite de llamadas simultáneas compartido por hilos y bucles de eventos, de modo
+    que las llamadas síncronas, las asíncronas de cualquier bucle y las peticiones
+    duplicadas cuentan contra el mismo límite. Las esperas se atienden por orden de
+    llegada.
+
+    Se usa con `with` desde código síncrono y con `async with` desde corrutinas.
+
+    Parámetros:
+    -----------
+    limit : int
+        Llamadas simultáneas permitidas.
+    """
+
+    def __init__(self, limit: int) -> None:
+        self._limit = limit
+        self._active = 0
+        self._lock = threading.Lock()
+        # threading.Event for threads, (loop, future) for coroutines
+        self._waiters = deque()
+
+    @property
+    def active(self) -> int:
+        """
+        Número de llamadas que ocupan el límite en este momento.
+        """
+        return self._active
+
+    def _try_acquire(self) -> bool:
+        # Called with self._lock held
+        if self._active < self._limit and not self._waiters:
+            self._active += 1
+            return True
+        return False
+
+    def acquire(self) -> None:
+        """
+        Ocupa un hueco, esperando (y bloqueando el hilo) si no hay ninguno libre.
+        """
+        with self._lock:
+            if self._try_acquire():
+                return
+            event = threading.Event()
+            self._waiters.append(event)
+        # release() hands its slot over before setting the event
+        event.wait()
+
+    async def aacquire(self) -> None:
+        """
+        Ocupa un hueco, esperando sin bloquear el bucle de eventos si no hay ninguno
+        libre.
+        """
+        loop = asyncio.get_running_loop()
+        with self._lock:
+            if self._try_acquire():
+                return
+            waiter = (loop, loop.create_future())
+            self._waiters.append(waiter)
+
+        try:
+            await waiter[1]
+        except asyncio.CancelledError:
+            with self._lock:
+                if waiter in self._waiters:
+                    self._waiters.remove(waiter)
+                    raise
+            if waiter[1].done() and not waiter[1].cancelled():
+                # The slot was granted just before the cancellation: pass it on
+                self.release()
+            # Otherwise _grant sees the cancelled future and passes it on
+            raise
+
+    def _grant(self, future: asyncio.Future) -> None:
+        if future.cancelled():
+            self.release()
+        else:
+            future.set_result(None)
+
+    def release(self) -> None:
+        """
+        Libera un hueco o se lo cede directamente a la primera espera.
+        """
+        with self._lock:
+            while self._waiters:
+                waiter = self._waiters.popleft()
+                if isinstance(waiter, threading.Event):
+                    waiter.set()
+                    return
+                loop, future = waiter
+                try:
+                    loop.call_soon_threadsafe(self._grant, future)
+                    return
+                except RuntimeError:
+                    # The waiter's event loop is closed
+                    continue
+            self._active -= 1
+
+    def __enter__(self) -> "ConcurrencyLimiter":
+        self.acquire()
+        return self
+
+    def __exit__(self, *exc_info) -> None:
+        self.release()
+
+    async def __aenter__(self) -> "ConcurrencyLimiter":
+        await self.aacquire()
+        return self
+
+    async def __aexit__(self, *exc_info) -> None:
+        self.release()
+
+
+class LLMGateway:
+    """
+    Pasarela compartida para las llamadas a la API de OpenAI.
+
+    Parámetros:
+    -----------
+    api_key : str, opcional
+        Clave de la API (por defecto, `settings.OPENAI_API_KEY`).
+    max_concurrency : int, opcional
+        Llamadas simultáneas (por defecto, `settings.LLM_MAX_CONCURRENCY`).
+    requests_per_minute : int, opcional
+        Límite de peticiones por minuto (por defecto,
+        `settings.LLM_REQUESTS_PER_MINUTE`; 0 lo desactiva).
+    tokens_per_minute : int, opcional
+        Límite de tokens por minuto (por defecto, `settings.LLM_TOKENS_PER_MINUTE`;
+        0 lo desactiva).
+    timeout : float, opcional
+        Segundos máximos por llamada (por defecto, `settings.LLM_TIMEOUT`).
+    max_retries : int, opcional
+        Reintentos por llamada (por defecto, `settings.LLM_MAX_RETRIES`).
+    hedge_after : float, opcional
+        Segundos tras los que se lanza una petición duplicada en las llamadas
+        asíncronas (por defecto, `settings.LLM_HEDGE_AFTER`; 0 lo desactiva).
+    """
+
+    def __init__(
+        self,
+        api_key: Optional[str] = None,
+        max_concurrency: Optional[int] = None,
+        requests_per_minute: Optional[int] = None,
+        tokens_per_minute: Optional[int] = None,
+        timeout: Optional[float] = None,
+        max_retries: Optional[int] = None,
+        hedge_after: Optional[float] = None,
+    ) -> None:
+        api_key = api_key or settings.OPENAI_API_KEY
+        self._max_concurrency = max_concurrency or settings.LLM_MAX_CONCURRENCY
+        self._timeout = timeout or settings.LLM_TIMEOUT
+        self._max_retries = (
+            settings.LLM_MAX_RETRIES if max_retries is None else max_retries
+        )
+        self._hedge_after = (
+            settings.LLM_HEDGE_AFTER if hedge_after is None else hedge_after
+        )
+
+        requests_per_minute = (
+            settings.LLM_REQUESTS_PER_MINUTE
+            if requests_per_minute is None
+            else requests_per_minute
+        )
+        tokens_per_minute = (
+            settings.LLM_TOKENS_PER_MINUTE
+            if tokens_per_minute is None
+            else tokens_per_minute
+        )
+        self._request_bucket = (
+            TokenBucket(requests_per_minute) if requests_per_minute else None
+        )
+        self._token_bucket = (
+            TokenBucket(tokens_per_minute) if tokens_per_minute else None
+        )
+
+        # The limiter caps the requests in flight; open streams keep their connection
+        # while the consumer renders, so the pool itself is not capped
+        self._api_key = api_key
+        self._limits = httpx.Limits(
+            max_connections=None,
+            max_keepalive_connections=self._max_concurrency,
+        )
+        self.http_client = httpx.Client(limits=self._limits, timeout=self._timeout)
+
+        # Retries are handled here, with jitter and rate limiting, not by the SDK
+        self.client = OpenAI(
+            api_key=api_key,
+            http_client=self.http_client,
+            max_retries=0,
+            timeout=self._timeout,
+        )
+
+        # One limit for the whole process: sync calls, streams and the async calls
+        # of every event loop
+        self._limiter = ConcurrencyLimiter(self._max_concurrency)
+        # Async connection pools belong to an event loop, so keep one client per loop
+        self._async_clients = weakref.WeakKeyDictionary()
+
+        self.retries = 0
+        self.hedged_requests = 0
+
+    # ------------------------------------------------------------------ helpers
+
+    def _rate_limit_delay(self, messages: List[dict]) -> float:
+        delay = 0.0
+        if self._request_bucket is not None:
+            delay = max(delay, self._request_bucket.reserve(1))
+        if self._token_bucket is not None:
+            delay = max(delay, self._token_bucket.reserve(estimate_tokens(messages)))
+        return delay
+
+    def _retry_delay(self, attempt: int, error: Exception) -> float:
+        # Full jitter exponential backoff, never shorter than the server's Retry-After
+        delay = random.uniform(
+            0,
+            min(
+                settings.LLM_RETRY_MAX_DELAY,
+                settings.LLM_RETRY_BASE_DELAY * 2**attempt,
+            ),
+        )
+        response = getattr(error, "response", None)
+        if response is not None:
+            try:
+                delay = max(delay, float(response.headers.get("retry-after", 0)))
+            except ValueError:
+                pass
+        return delay
+
+    @property
+    def async_client(self) -> AsyncOpenAI:
+        """
+        Cliente asíncrono de OpenAI del bucle de eventos en curso.
+        """
+        loop = asyncio.get_running_loop()
+        client = self._async_clients.get(loop)
+        if client is None:
+            client = AsyncOpenAI(
+                api_key=self._api_key,
+                http_client=httpx.AsyncClient(
+                    limits=self._limits, timeout=self._timeout
+                ),
+                max_retries=0,
+                timeout=self._timeout,
+            )
+            self._async_clients[loop] = client
+        return client
+
+    @staticmethod
+    def _read_response(response, response_format):
+        usage = getattr(response, "usage", None)
+        if usage is not None:
+            labels = {"model": response.model}
+            increment("llm_prompt_tokens_total", usage.prompt_tokens or 0, labels)
+            increment(
+                "llm_completion_tokens_total", usage.completion_tokens or 0, labels
+            )
+
+        message = response.choices[0].message
+        if response_format is not None:
+            return message.parsed
+        return message.content.strip()
+
+    # ------------------------------------------------------------------ sync
+
+    def _call_once(self, messages, model, response_format, timeout, options):
+        time.sleep(self._rate_limit_delay(messages))
+        with self._limiter:
+            if response_format is not None:
+                response = self.client.beta.chat.completions.parse(
+                    model=model,
+                    messages=messages,
+                    response_format=response_format,
+                    timeout=timeout,
+                    **options,
+                )
+            else:
+                response = self.client.chat.completions.create(
+                    model=model, messages=messages, timeout=timeout, **options
+                )
+        return self._read_response(response, response_format)
+
+    def complete(
+        self,
+        messages,
+        model: str,
+        response_format=None,
+        timeout: Optional[float] = None,
+        temperature: Optional[float] = None,
+        max_retries: Optional[int] = None,
+    ):
+        """
+        Realiza una llamada de chat con reintentos y limitación de ritmo.
+
+        Parámetros:
+        -----------
+        messages : list
+            Mensajes (`ChatMessage` o diccionarios con 'role' y 'content').
+        model : str
+            Nombre del modelo.
+        response_format : type, opcional
+            Modelo de pydantic para una respuesta estructurada.
+        timeout : float, opcional
+            Segundos máximos de la llamada (por defecto, `settings.LLM_TIMEOUT`).
+        temperature : float, opcional
+            Temperatura de muestreo (por defecto, la del modelo).
+        max_retries : int, opcional
+            Reintentos de la llamada (por defecto, los de la pasarela).
+
+        Devuelve:
+        --------
+        str o BaseModel
+            El texto de la respuesta o, con `response_format`, el objeto analizado.
+        """
+        messages = to_openai_messages(messages)
+        timeout = timeout or self._timeout
+        options = {} if temperature is None else {"temperature": temperature}
+        max_retries = self._max_retries if max_retries is None else max_retries
+
+        for attempt in range(max_retries + 1):
+            try:
+                return self._call_once(
+                    messages, model, response_format, timeout, options
+                )
+            except _RETRYABLE_ERRORS as error:
+                if attempt == max_retries:
+                    raise
+                self.retries += 1
+                time.sleep(self._retry_delay(attempt, error))
+
+    def stream(
+        self,
+        messages,
+        model: str,
+        timeout: Optional[float] = None,
+        temperature: Optional[float] = None,
+    ) -> Iterator[str]:
+        """
+        Realiza una llamada de chat en streaming y genera los fragmentos de texto.
+
+        Sólo se reintenta el establecimiento de la conexión: una vez recibido el
+        primer fragmento, un fallo se propaga al consumidor.
+
+        Parámetros:
+        -----------
+        messages : list
+            Mensajes (`ChatMessage` o diccionarios con 'role' y 'content').
+        model : str
+            Nombre del modelo.
+        timeout : float, opcional
+            Segundos máximos entre fragmentos (por defecto, `settings.LLM_TIMEOUT`).
+        temperature : float, opcional
+            Temperatura de muestreo (por defecto, la del modelo).
+
+        Devuelve:
+        --------
+        Iterator[str]
+            Un generador con los fragmentos de texto de la respuesta.
+        """
+        messages = to_openai_messages(messages)
+        timeout = timeout or self._timeout
+        options = {} if temperature is None else {"temperature": temperature}
+
+        for attempt in range(self._max_retries + 1):
+            time.sleep(self._rate_limit_delay(messages))
+            try:
+                with self._limiter:
+                    response = self.client.chat.completions.create(
+                        model=model,
+                        messages=messages,
+                        stream=True,
+                        timeout=timeout,
+                        **options,
+                    )
+                break
+            except _RETRYABLE_ERRORS as error:
+                if attempt == self._max_retries:
+                    raise
+                self.retries += 1
+                time.sleep(self._retry_delay(attempt, error))
+
+        # The slot is taken only while reading from the connection, not while the
+        # consumer handles each fragment; closing the generator closes the response
+        with response:
+            chunks = iter(response)
+            while True:
+                with self._limiter:
+                    chunk = next(chunks, None)
+                if chunk is None:
+                    break
+                if chunk.choices and chunk.choices[0].delta.content:
+                    yield chunk.choices[0].delta.content
+
+    # ------------------------------------------------------------------ async
+
+    async def _acall_once(self, messages, model, response_format, timeout, options):
+        await asyncio.sleep(self._rate_limit_delay(messages))
+        async with self._limiter:
+            if response_format is not None:
+                response = await self.async_client.beta.chat.completions.parse(
+                    model=model,
+                    messages=messages,
+                    response_format=response_format,
+                    timeout=timeout,
+                    **options,
+                )
+            else:
+                response = await self.async_client.chat.completions.create(
+                    model=model, messages=messages, timeout=timeout, **options
+                )
+        return self._read_response(response, response_format)
+
+    async def _ahedged(self, make_call):
+        """
+        Lanza la llamada y, si no termina en `hedge_after` segundos, una copia.
+        Devuelve el primer resultado correcto y cancela la otra.
+        """
+        first = asyncio.ensure_future(make_call())
+        done, _ = await asyncio.wait({first}, timeout=self._hedge_after)
+        if done:
+            return first.result()
+
+        self.hedged_requests += 1
+        pending = {first, asyncio.ensure_future(make_call())}
+        while pending:
+            done, pending = await asyncio.wait(
+                pending, return_when=asyncio.FIRST_COMPLETED
+            )
+            for task in done:
+                if task.exception() is None:
+                    for other in pending:
+                        other.cancel()
+                    return task.result()
+        # Both copies failed: surface the error of the original request
+        return first.result()
+
+    async def acomplete(
+        self,
+        messages,
+        model: str,
+        response_format=None,
+        timeout: Optional[float] = None,
+        temperature: Optional[float] = None,
+        max_retries: Optional[int] = None,
+    ):
+        """
+        Versión asíncrona de `complete`, con peticiones duplicadas opcionales
+        (`LLM_HEDGE_AFTER`).
+        """
+        messages = to_openai_messages(messages)
+        timeout = timeout or self._timeout
+        options = {} if temperature is None else {"temperature": temperature}
+        max_retries = self._max_retries if max_retries is None else max_retries
+
+        def _make_call():
+            return self._acall_once(messages, model, response_format, timeout, options)
+
+        for attempt in range(max_retries + 1):
+            try:
+                if self._hedge_after:
+                    return await self._ahedged(_make_call)
+                return await _make_call()
+            except _RETRYABLE_ERRORS as error:
+                if attempt == max_retries:
+                    raise
+                self.retries += 1
+                await asyncio.sleep(self._retry_delay(attempt, error))
+
+    def stats(self) -> dict:
+        """
+        Devuelve los contadores de reintentos y de peticiones duplicadas.
+        """
+        return {"retries": self.retries, "hedged_requests": self.hedged_requests}
+
+
+@lru_cache(maxsize=None)
+def get_llm_gateway() -> LLMGateway:
+    """
+    Devuelve la pasarela de LLM compartida por todo el proceso.
+    """
+    return LLMGateway()
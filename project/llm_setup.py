@@ -6,16 +6,54 @@ Módulo para la configuración de un modelo de lenguaje grande (LLM) utilizando
 
 from config import settings
 from llama_index.llms.openai import OpenAI
+from llm_gateway import get_llm_gateway
+from local_llm import get_local_llm
 
 
 def get_llm():
     """
     Inicializa y devuelve una instancia del modelo de lenguaje OpenAI.
 
+    El modelo comparte las conexiones HTTP de la pasarela de LLM (`llm_gateway`), a
+    través de la cual se realizan las llamadas de la aplicación.
+
     Devuelve:
     --------
     llama_index.llms.llama_cpp.OpenAI
         Una instancia configurada del modelo OpenAI.
     """
-    llm = OpenAI(model=settings.OPENAI_GENERATOR_MODEL, api_key=settings.OPENAI_API_KEY)
+    gateway = get_llm_gateway()
+    llm = OpenAI(
+        model=settings.OPENAI_GENERATOR_MODEL,
+        api_key=settings.OPENAI_API_KEY,
+        timeout=settings.LLM_TIMEOUT,
+        http_client=gateway.http_client,
+    )
     return llm
+
+
+def get_stage_client(backend: str, model: str):
+    """
+    Devuelve el cliente con el que una etapa realiza sus llamadas al LLM.
+
+    Parámetros:
+    -----------
+    backend : str
+        "openai" (pasarela compartida `LLMGateway`) o "local" (modelo GGUF local,
+        `LocalLLM`).
+    model : str
+        Nombre del modelo de OpenAI de la etapa.
+
+    Devuelve:
+    --------
+    tuple
+        Tupla (client, model_name). El cliente ofrece `complete`, `acomplete` y
+        `stream`; `model_name` es el modelo que se usa en la llamada y en la clave
+        de la caché de respuestas.
+    """
+    if backend == "openai":
+        return get_llm_gateway(), model
+    if backend == "local":
+        local_llm = get_local_llm()
+        return local_llm, local_llm.model
+    raise ValueError(f"Unknown LLM backend: {backend}")
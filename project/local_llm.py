@@ -0,0 +1,163 @@
+"""
+Módulo: local_llm.py
+
+Módulo que permite ejecutar las etapas con LLM en un modelo local en CPU (formato
+GGUF, a través de `llama-cpp-python`) en lugar de la API de OpenAI. El modelo se
+carga una sola vez desde `MODELS_PATH` y se comparte en todo el proceso, de modo que
+la latencia y el coste son predecibles y la aplicación puede funcionar sin conexión.
+
+`LocalLLM` ofrece los mismos métodos que `LLMGateway` (`complete`, `acomplete` y
+`stream`), por lo que cada etapa puede elegir su backend desde la configuración.
+"""
+
+import asyncio
+import threading
+from functools import lru_cache
+from pathlib import Path
+from typing import Iterator, Optional
+
+from config import settings
+from llm_gateway import to_openai_messages
+from metrics import increment
+
+
+class LocalLLM:
+    """
+    Modelo de lenguaje local en formato GGUF.
+
+    Parámetros:
+    -----------
+    model_path : Path, opcional
+        Ruta del fichero GGUF (por defecto, `settings.LOCAL_LLM_MODEL` dentro de
+        `settings.MODELS_PATH`).
+    context_size : int, opcional
+        Tamaño del contexto (por defecto, `settings.LOCAL_LLM_CONTEXT_SIZE`).
+    threads : int, opcional
+        Hilos de CPU (por defecto, `settings.LOCAL_LLM_THREADS`; 0 deja que
+        llama.cpp los elija).
+    """
+
+    def __init__(
+        self,
+        model_path: Optional[Path] = None,
+        context_size: Optional[int] = None,
+        threads: Optional[int] = None,
+    ) -> None:
+        from llama_cpp import Llama
+
+        model_path = Path(model_path or settings.MODELS_PATH / settings.LOCAL_LLM_MODEL)
+        threads = settings.LOCAL_LLM_THREADS if threads is None else threads
+
+        # Used as the model name of the LLM cache keys
+        self.model = f"local:{model_path.name}"
+        self._llama = Llama(
+            model_path=str(model_path),
+            n_ctx=context_size or settings.LOCAL_LLM_CONTEXT_SIZE,
+            n_threads=threads or None,
+            verbose=False,
+        )
+        # A llama.cpp context cannot run two generations at once
+        self._lock = threading.Lock()
+
+    def complete(
+        self,
+        messages,
+        model: Optional[str] = None,
+        response_format=None,
+        timeout=None,
+        temperature: Optional[float] = None,
+        max_retries: Optional[int] = None,
+    ):
+        """
+        Genera la respuesta de una llamada de chat.
+
+        Parámetros:
+        -----------
+        messages : list
+            Mensajes (`ChatMessage` o diccionarios con 'role' y 'content').
+        model : str, opcional
+            Se ignora; existe por compatibilidad con `LLMGateway.complete`.
+        response_format : type, opcional
+            Modelo de pydantic. La generación se restringe a su esquema JSON.
+        timeout : float, opcional
+            Se ignora: la generación local está acotada por `LOCAL_LLM_MAX_TOKENS`.
+        temperature : float, opcional
+            Temperatura de muestreo (por defecto es 0, generación determinista).
+        max_retries : int, opcional
+            Se ignora: la generación local no se reintenta.
+
+        Devuelve:
+        --------
+        str o BaseModel
+            El texto de la respuesta o, con `response_format`, el objeto analizado.
+        """
+        kwargs = {}
+        if response_format is not None:
+            kwargs["response_format"] = {
+                "type": "json_object",
+                "schema": response_format.model_json_schema(),
+            }
+
+        with self._lock:
+            response = self._llama.create_chat_completion(
+                messages=to_openai_messages(messages),
+                max_tokens=settings.LOCAL_LLM_MAX_TOKENS,
+                temperature=temperature or 0.0,
+                **kwargs,
+            )
+
+        usage = response.get("usage")
+        if usage:
+            labels = {"model": self.model}
+            increment("llm_prompt_tokens_total", usage.get("prompt_tokens", 0), labels)
+            increment(
+                "llm_completion_tokens_total", usage.get("completion_tokens", 0), labels
+            )
+
+        content = response["choices"][0]["message"]["content"].strip()
+        if response_format is not None:
+            return response_format.model_validate_json(content)
+        return content
+
+    async def acomplete(
+        self,
+        messages,
+        model: Optional[str] = None,
+        response_format=None,
+        timeout=None,
+        temperature: Optional[float] = None,
+        max_retries: Optional[int] = None,
+    ):
+        """
+        Versión asíncrona de `complete`: la generación se ejecuta en un hilo para no
+        bloquear el bucle de eventos.
+        """
+        return await asyncio.to_thread(
+            self.complete, messages, model, response_format, timeout, temperature
+        )
+
+    def stream(
+        self, messages, model: Optional[str] = None, timeout=None, temperature=None
+    ) -> Iterator[str]:
+        """
+        Genera los fragmentos de texto de la respuesta a medida que se producen.
+        """
+        with self._lock:
+            for chunk in self._llama.create_chat_completion(
+                messages=to_openai_messages(messages),
+                max_tokens=settings.LOCAL_LLM_MAX_TOKENS,
+                temperature=temperature or 0.0,
+                stream=True,
+            ):
+                content = chunk["choices"][0]["delta"].get("content")
+                if content:
+                    yield content
+
+
+@lru_cache(maxsize=None)
+def get_local_llm() -> LocalLLM:
+    """
+    Devuelve el modelo local compartido por todo el proceso, cargándolo la primera
+    vez que se solicita.
+    """
+    return LocalLLM()
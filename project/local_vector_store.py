@@ -0,0 +1,780 @@
+"""
+Módulo: local_vector_store.py
+
+Módulo que implementa un almacén vectorial local y compacto, alternativo a Chroma,
+que se ejecuta dentro del propio proceso sin serializar las consultas.
+
+Los vectores se guardan en ficheros binarios proyectados en memoria (mmap), de modo
+que sólo las páginas que se consultan ocupan RAM. Opcionalmente, los embeddings se
+cuantizan a int8 (un byte por dimensión y un factor de escala por vector), lo que
+reduce la memoria del índice 4 veces respecto a float32: la búsqueda se hace sobre
+los vectores cuantizados y los mejores candidatos se reordenan con los vectores
+float32 originales, que se leen del disco sólo para esos candidatos.
+
+Para corpus pequeños se compara la consulta con todos los vectores (un producto de
+matrices); para corpus grandes se usa un índice ANN (IVF o HNSW, ver `ann_index.py`)
+que reduce las filas a comparar. El índice se construye al terminar la ingesta
+(`refresh_index`) o, si falta o ha quedado desfasado, en un hilo en segundo plano;
+mientras tanto las búsquedas usan el índice anterior o la comparación exacta.
+
+Los nodos (texto y metadatos) se guardan en una base de datos SQLite junto a los
+vectores.
+"""
+
+import json
+import logging
+import math
+import sqlite3
+import threading
+import time
+from pathlib import Path
+from typing import List, Optional
+
+import numpy as np
+from ann_index import HNSWIndex, IVFIndex
+from config import settings
+from llama_index.core.schema import BaseNode
+from llama_index.core.vector_stores import VectorStoreQuery, VectorStoreQueryResult
+from llama_index.core.vector_stores.utils import (
+    metadata_dict_to_node,
+    node_to_metadata_dict,
+)
+from metrics import increment, observe
+
+logger = logging.getLogger(__name__)
+
+# Number of rows scored at once, to bound the temporary float32 copies
+_SCORE_BLOCK_SIZE = 65536
+
+# Size of the (rows x queries) score matrix of a batched search
+_SCORE_MATRIX_BYTES = 256 * 1024 * 1024
+
+# Rows added after the ANN index was built are scanned exactly; past this size
+# (absolute, or as a fraction of the indexed rows) the index is rebuilt
+_MIN_PENDING_ROWS = 10000
+_MAX_PENDING_FRACTION = 0.2
+
+_ANN_INDEX_FILES = {"ivf": "ivf_index.npz", "hnsw": "hnsw_index.bin"}
+
+
+def quantize_int8(vectors: np.ndarray):
+    """
+    Cuantiza vectores a int8 con un factor de escala simétrico por vector.
+
+    Parámetros:
+    -----------
+    vectors : np.ndarray
+        Matriz (n, dim) de vectores float32.
+
+    Devuelve:
+    --------
+    tuple
+        Tupla (codes, scales) con los códigos int8 (n, dim) y las escalas float32 (n,).
+    """
+    scales = np.abs(vectors).max(axis=1) / 127.0
+    scales[scales == 0] = 1.0
+    codes = np.clip(np.rint(vectors / scales[:, None]), -127, 127).astype(np.int8)
+    return codes, scales.astype(np.float32)
+
+
+def similarity_from_dot(dot: np.ndarray) -> np.ndarray:
+    """
+    Convierte el producto escalar de vectores normalizados en la misma puntuación de
+    similitud que devuelve el almacén de Chroma (exp(-distancia L2 al cuadrado)), para
+    que `RETRIEVER_CONFIDENCE_THRESHOLD` tenga el mismo significado en ambos.
+    """
+    return np.exp(-(2.0 - 2.0 * dot))
+
+
+class LocalVectorStore:
+    """
+    Almacén vectorial local con vectores proyectados en memoria y cuantización
+    int8 opcional.
+
+    Implementa la parte de la interfaz de los almacenes vectoriales de LlamaIndex que
+    usa la aplicación (`add`, `delete`, `query`), por lo que se puede usar con
+    `VectorDBRetriever` sin cambios.
+
+    Parámetros:
+    -----------
+    path : Path, opcional
+        Directorio del almacén (por defecto, `settings.LOCAL_VECTOR_STORE_PATH`).
+    quantization : str, opcional
+        "int8" o "none" (por defecto, `settings.LOCAL_STORE_QUANTIZATION`). Sólo se
+        aplica al crear el almacén; después se respeta la del almacén existente.
+    rerank_factor : int, opcional
+        Número de candidatos cuantizados que se reordenan con float32, como múltiplo
+        de `similarity_top_k` (por defecto, `settings.LOCAL_STORE_RERANK_FACTOR`).
+    index_type : str, opcional
+        Índice de búsqueda: "flat" (comparación exacta con todas las filas), "ivf",
+        "hnsw" o "auto", que usa "flat" hasta
+        `settings.LOCAL_STORE_EXACT_MAX_VECTORS` vectores e "ivf" a partir de ahí
+        (por defecto, `settings.LOCAL_STORE_INDEX`).
+    """
+
+    stores_text = True
+
+    def __init__(
+        self,
+        path: Optional[Path] = None,
+        quantization: Optional[str] = None,
+        rerank_factor: Optional[int] = None,
+        index_type: Optional[str] = None,
+    ) -> None:
+        self._path = Path(path or settings.LOCAL_VECTOR_STORE_PATH)
+        self._path.mkdir(parents=True, exist_ok=True)
+        self._rerank_factor = rerank_factor or settings.LOCAL_STORE_RERANK_FACTOR
+        self.index_type = index_type or settings.LOCAL_STORE_INDEX
+        if self.index_type not in ("auto", "flat", "ivf", "hnsw"):
+            raise ValueError(f"Unknown index type: {self.index_type}")
+        self._lock = threading.RLock()
+
+        self._connection = sqlite3.connect(
+            str(self._path / "nodes.sqlite"), check_same_thread=False
+        )
+        self._connection.execute(
+            "CREATE TABLE IF NOT EXISTS nodes ("
+            "row INTEGER PRIMARY KEY, "
+            "node_id TEXT NOT NULL, "
+            "ref_doc_id TEXT, "
+            "node_json TEXT NOT NULL, "
+            "deleted INTEGER NOT NULL DEFAULT 0)"
+        )
+        self._connection.execute(
+            "CREATE INDEX IF NOT EXISTS nodes_node_id ON nodes (node_id)"
+        )
+        self._connection.execute(
+            "CREATE INDEX IF NOT EXISTS nodes_ref_doc_id ON nodes (ref_doc_id)"
+        )
+        self._connection.execute(
+            "CREATE TABLE IF NOT EXISTS store_info (key TEXT PRIMARY KEY, value TEXT)"
+        )
+        self._connection.commit()
+
+        info = dict(self._connection.execute("SELECT key, value FROM store_info"))
+        self.quantization = info.get(
+            "quantization", quantization or settings.LOCAL_STORE_QUANTIZATION
+        )
+        if self.quantization not in ("none", "int8"):
+            raise ValueError(f"Unknown quantization: {self.quantization}")
+        self.dim = int(info["dim"]) if "dim" in info else None
+
+        self._num_rows = self._connection.execute(
+            "SELECT COUNT(*) FROM nodes"
+        ).fetchone()[0]
+        self._deleted = np.zeros(self._num_rows, dtype=bool)
+        for (row,) in self._connection.execute(
+            "SELECT row FROM nodes WHERE deleted = 1"
+        ):
+            self._deleted[row] = True
+        # Drop bytes left behind by an add that did not commit
+        self._truncate_files()
+
+        self._mapped_rows = -1
+        self._vectors = None
+        self._codes = None
+        self._scales = None
+        self._ann_index = None
+        self._index_build_lock = threading.Lock()
+        self._index_thread = None
+
+    # ------------------------------------------------------------------ storage
+
+    def _file(self, name: str) -> Path:
+        return self._path / name
+
+    def _truncate_files(self) -> None:
+        """
+        Recorta los ficheros de vectores a las filas confirmadas en SQLite, de modo
+        que los bytes de una inserción fallida no desplacen las filas siguientes.
+        """
+        dim = self.dim or 0
+        sizes = {
+            "vectors.f32": self._num_rows * dim * 4,
+            "codes.i8": self._num_rows * dim,
+            "scales.f32": self._num_rows * 4,
+        }
+        for name, size in sizes.items():
+            path = self._file(name)
+            if path.exists() and path.stat().st_size > size:
+                with open(path, "r+b") as file:
+                    file.truncate(size)
+
+    def _refresh_maps(self) -> None:
+        """
+        Vuelve a proyectar los ficheros si han crecido desde la última consulta.
+        """
+        if self._mapped_rows == self._num_rows:
+            return
+
+        if self._num_rows == 0:
+            self._vectors = self._codes = self._scales = None
+        else:
+            shape = (self._num_rows, self.dim)
+            self._vectors = np.memmap(
+                self._file("vectors.f32"), dtype=np.float32, mode="r", shape=shape
+            )
+            if self.quantization == "int8":
+                self._codes = np.memmap(
+                    self._file("codes.i8"), dtype=np.int8, mode="r", shape=shape
+                )
+                self._scales = np.memmap(
+                    self._file("scales.f32"),
+                    dtype=np.float32,
+                    mode="r",
+                    shape=(self._num_rows,),
+                )
+        self._mapped_rows = self._num_rows
+
+    def add(self, nodes: List[BaseNode], **add_kwargs) -> List[str]:
+        """
+        Agrega nodos con embeddings al almacén. Si ya existe un nodo con el mismo
+        identificador, se sustituye.
+
+        Parámetros:
+        -----------
+        nodes : List[BaseNode]
+            Nodos con su embedding calculado.
+
+        Devuelve:
+        --------
+        List[str]
+            Los identificadores de los nodos agregados.
+        """
+        if not nodes:
+            return []
+
+        vectors = np.asarray([node.get_embedding() for node in nodes], dtype=np.float32)
+        vectors /= np.maximum(np.linalg.norm(vectors, axis=1, keepdims=True), 1e-12)
+
+        # Serialize before writing anything, so that a bad node leaves no trace
+        node_ids = [node.node_id for node in nodes]
+        records = [
+            (
+                node.node_id,
+                node.ref_doc_id,
+                json.dumps(node_to_metadata_dict(node, flat_metadata=False)),
+            )
+            for node in nodes
+        ]
+        dim = self.dim or vectors.shape[1]
+
+        with self._lock:
+            with self._connection:
+                if self.dim is None:
+                    self._connection.executemany(
+                        "INSERT OR REPLACE INTO store_info (key, value) VALUES (?, ?)",
+                        [("dim", str(dim)), ("quantization", self.quantization)],
+                    )
+
+                replaced_rows = self._delete_where(
+                    f"node_id IN ({','.join('?' * len(node_ids))})", node_ids
+                )
+
+                self._truncate_files()
+                with open(self._file("vectors.f32"), "ab") as file:
+                    file.write(vectors.tobytes())
+                if self.quantization == "int8":
+                    codes, scales = quantize_int8(vectors)
+                    with open(self._file("codes.i8"), "ab") as file:
+                        file.write(codes.tobytes())
+                    with open(self._file("scales.f32"), "ab") as file:
+                        file.write(scales.tobytes())
+
+                first_row = self._num_rows
+                self._connection.executemany(
+                    "INSERT INTO nodes (row, node_id, ref_doc_id, node_json) VALUES (?, ?, ?, ?)",
+                    [
+                        (first_row + offset, *record)
+                        for offset, record in enumerate(records)
+                    ],
+                )
+
+            # Committed: update the in-memory state
+            self.dim = dim
+            self._deleted[replaced_rows] = True
+            self._num_rows += len(nodes)
+            self._deleted = np.concatenate(
+                (self._deleted, np.zeros(len(nodes), dtype=bool))
+            )
+
+        return node_ids
+
+    def _delete_where(self, condition: str, params) -> List[int]:
+        # Marks the rows in SQLite; the caller updates _deleted once committed
+        rows = [
+            row
+            for (row,) in self._connection.execute(
+                f"SELECT row FROM nodes WHERE deleted = 0 AND {condition}", params
+            )
+        ]
+        if rows:
+            self._connection.execute(
+                f"UPDATE nodes SET deleted = 1 WHERE row IN ({','.join('?' * len(rows))})",
+                rows,
+            )
+        return rows
+
+    def delete(self, ref_doc_id: str, **delete_kwargs) -> None:
+        """
+        Elimina los nodos de un documento de origen.
+
+        Parámetros:
+        -----------
+        ref_doc_id : str
+            Identificador del documento de origen.
+        """
+        with self._lock:
+            with self._connection:
+                rows = self._delete_where("ref_doc_id = ?", (ref_doc_id,))
+            self._deleted[rows] = True
+
+    def count(self) -> int:
+        """
+        Devuelve el número de nodos almacenados (sin contar los eliminados).
+        """
+        return int(self._num_rows - self._deleted.sum())
+
+    # ------------------------------------------------------------------ search
+
+    def _scores(self, matrix: np.ndarray, query: np.ndarray, rows=None) -> np.ndarray:
+        """
+        Producto escalar de las filas de `matrix` con la consulta, por bloques.
+        """
+        if rows is not None:
+            return np.asarray(matrix[rows], dtype=np.float32) @ query
+
+        scores = np.empty(len(matrix), dtype=np.float32)
+        for start in range(0, len(matrix), _SCORE_BLOCK_SIZE):
+            block = np.asarray(
+                matrix[start : start + _SCORE_BLOCK_SIZE], dtype=np.float32
+            )
+            scores[start : start + len(block)] = block @ query
+        return scores
+
+    def _top_rows(self, matrix, query, k, pool, deleted, scales=None) -> np.ndarray:
+        """
+        Devuelve, sin ordenar, las `k` filas de `pool` (o de todo el almacén si es
+        None) con mayor producto escalar con la consulta.
+        """
+        if pool is None:
+            scores = self._scores(matrix, query)
+            if scales is not None:
+                scores *= scales
+            scores[deleted] = -np.inf
+            candidates = None
+        else:
+            scores = self._scores(matrix, query, rows=pool)
+            if scales is not None:
+                scores *= scales[pool]
+            candidates = pool
+
+        k = min(k, len(scores))
+        if k <= 0:
+            return np.empty(0, dtype=np.int64)
+        best = np.argpartition(-scores, k - 1)[:k]
+        return best if candidates is None else candidates[best]
+
+    def search(self, query_embedding, top_k: int, exact: bool = False):
+        """
+        Busca los `top_k` vectores más similares a la consulta.
+
+        Parámetros:
+        -----------
+        query_embedding : list
+            Embedding de la consulta.
+        top_k : int
+            Número de resultados.
+        exact : bool, opcional
+            Si es True, ignora la cuantización y el índice ANN y compara con todos
+            los vectores float32 (útil como referencia para medir el recall).
+
+        Devuelve:
+        --------
+        tuple
+            Tupla (rows, dots) con las filas encontradas y su producto escalar con la
+            consulta, en orden descendente.
+        """
+        query = np.asarray(query_embedding, dtype=np.float32)
+        query /= max(float(np.linalg.norm(query)), 1e-12)
+
+        with self._lock:
+            self._refresh_maps()
+            if self._vectors is None:
+                return np.empty(0, dtype=np.int64), np.empty(0, dtype=np.float32)
+            deleted = self._deleted.copy()
+            vectors, codes, scales = self._vectors, self._codes, self._scales
+            ann_index = None if exact else self._get_ann_index()
+
+        live_rows = len(deleted) - int(deleted.sum())
+        top_k = min(top_k, live_rows)
+        if top_k <= 0:
+            return np.empty(0, dtype=np.int64), np.empty(0, dtype=np.float32)
+        # Never more candidates than live rows: deleted rows would fill the rest
+        num_candidates = min(top_k * self._rerank_factor, live_rows)
+
+        # 1. Candidate rows: the whole store, or the ANN proposals plus the rows
+        #    added after the index was built
+        pool = None
+        if ann_index is not None:
+            pool = np.union1d(
+                ann_index.candidates(query, num_candidates),
+                np.arange(ann_index.num_rows, len(deleted)),
+            )
+            pool = pool[~deleted[pool]]
+
+        # 2. Approximate scores on the int8 codes, then exact float32 re-rank
+        if exact or self.quantization == "none":
+            rows = self._top_rows(vectors, query, top_k, pool, deleted)
+        else:
+            candidates = self._top_rows(
+                codes, query, num_candidates, pool, deleted, scales
+            )
+            rows = self._top_rows(vectors, query, top_k, np.sort(candidates), deleted)
+
+        dots = self._scores(vectors, query, rows=rows)
+        order = np.argsort(-dots)
+        return rows[order], dots[order]
+
+    def search_batch(self, query_embeddings, top_k: int):
+        """
+        Busca los `top_k` vectores más similares a cada una de varias consultas.
+
+        Sin índice ANN, las consultas se comparan con el almacén en bloques con un
+        único producto de matrices (filas x consultas), que aprovecha mucho mejor la
+        CPU que una búsqueda por consulta. Con índice ANN cada consulta recorre
+        candidatos distintos y se busca por separado.
+
+        Parámetros:
+        -----------
+        query_embeddings : list
+            Embeddings de las consultas.
+        top_k : int
+            Número de resultados por consulta.
+
+        Devuelve:
+        --------
+        list
+            Una tupla (rows, dots) por consulta, como en `search`.
+        """
+        queries = np.asarray(query_embeddings, dtype=np.float32).reshape(
+            len(query_embeddings), -1
+        )
+        queries /= np.maximum(np.linalg.norm(queries, axis=1, keepdims=True), 1e-12)
+
+        with self._lock:
+            self._refresh_maps()
+            if self._vectors is None:
+                return [self.search(query, top_k) for query in queries]
+            deleted = self._deleted.copy()
+            vectors, codes, scales = self._vectors, self._codes, self._scales
+            ann_index = self._get_ann_index()
+
+        live_rows = len(deleted) - int(deleted.sum())
+        top_k = min(top_k, live_rows)
+        if ann_index is not None or top_k <= 0:
+            return [self.search(query, top_k) for query in queries]
+
+        quantized = self.quantization == "int8"
+        matrix = codes if quantized else vectors
+        num_candidates = min(
+            top_k * self._rerank_factor if quantized else top_k, live_rows
+        )
+
+        # Bound the (rows x queries) score matrix to about _SCORE_MATRIX_BYTES
+        queries_per_pass = max(1, _SCORE_MATRIX_BYTES // (4 * len(deleted)))
+        results = []
+        for query_start in range(0, len(queries), queries_per_pass):
+            query_block = queries[query_start : query_start + queries_per_pass]
+
+            scores = np.empty((len(deleted), len(query_block)), dtype=np.float32)
+            for start in range(0, len(deleted), _SCORE_BLOCK_SIZE):
+                block = np.asarray(
+                    matrix[start : start + _SCORE_BLOCK_SIZE], dtype=np.float32
+                )
+                scores[start : start + len(block)] = block @ query_block.T
+            if quantized:
+                scores *= np.asarray(scales)[:, None]
+            scores[deleted] = -np.inf
+
+            candidates = np.argpartition(-scores, num_candidates - 1, axis=0)[
+                :num_candidates
+            ]
+            for column, query in enumerate(query_block):
+                candidate_rows = np.sort(candidates[:, column])
+                rows = self._top_rows(vectors, query, top_k, candidate_rows, deleted)
+                dots = self._scores(vectors, query, rows=rows)
+                order = np.argsort(-dots)
+                results.append((rows[order], dots[order]))
+        return results
+
+    # ------------------------------------------------------------------ ANN index
+
+    def _resolve_index_type(self) -> str:
+        index_type = self.index_type
+        if index_type == "auto":
+            index_type = (
+                "flat"
+                if self.count() <= settings.LOCAL_STORE_EXACT_MAX_VECTORS
+                else "ivf"
+            )
+        if index_type == "hnsw":
+            try:
+                import hnswlib  # noqa: F401
+            except ImportError:
+                logger.warning(
+                    "hnswlib is not installed, falling back to the IVF index"
+                )
+                self.index_type = index_type = "ivf"
+        return index_type
+
+    def _create_ann_index(self, index_type: str):
+        if index_type == "ivf":
+            return IVFIndex(
+                nlist=settings.LOCAL_STORE_IVF_NLIST,
+                nprobe=settings.LOCAL_STORE_IVF_NPROBE,
+            )
+        return HNSWIndex(
+            m=settings.LOCAL_STORE_HNSW_M, ef_search=settings.LOCAL_STORE_HNSW_EF_SEARCH
+        )
+
+    def _load_ann_index(self, index_type: str):
+        index_file = self._file(_ANN_INDEX_FILES[index_type])
+        if not index_file.exists():
+            return None
+
+        ann_index = self._create_ann_index(index_type)
+        if index_type == "ivf":
+            ann_index.load(index_file)
+        else:
+            row = self._connection.execute(
+                "SELECT value FROM store_info WHERE key = 'hnsw_rows'"
+            ).fetchone()
+            if row is None:
+                return None
+            ann_index.load(index_file, self.dim, int(row[0]))
+        return ann_index
+
+    def _is_current(self, ann_index) -> bool:
+        # Rows added since the build are scanned exactly, up to a point
+        pending_rows = self._num_rows - ann_index.num_rows
+        return pending_rows <= max(
+            _MIN_PENDING_ROWS, ann_index.num_rows * _MAX_PENDING_FRACTION
+        )
+
+    def build_index(self, index_type: Optional[str] = None):
+        """
+        Construye (o reconstruye) el índice ANN con todas las filas actuales y lo
+        guarda junto al almacén.
+
+        La construcción se hace fuera del bloqueo del almacén, sobre las filas
+        existentes al empezar: las búsquedas concurrentes siguen usando el índice
+        anterior (o la búsqueda exacta) hasta que el nuevo índice lo sustituye.
+
+        Parámetros:
+        -----------
+        index_type : str, opcional
+            "ivf" o "hnsw" (por defecto, el tipo configurado en el almacén).
+
+        Devuelve:
+        --------
+        IVFIndex o HNSWIndex, o None si el tipo de índice es "flat".
+        """
+        with self._index_build_lock:
+            with self._lock:
+                index_type = index_type or self._resolve_index_type()
+                if index_type == "flat" or self._num_rows == 0:
+                    self._ann_index = None
+                    return None
+                self._refresh_maps()
+                vectors = self._vectors
+
+            logger.info("Building %s index over %d vectors", index_type, len(vectors))
+            start_time = time.perf_counter()
+            ann_index = self._create_ann_index(index_type)
+            ann_index.build(vectors)
+            observe(
+                "local_store_index_build_seconds",
+                time.perf_counter() - start_time,
+                labels={"index": index_type},
+            )
+
+            with self._lock:
+                ann_index.save(self._file(_ANN_INDEX_FILES[index_type]))
+                if index_type == "hnsw":
+                    with self._connection:
+                        self._connection.execute(
+                            "INSERT OR REPLACE INTO store_info (key, value) VALUES ('hnsw_rows', ?)",
+                            (str(ann_index.num_rows),),
+                        )
+                self._ann_index = ann_index
+            return ann_index
+
+    def refresh_index(self):
+        """
+        Construye el índice ANN si falta o si se han agregado demasiadas filas desde
+        la última construcción (por ejemplo, al terminar una ingesta), de modo que
+        las búsquedas no tengan que esperar a construirlo.
+
+        Devuelve:
+        --------
+        IVFIndex o HNSWIndex, o None si el tipo de índice es "flat".
+        """
+        with self._lock:
+            ann_index = self._get_ann_index(build=False)
+            if ann_index is not None and self._is_current(ann_index):
+                return ann_index
+        return self.build_index()
+
+    def _start_index_build(self) -> None:
+        # Called with self._lock held; at most one build runs in the background
+        if self._index_thread is not None and self._index_thread.is_alive():
+            return
+
+        def _build():
+            try:
+                self.build_index()
+            except Exception:
+                logger.exception("Building the ANN index failed")
+                increment("local_store_index_build_failures_total")
+
+        self._index_thread = threading.Thread(
+            target=_build, name="local-store-index-build", daemon=True
+        )
+        self._index_thread.start()
+
+    def _get_ann_index(self, build: bool = True):
+        """
+        Devuelve el índice ANN que corresponde al tamaño actual del almacén,
+        cargándolo del disco si es necesario. Si no existe o se han agregado
+        demasiadas filas desde la última construcción, lanza su construcción en
+        segundo plano y, mientras tanto, devuelve el índice anterior (o None, para
+        hacer la búsqueda exacta).
+        """
+        index_type = self._resolve_index_type()
+        if index_type == "flat":
+            return None
+
+        ann_index = self._ann_index
+        expected_class = IVFIndex if index_type == "ivf" else HNSWIndex
+        if not isinstance(ann_index, expected_class):
+            ann_index = self._ann_index = self._load_ann_index(index_type)
+
+        if build and (ann_index is None or not self._is_current(ann_index)):
+            self._start_index_build()
+        return ann_index
+
+    def _load_nodes(self, rows) -> List[BaseNode]:
+        rows = [int(row) for row in rows]
+        if not rows:
+            return []
+
+        with self._lock:
+            node_json_by_row = dict(
+                self._connection.execute(
+                    f"SELECT row, node_json FROM nodes WHERE row IN ({','.join('?' * len(rows))})",
+                    rows,
+                )
+            )
+        return [
+            metadata_dict_to_node(json.loads(node_json_by_row[row])) for row in rows
+        ]
+
+    def query(self, query: VectorStoreQuery, **kwargs) -> VectorStoreQueryResult:
+        """
+        Consulta el almacén con el embedding de una consulta.
+
+        Parámetros:
+        -----------
+        query : VectorStoreQuery
+            Consulta con `query_embedding` y `similarity_top_k`.
+
+        Devuelve:
+        --------
+        VectorStoreQueryResult
+            Los nodos encontrados, sus similitudes y sus identificadores.
+        """
+        rows, dots = self.search(query.query_embedding, query.similarity_top_k)
+        nodes = self._load_nodes(rows)
+        return VectorStoreQueryResult(
+            nodes=nodes,
+            similarities=similarity_from_dot(dots).tolist(),
+            ids=[node.node_id for node in nodes],
+        )
+
+    def query_batch(
+        self, queries: List[VectorStoreQuery]
+    ) -> List[VectorStoreQueryResult]:
+        """
+        Versión por lotes de `query`: resuelve varias consultas con `search_batch`.
+        Todas las consultas usan el `similarity_top_k` mayor del lote y después se
+        recortan al suyo.
+        """
+        if not queries:
+            return []
+
+        top_k = max(query.similarity_top_k for query in queries)
+        searches = self.search_batch(
+            [query.query_embedding for query in queries], top_k
+        )
+
+        results = []
+        for query, (rows, dots) in zip(queries, searches):
+            rows, dots = rows[: query.similarity_top_k], dots[: query.similarity_top_k]
+            nodes = self._load_nodes(rows)
+            results.append(
+                VectorStoreQueryResult(
+                    nodes=nodes,
+                    similarities=similarity_from_dot(dots).tolist(),
+                    ids=[node.node_id for node in nodes],
+                )
+            )
+        return results
+
+    def evaluate_recall(self, query_embeddings, top_k: int = 10) -> float:
+        """
+        Mide el recall@k de la búsqueda cuantizada frente a la búsqueda exacta en
+        float32.
+
+        Parámetros:
+        -----------
+        query_embeddings : list
+            Embeddings de las consultas de prueba.
+        top_k : int, opcional
+            Número de resultados comparados (por defecto es 10).
+
+        Devuelve:
+        --------
+        float
+            La fracción media de los `top_k` resultados exactos que también devuelve
+            la búsqueda cuantizada.
+        """
+        recalls = []
+        for query_embedding in query_embeddings:
+            exact_rows, _ = self.search(query_embedding, top_k, exact=True)
+            approx_rows, _ = self.search(query_embedding, top_k)
+            if len(exact_rows):
+                recalls.append(
+                    len(set(exact_rows) & set(approx_rows)) / len(exact_rows)
+                )
+        return float(np.mean(recalls)) if recalls else math.nan
+
+    def index_size_bytes(self) -> dict:
+        """
+        Devuelve el tamaño en bytes de los ficheros del almacén.
+
+        Devuelve:
+        --------
+        dict
+            Diccionario fichero -> tamaño en bytes. 'search' es lo que se recorre en
+            cada consulta (códigos int8 o vectores float32).
+        """
+        sizes = {
+            path.name: path.stat().st_size
+            for path in self._path.iterdir()
+            if path.is_file()
+        }
+        sizes["search"] = sizes.get(
+            "codes.i8" if self.quantization == "int8" else "vectors.f32", 0
+        )
+        return sizes
@@ -1,41 +1,32 @@
-from confidence_filter import query_with_confidence
 from config import settings
-from data_loader import load_documents
+from embedding_cache import QueryEmbeddingCache
 from embedding_setup import get_embedding_model
-from language_engine import detect_language, load_language_detection_model
+from ingestion import ingest_documents, open_ledger
+from language_engine import load_language_detection_model
 from llm_setup import get_llm
-from query_transformer import run_query_transformation_filter
-from response_maker import run_response_maker
+from metrics import start_metrics_server
 from retriever import VectorDBRetriever
-from vector_store_setup import (
-    chunk_documents,
-    create_nodes,
-    create_vector_store,
-    embed_and_add_nodes,
-)
+from search_pipeline import run_coroutine, search
+from vector_store_setup import create_vector_store
 
 
 def main():
+    start_metrics_server()
+
     print("Creating vector store...")
     collection, vector_store = create_vector_store()
 
     print("Setting up embdding model...")
     embed_model = get_embedding_model()
 
-    # Check if the vector store is empty
-    if collection.count() == 0:
-        print("Loading documents...")
-        documents = load_documents(max_docs=5000)
-
-        print("Splitting documents into chunks...")
-        text_chunks, doc_idxs = chunk_documents(documents)
-
-        print("Creating nodes...")
-        nodes = create_nodes(documents, text_chunks, doc_idxs)
-
-        print("Adding nodes to vector store...")
-        embed_and_add_nodes(nodes, embed_model, vector_store)
-
+    # Resume or extend the ingestion unless the collection predates the ledger
+    ledger = open_ledger(collection)
+    if ledger is not None:
+        print("Loading, splitting, embedding and adding documents to vector store...")
+        try:
+            ingest_documents(embed_model, vector_store, max_docs=5000, ledger=ledger)
+        finally:
+            ledger.close()
     else:
         print(
             f"Skipping collection loading because it already contains {collection.count()} nodes."
@@ -51,29 +42,24 @@ def main():
         query_mode=settings.QUERY_MODE,
         node_top_k=settings.NODE_TOP_K,
         document_top_k=settings.DOCUMENT_TOP_K,
+        embedding_cache=QueryEmbeddingCache(),
     )
 
     print("Loading language detection model...")
     language_detection_model = load_language_detection_model()
 
-    # Detect the language of the user query
-    detected_language = detect_language(settings.USER_QUERY, language_detection_model)
-    print(f"Detected language: {detected_language}")
-
-    # Transform the user query
-    transformed_query = run_query_transformation_filter(settings.USER_QUERY, llm)
-    print("Transformed Query", transformed_query)
+    # Detect the language, transform the query, retrieve and respond
+    result = run_coroutine(
+        search(settings.USER_QUERY, llm, retriever, language_detection_model)
+    )
+    print(f"Detected language: {result.detected_language}")
+    print("Transformed Query", result.transformed_query)
 
-    # Query the retriever with confidence
-    query_documents = query_with_confidence(transformed_query, retriever)
     print("\n===== QUERY DOCUMENTS =====\n")
-    print(query_documents)
+    print(result.documents)
 
-    llm_response = run_response_maker(
-        transformed_query, detected_language, query_documents, llm
-    )
     print("\n===== COMPILATION & DIFFERENCES =====\n")
-    print(llm_response)
+    print(result.response)
 
 
 if __name__ == "__main__":
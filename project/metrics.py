@@ -0,0 +1,326 @@
+"""
+Módulo: metrics.py
+
+Módulo con un registro en memoria de métricas de rendimiento del proceso (por
+ejemplo, el tiempo hasta el primer token de la respuesta o la latencia de cada etapa
+de la búsqueda). Cada métrica acumula el número de observaciones, la suma, el mínimo,
+el máximo, el último valor y un histograma por intervalos; los contadores acumulan
+un total (tokens, aciertos de caché...).
+
+Las métricas se exportan en el formato de texto de Prometheus (`render_prometheus`),
+servido en `/metrics` por `start_metrics_server` en el puerto `METRICS_PORT`. Si
+`OTEL_ENABLED` está activo y OpenTelemetry está instalado, cada etapa medida con
+`stage` o `timed` abre además una traza (span).
+"""
+
+import asyncio
+import functools
+import threading
+import time
+from contextlib import contextmanager
+from functools import lru_cache
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Dict, Optional, Sequence
+
+from config import settings
+
+# Histogram upper bounds, in seconds for latencies and in items for counts
+LATENCY_BUCKETS = (
+    0.005,
+    0.01,
+    0.025,
+    0.05,
+    0.1,
+    0.25,
+    0.5,
+    1.0,
+    2.5,
+    5.0,
+    10.0,
+    30.0,
+    60.0,
+)
+COUNT_BUCKETS = (0, 1, 2, 5, 10, 20, 50, 100, 200, 500, 1000)
+
+_lock = threading.Lock()
+_metrics: Dict[str, dict] = {}
+_counters: Dict[str, dict] = {}
+
+
+def _series_key(name: str, labels: Optional[Dict[str, str]]) -> str:
+    if not labels:
+        return name
+    rendered = ",".join(f'{key}="{value}"' for key, value in sorted(labels.items()))
+    return f"{name}{{{rendered}}}"
+
+
+def observe(
+    name: str,
+    value: float,
+    labels: Optional[Dict[str, str]] = None,
+    buckets: Sequence[float] = LATENCY_BUCKETS,
+) -> None:
+    """
+    Registra una observación de una métrica.
+
+    Parámetros:
+    -----------
+    name : str
+        Nombre de la métrica (por ejemplo, "response_time_to_first_token_seconds").
+    value : float
+        Valor observado.
+    labels : dict, opcional
+        Etiquetas de la serie (por ejemplo, {"stage": "retrieve"}).
+    buckets : sequence, opcional
+        Límites superiores del histograma (por defecto, `LATENCY_BUCKETS`). Se fijan
+        en la primera observación de cada serie.
+    """
+    key = _series_key(name, labels)
+    with _lock:
+        metric = _metrics.get(key)
+        if metric is None:
+            metric = _metrics[key] = {
+                "name": name,
+                "labels": dict(labels or {}),
+                "buckets": tuple(buckets),
+                "bucket_counts": [0] * len(buckets),
+                "count": 0,
+                "sum": 0.0,
+                "min": value,
+                "max": value,
+                "last": value,
+            }
+
+        metric["count"] += 1
+        metric["sum"] += value
+        metric["min"] = min(metric["min"], value)
+        metric["max"] = max(metric["max"], value)
+        metric["last"] = value
+        for index, upper_bound in enumerate(metric["buckets"]):
+            if value <= upper_bound:
+                metric["bucket_counts"][index] += 1
+                break
+
+
+def increment(
+    name: str, amount: float = 1.0, labels: Optional[Dict[str, str]] = None
+) -> None:
+    """
+    Incrementa un contador.
+
+    Parámetros:
+    -----------
+    name : str
+        Nombre del contador (por ejemplo, "llm_cache_requests_total").
+    amount : float, opcional
+        Cantidad sumada (por defecto es 1).
+    labels : dict, opcional
+        Etiquetas de la serie.
+    """
+    key = _series_key(name, labels)
+    with _lock:
+        counter = _counters.get(key)
+        if counter is None:
+            counter = _counters[key] = {
+                "name": name,
+                "labels": dict(labels or {}),
+                "value": 0.0,
+            }
+        counter["value"] += amount
+
+
+def get_metrics() -> Dict[str, dict]:
+    """
+    Devuelve una copia de las métricas registradas, con la media de cada una.
+
+    Devuelve:
+    --------
+    dict
+        Diccionario serie -> {count, sum, min, max, last, mean}. Los contadores
+        aparecen como serie -> {value}.
+    """
+    with _lock:
+        metrics = {
+            key: {
+                "count": metric["count"],
+                "sum": metric["sum"],
+                "min": metric["min"],
+                "max": metric["max"],
+                "last": metric["last"],
+                "mean": metric["sum"] / metric["count"],
+            }
+            for key, metric in _metrics.items()
+        }
+        metrics.update(
+            {key: {"value": counter["value"]} for key, counter in _counters.items()}
+        )
+        return metrics
+
+
+def _format_labels(labels: Dict[str, str], **extra) -> str:
+    labels = {**labels, **extra}
+    if not labels:
+        return ""
+    return (
+        "{"
+        + ",".join(f'{key}="{value}"' for key, value in sorted(labels.items()))
+        + "}"
+    )
+
+
+def render_prometheus() -> str:
+    """
+    Devuelve las métricas en el formato de texto de Prometheus: cada métrica como
+    histograma (`_bucket`, `_sum` y `_count`) y cada contador como `counter`.
+    """
+    lines = []
+    with _lock:
+        declared = set()
+        for metric in sorted(_metrics.values(), key=lambda metric: metric["name"]):
+            name, labels = metric["name"], metric["labels"]
+            if name not in declared:
+                lines.append(f"# TYPE {name} histogram")
+                declared.add(name)
+
+            cumulative = 0
+            for upper_bound, count in zip(metric["buckets"], metric["bucket_counts"]):
+                cumulative += count
+                lines.append(
+                    f"{name}_bucket{_format_labels(labels, le=upper_bound)} {cumulative}"
+                )
+            lines.append(
+                f'{name}_bucket{_format_labels(labels, le="+Inf")} {metric["count"]}'
+            )
+            lines.append(f"{name}_sum{_format_labels(labels)} {metric['sum']}")
+            lines.append(f"{name}_count{_format_labels(labels)} {metric['count']}")
+
+        for counter in sorted(_counters.values(), key=lambda counter: counter["name"]):
+            name = counter["name"]
+            if name not in declared:
+                lines.append(f"# TYPE {name} counter")
+                declared.add(name)
+            lines.append(
+                f"{name}{_format_labels(counter['labels'])} {counter['value']}"
+            )
+    return "\n".join(lines) + "\n"
+
+
+@lru_cache(maxsize=None)
+def _get_tracer():
+    if not settings.OTEL_ENABLED:
+        return None
+    try:
+        from opentelemetry import trace
+        from opentelemetry.exporter.otlp.proto.grpc.trace_exporter import (
+            OTLPSpanExporter,
+        )
+        from opentelemetry.sdk.resources import Resource
+        from opentelemetry.sdk.trace import TracerProvider
+        from opentelemetry.sdk.trace.export import BatchSpanProcessor
+    except ImportError:
+        return None
+
+    # The exporter reads the standard OTEL_EXPORTER_OTLP_* environment variables
+    provider = TracerProvider(
+        resource=Resource.create({"service.name": settings.OTEL_SERVICE_NAME})
+    )
+    provider.add_span_processor(BatchSpanProcessor(OTLPSpanExporter()))
+    trace.set_tracer_provider(provider)
+    return trace.get_tracer(settings.OTEL_SERVICE_NAME)
+
+
+@contextmanager
+def stage(name: str):
+    """
+    Mide la duración de una etapa de la búsqueda en la métrica
+    `search_stage_seconds{stage=name}` y, si OpenTelemetry está activo, la registra
+    como una traza.
+
+    Parámetros:
+    -----------
+    name : str
+        Nombre de la etapa (por ejemplo, "query_transformation").
+    """
+    tracer = _get_tracer()
+    start_time = time.perf_counter()
+    try:
+        if tracer is None:
+            yield
+        else:
+            with tracer.start_as_current_span(name):
+                yield
+    finally:
+        observe(
+            "search_stage_seconds", time.perf_counter() - start_time, {"stage": name}
+        )
+
+
+def timed(name: str):
+    """
+    Decorador que mide cada llamada de una función (síncrona o asíncrona) como la
+    etapa `name` (ver `stage`).
+    """
+
+    def decorator(function):
+        if asyncio.iscoroutinefunction(function):
+
+            @functools.wraps(function)
+            async def async_wrapper(*args, **kwargs):
+                with stage(name):
+                    return await function(*args, **kwargs)
+
+            return async_wrapper
+
+        @functools.wraps(function)
+        def wrapper(*args, **kwargs):
+            with stage(name):
+                return function(*args, **kwargs)
+
+        return wrapper
+
+    return decorator
+
+
+class _MetricsHandler(BaseHTTPRequestHandler):
+    def do_GET(self):
+        if self.path.split("?")[0] != "/metrics":
+            self.send_error(404)
+            return
+
+        body = render_prometheus().encode("utf-8")
+        self.send_response(200)
+        self.send_header("Content-Type", "text/plain; version=0.0.4; charset=utf-8")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        # Scrapes every few seconds would flood the console
+        pass
+
+
+@lru_cache(maxsize=None)
+def start_metrics_server(port: Optional[int] = None) -> Optional[ThreadingHTTPServer]:
+    """
+    Sirve las métricas en `http://<METRICS_HOST>:<port>/metrics` desde un hilo en
+    segundo plano. Sólo se inicia una vez por proceso.
+
+    Parámetros:
+    -----------
+    port : int, opcional
+        Puerto del servidor (por defecto, `settings.METRICS_PORT`; 0 lo desactiva).
+
+    Devuelve:
+    --------
+    ThreadingHTTPServer o None
+        El servidor, o None si está desactivado.
+    """
+    port = settings.METRICS_PORT if port is None else port
+    if not port:
+        return None
+
+    server = ThreadingHTTPServer((settings.METRICS_HOST, port), _MetricsHandler)
+    threading.Thread(
+        target=server.serve_forever, name="metrics-server", daemon=True
+    ).start()
+    return server
@@ -0,0 +1,163 @@
+"""
+Módulo: micro_batcher.py
+
+Módulo que agrupa las consultas que llegan a la vez a un servicio en lotes
+dinámicos: la primera consulta de un lote espera como mucho unos milisegundos a que
+lleguen otras y todas se recuperan juntas con `VectorDBRetriever.retrieve_many`, es
+decir, con una sola pasada del modelo de embeddings (y una sola búsqueda
+vectorizada si el almacén lo permite).
+"""
+
+import asyncio
+from typing import List, Optional
+
+from config import settings
+from doc_list import DocListResponse, build_doc_list_response
+from llama_index.core.schema import NodeWithScore
+from metrics import COUNT_BUCKETS, observe
+
+
+class RetrievalBatcher:
+    """
+    Agrupador dinámico de consultas de recuperación.
+
+    Debe usarse desde un único bucle de eventos (por ejemplo, el del servidor ASGI).
+    Los lotes se procesan de uno en uno: mientras se resuelve un lote, las consultas
+    nuevas se acumulan y forman el siguiente. Si un lote falla, sus consultas se
+    repiten por separado, de modo que el error sólo llega a las que lo provocan.
+
+    Parámetros:
+    -----------
+    retriever : VectorDBRetriever
+        El recuperador de documentos.
+    max_batch_size : int, opcional
+        Consultas máximas por lote (por defecto, `settings.API_BATCH_MAX_SIZE`).
+    max_wait_ms : float, opcional
+        Milisegundos máximos de espera para completar un lote (por defecto,
+        `settings.API_BATCH_MAX_WAIT_MS`).
+    """
+
+    def __init__(
+        self,
+        retriever,
+        max_batch_size: Optional[int] = None,
+        max_wait_ms: Optional[float] = None,
+    ) -> None:
+        self._retriever = retriever
+        self._max_batch_size = max_batch_size or settings.API_BATCH_MAX_SIZE
+        max_wait_ms = (
+            settings.API_BATCH_MAX_WAIT_MS if max_wait_ms is None else max_wait_ms
+        )
+        self._max_wait = max_wait_ms / 1000.0
+        self._queue: Optional[asyncio.Queue] = None
+        self._worker: Optional[asyncio.Task] = None
+
+    def _ensure_worker(self) -> None:
+        if self._worker is None or self._worker.done():
+            self._queue = asyncio.Queue()
+            self._worker = asyncio.create_task(self._run())
+
+    async def _next_batch(self) -> list:
+        loop = asyncio.get_running_loop()
+        batch = [await self._queue.get()]
+        deadline = loop.time() + self._max_wait
+
+        while len(batch) < self._max_batch_size:
+            timeout = deadline - loop.time()
+            if timeout <= 0:
+                break
+            try:
+                batch.append(await asyncio.wait_for(self._queue.get(), timeout))
+            except asyncio.TimeoutError:
+                break
+        return batch
+
+    async def _run(self) -> None:
+        while True:
+            batch = await self._next_batch()
+            observe("retrieval_batch_size", len(batch), buckets=COUNT_BUCKETS)
+
+            try:
+                results = await asyncio.to_thread(
+                    self._retriever.retrieve_many, [query_str for query_str, _ in batch]
+                )
+            except Exception as exc:
+                if len(batch) == 1:
+                    self._resolve(batch[0][1], exception=exc)
+                else:
+                    # One bad query must not fail the others: retry them one by one
+                    await self._run_individually(batch)
+                continue
+
+            for (_, future), nodes in zip(batch, results):
+                self._resolve(future, nodes)
+
+    @staticmethod
+    def _resolve(future: asyncio.Future, nodes=None, exception=None) -> None:
+        # The caller may have gone away (client disconnect, timeout)
+        if future.done():
+            return
+        if exception is not None:
+            future.set_exception(exception)
+        else:
+            future.set_result(nodes)
+
+    async def _run_individually(self, batch: list) -> None:
+        async def _retrieve_one(query_str, future):
+            try:
+                results = await asyncio.to_thread(
+                    self._retriever.retrieve_many, [query_str]
+                )
+            except Exception as exc:
+                self._resolve(future, exception=exc)
+            else:
+                self._resolve(future, results[0])
+
+        await asyncio.gather(
+            *(_retrieve_one(query_str, future) for query_str, future in batch)
+        )
+
+    async def retrieve(self, query_str: str) -> List[NodeWithScore]:
+        """
+        Recupera los nodos de una consulta dentro del siguiente lote.
+
+        Parámetros:
+        -----------
+        query_str : str
+            El texto de la consulta.
+
+        Devuelve:
+        --------
+        List[NodeWithScore]
+            Los nodos que devolvería `VectorDBRetriever._retrieve`.
+        """
+        self._ensure_worker()
+        future = asyncio.get_running_loop().create_future()
+        await self._queue.put((query_str, future))
+        return await future
+
+    async def query_with_confidence(self, query_str: str) -> List[DocListResponse]:
+        """
+        Equivalente agrupado de `confidence_filter.aquery_with_confidence`: recupera
+        la consulta en lote y devuelve los documentos que superan el umbral de
+        confianza.
+        """
+        nodes = await self.retrieve(query_str)
+        documents = await asyncio.to_thread(build_doc_list_response, nodes)
+        return [
+            doc
+            for doc in documents
+            if doc.similarity >= settings.RETRIEVER_CONFIDENCE_THRESHOLD
+        ]
+
+    async def close(self) -> None:
+        """
+        Detiene el procesamiento de lotes.
+        """
+        if self._worker is not None:
+            self._worker.cancel()
+            try:
+                await self._worker
+            except asyncio.CancelledError:
+                pass
+            self._worker = None
@@ -0,0 +1,127 @@
+"""
+Módulo: multi_query.py
+
+Módulo que amplía la consulta transformada con varias paráfrasis, generadas en una
+sola llamada al LLM, para recuperar artículos que usan una terminología distinta.
+Las búsquedas de la consulta y sus paráfrasis se combinan por documento con
+Reciprocal Rank Fusion (ver `VectorDBRetriever` en modo "multi_query").
+"""
+
+import logging
+from typing import List, Optional
+
+import openai
+from config import settings
+from llama_index.core.base.llms.types import ChatMessage, MessageRole
+from llm_cache import build_cache_key, get_llm_cache
+from llm_setup import get_stage_client
+from metrics import increment, timed
+from pydantic import BaseModel, ValidationError
+
+logger = logging.getLogger(__name__)
+
+# Failures of the LLM service or of its answer, after the gateway's retries. Other
+# errors (authentication, bad requests, bugs) are not hidden
+_FALLBACK_ERRORS = (
+    openai.APIConnectionError,
+    openai.RateLimitError,
+    openai.InternalServerError,
+    openai.LengthFinishReasonError,
+    openai.ContentFilterFinishReasonError,
+    ValidationError,
+    TimeoutError,
+)
+
+
+class Paraphrases(BaseModel):
+    queries: list[str]
+
+
+def build_paraphrase_messages(
+    query_str: str, num_paraphrases: int
+) -> List[ChatMessage]:
+    """
+    Construye los mensajes de la llamada que genera las paráfrasis de la consulta.
+
+    Parámetros:
+    -----------
+    query_str : str
+        La consulta (ya transformada) del usuario.
+    num_paraphrases : int
+        Número de paráfrasis pedidas.
+
+    Devuelve:
+    --------
+    List[ChatMessage]
+        Los mensajes para el modelo de lenguaje.
+    """
+    system_content = (
+        "You are a search assistant for a database of scientific papers. Given a search "
+        "phrase, write alternative phrasings that a paper about the same topic could use: "
+        "synonyms, related technical terms and expanded acronyms."
+    )
+    user_content = (
+        f'Search phrase: "{query_str}"\n\n'
+        f"Return {num_paraphrases} distinct, concise search phrases in English, different "
+        "from the original one."
+    )
+    return [
+        ChatMessage(role=MessageRole.SYSTEM, content=system_content),
+        ChatMessage(role=MessageRole.USER, content=user_content),
+    ]
+
+
+@timed("multi_query_paraphrases")
+def generate_paraphrases(
+    query_str: str, num_paraphrases: Optional[int] = None
+) -> List[str]:
+    """
+    Genera paráfrasis de la consulta con una única llamada al LLM (backend de
+    `MULTI_QUERY_LLM_BACKEND`), servida desde la caché de respuestas si se repite.
+
+    Parámetros:
+    -----------
+    query_str : str
+        La consulta del usuario.
+    num_paraphrases : int, opcional
+        Número de paráfrasis (por defecto, `settings.MULTI_QUERY_NUM_PARAPHRASES`).
+
+    Devuelve:
+    --------
+    List[str]
+        Las paráfrasis distintas de la consulta original, como mucho
+        `num_paraphrases`. Si el servicio del LLM falla o su respuesta no es válida,
+        una lista vacía: la búsqueda se hace sólo con la consulta original.
+    """
+    num_paraphrases = num_paraphrases or settings.MULTI_QUERY_NUM_PARAPHRASES
+    messages = build_paraphrase_messages(query_str, num_paraphrases)
+
+    client, model = get_stage_client(
+        settings.MULTI_QUERY_LLM_BACKEND, settings.OPENAI_GENERATOR_MODEL
+    )
+
+    def _parse():
+        return client.complete(
+            messages, model=model, response_format=Paraphrases
+        ).queries
+
+    cache_key = build_cache_key(model, messages, response_format=Paraphrases)
+    try:
+        paraphrases = get_llm_cache().get_or_compute(cache_key, _parse)
+    except _FALLBACK_ERRORS as error:
+        # Like HyDE, degrade to the plain query instead of failing the retrieval
+        logger.warning(
+            "Paraphrase generation failed, searching the query only: %r", error
+        )
+        increment("multi_query_fallbacks_total", labels={"error": type(error).__name__})
+        return []
+
+    # Drop blanks and repetitions of the original query
+    seen = {query_str.strip().lower()}
+    unique = []
+    for paraphrase in paraphrases:
+        paraphrase = paraphrase.strip()
+        if paraphrase and paraphrase.lower() not in seen:
+            seen.add(paraphrase.lower())
+            unique.append(paraphrase)
+    return unique[:num_paraphrases]
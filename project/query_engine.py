@@ -6,6 +6,7 @@ Módulo para la creación de un motor de consultas utilizando un recuperador y u
 
 from llama_index.core.query_engine import RetrieverQueryEngine
 
+
 def create_query_engine(retriever, llm):
     """
     Inicializa y devuelve una instancia del motor de consultas que permite
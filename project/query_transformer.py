@@ -5,7 +5,13 @@ Módulo para la transformación de querys del usuario en frases más concisas y
 búsquedas en una base de datos.
 """
 
+from typing import List
+
+from config import settings
 from llama_index.core.base.llms.types import ChatMessage, ChatResponse, MessageRole
+from llm_cache import build_cache_key, get_llm_cache
+from llm_setup import get_stage_client
+from metrics import timed
 
 
 def build_entry_transformation_prompt(query_str: str) -> str:
@@ -35,21 +41,19 @@ def build_entry_transformation_prompt(query_str: str) -> str:
     return prompt
 
 
-def run_query_transformation_filter(query_str: str, llm) -> ChatResponse:
+def build_transformation_messages(query_str: str) -> List[ChatMessage]:
     """
-    Ejecuta la transformación de la query usando un modelo de lenguaje.
+    Construye los mensajes de la llamada de transformación de la query.
 
     Parámetros:
     -----------
     query_str : str
         La consulta original proporcionada por el usuario.
-    llm : object
-        Una instancia del modelo de lenguaje utilizado para generar la respuesta.
 
     Devuelve:
     --------
-    ChatResponse
-        La respuesta generada por el modelo en forma de un objeto estructurado.
+    List[ChatMessage]
+        Los mensajes para el modelo de lenguaje.
     """
 
     # Prompt with instructions
@@ -71,7 +75,87 @@ def run_query_transformation_filter(query_str: str, llm) -> ChatResponse:
         ChatMessage(role=MessageRole.USER, content=prompt_text),
         ChatMessage(role=MessageRole.SYSTEM, content=user_task),
     ]
+    return messages
+
+
+def clean_transformed_query(transformed_query: str) -> str:
+    """
+    Elimina el prefijo 'Output: "..."' que el modelo a veces copia del ejemplo del prompt.
+
+    Parámetros:
+    -----------
+    transformed_query : str
+        La query transformada devuelta por el modelo.
+
+    Devuelve:
+    --------
+    str
+        La query transformada sin el prefijo.
+    """
+    if "Output: " in transformed_query:
+        transformed_query = transformed_query[
+            transformed_query.rfind('Output: "') + len('Output: "') : -1
+        ]
+    return transformed_query
+
+
+@timed("query_transformation")
+def run_query_transformation_filter(query_str: str, llm) -> ChatResponse:
+    """
+    Ejecuta la transformación de la query usando un modelo de lenguaje.
+
+    Parámetros:
+    -----------
+    query_str : str
+        La consulta original proporcionada por el usuario.
+    llm : object
+        Una instancia del modelo de lenguaje utilizado para generar la respuesta. La
+        llamada se realiza con el backend de `TRANSFORM_LLM_BACKEND`: la pasarela
+        compartida (`llm_gateway`) con el modelo de `llm.model`, o el modelo local.
+
+    Devuelve:
+    --------
+    ChatResponse
+        La respuesta generada por el modelo en forma de un objeto estructurado.
+    """
+    messages = build_transformation_messages(query_str)
+
+    client, model = get_stage_client(settings.TRANSFORM_LLM_BACKEND, llm.model)
+
+    # The transformation only depends on the query, so it can be served from cache
+    def _chat():
+        return client.complete(messages, model=model, temperature=llm.temperature)
+
+    cache_key = build_cache_key(model, messages, temperature=llm.temperature)
+    return get_llm_cache().get_or_compute(cache_key, _chat)
+
+
+@timed("query_transformation")
+async def arun_query_transformation_filter(query_str: str, llm) -> str:
+    """
+    Versión asíncrona de `run_query_transformation_filter`, basada en el método
+    `acomplete` del backend configurado.
+
+    Parámetros:
+    -----------
+    query_str : str
+        La consulta original proporcionada por el usuario.
+    llm : object
+        Una instancia del modelo de lenguaje utilizado para generar la respuesta.
+
+    Devuelve:
+    --------
+    str
+        La query transformada.
+    """
+    messages = build_transformation_messages(query_str)
+
+    client, model = get_stage_client(settings.TRANSFORM_LLM_BACKEND, llm.model)
+
+    async def _achat():
+        return await client.acomplete(
+            messages, model=model, temperature=llm.temperature
+        )
 
-    # Pass messages=list_of_dicts instead of a single string
-    response = llm.chat(messages=messages)
-    return response.raw.choices[0].message.content.strip()
+    cache_key = build_cache_key(model, messages, temperature=llm.temperature)
+    return await get_llm_cache().aget_or_compute(cache_key, _achat)
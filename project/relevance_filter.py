@@ -0,0 +1,179 @@
+"""
+Módulo: relevance_filter.py
+
+Módulo que decide qué documentos recuperados son relevantes para la consulta sin
+enviar todos los títulos y resúmenes a un LLM.
+
+La relevancia se estima localmente, en lote para todos los candidatos:
+- Con un cross-encoder en CPU (`RELEVANCE_CROSS_ENCODER_MODEL`), que puntúa cada par
+  (consulta, título y resumen).
+- Si no hay cross-encoder configurado, con una calibración logística de la
+  similitud coseno ya calculada entre la consulta y el documento durante la
+  recuperación.
+
+El modo se elige con `RELEVANCE_FILTER_MODE`:
+- "llm": el filtro de correlación original con LLM (`correlation_filter`).
+- "embedding": sólo la estimación local.
+- "hybrid": la estimación local decide los casos claros y el LLM sólo se consulta
+  para los documentos dudosos.
+"""
+
+import asyncio
+from functools import lru_cache
+from typing import List
+
+import numpy as np
+from config import settings
+from correlation_filter import arun_correlation_filter, run_correlation_filter
+from doc_list import DocListResponse
+
+
+@lru_cache(maxsize=None)
+def get_cross_encoder():
+    """
+    Carga (una sola vez) el cross-encoder configurado en
+    `RELEVANCE_CROSS_ENCODER_MODEL`.
+    """
+    from sentence_transformers import CrossEncoder
+
+    return CrossEncoder(settings.RELEVANCE_CROSS_ENCODER_MODEL, device="cpu")
+
+
+def similarity_to_cosine(similarities: np.ndarray) -> np.ndarray:
+    """
+    Convierte la similitud de los almacenes vectoriales (exp(-distancia L2 al
+    cuadrado) sobre embeddings normalizados) en similitud coseno.
+    """
+    return 1.0 + np.log(np.clip(similarities, 1e-12, None)) / 2.0
+
+
+def score_relevance(
+    query_str: str, retrieved_docs: List[DocListResponse]
+) -> np.ndarray:
+    """
+    Estima la probabilidad de que cada documento sea relevante para la consulta.
+
+    Parámetros:
+    -----------
+    query_str : str
+        El texto de la consulta.
+    retrieved_docs : List[DocListResponse]
+        Documentos recuperados.
+
+    Devuelve:
+    --------
+    np.ndarray
+        Probabilidad de relevancia (entre 0 y 1) de cada documento.
+    """
+    if not retrieved_docs:
+        return np.empty(0)
+
+    if settings.RELEVANCE_CROSS_ENCODER_MODEL:
+        logits = np.asarray(
+            get_cross_encoder().predict(
+                [
+                    (query_str, f"{doc.title}\n\n{doc.abstract}")
+                    for doc in retrieved_docs
+                ],
+                batch_size=len(retrieved_docs),
+            ),
+            dtype=np.float64,
+        )
+        return 1.0 / (1.0 + np.exp(-logits))
+
+    cosines = similarity_to_cosine(
+        np.fromiter((doc.similarity for doc in retrieved_docs), dtype=np.float64)
+    )
+    return 1.0 / (
+        1.0
+        + np.exp(
+            -settings.RELEVANCE_CALIBRATION_SLOPE
+            * (cosines - settings.RELEVANCE_CALIBRATION_MIDPOINT)
+        )
+    )
+
+
+def split_by_relevance(query_str: str, retrieved_docs: List[DocListResponse]):
+    """
+    Clasifica los documentos en relevantes y dudosos según `score_relevance`.
+
+    Devuelve:
+    --------
+    tuple
+        Tupla (relevant_docs, borderline_docs). Los documentos por debajo de
+        `RELEVANCE_DROP_THRESHOLD` se descartan.
+    """
+    probabilities = score_relevance(query_str, retrieved_docs)
+    keep = probabilities >= settings.RELEVANCE_KEEP_THRESHOLD
+    borderline = ~keep & (probabilities >= settings.RELEVANCE_DROP_THRESHOLD)
+
+    relevant_docs = [doc for doc, kept in zip(retrieved_docs, keep) if kept]
+    borderline_docs = [
+        doc for doc, doubtful in zip(retrieved_docs, borderline) if doubtful
+    ]
+    return relevant_docs, borderline_docs
+
+
+def _merge_in_order(retrieved_docs, *doc_lists) -> List[DocListResponse]:
+    selected = {id(doc) for docs in doc_lists for doc in docs}
+    return [doc for doc in retrieved_docs if id(doc) in selected]
+
+
+def run_relevance_filter(
+    query_str: str, retrieved_docs: List[DocListResponse]
+) -> List[DocListResponse]:
+    """
+    Filtra los documentos irrelevantes según `RELEVANCE_FILTER_MODE`.
+
+    Parámetros:
+    -----------
+    query_str : str
+        El texto de la consulta.
+    retrieved_docs : List[DocListResponse]
+        Documentos recuperados.
+
+    Devuelve:
+    --------
+    List[DocListResponse]
+        Los documentos relevantes, en el orden original.
+    """
+    mode = settings.RELEVANCE_FILTER_MODE
+    if mode == "none" or not retrieved_docs:
+        return retrieved_docs
+    if mode == "llm":
+        return run_correlation_filter(query_str, retrieved_docs)
+
+    relevant_docs, borderline_docs = split_by_relevance(query_str, retrieved_docs)
+    if mode == "hybrid" and borderline_docs:
+        borderline_docs = run_correlation_filter(query_str, borderline_docs)
+    elif mode == "embedding":
+        borderline_docs = []
+    elif mode != "hybrid":
+        raise ValueError(f"Unknown relevance filter mode: {mode}")
+    return _merge_in_order(retrieved_docs, relevant_docs, borderline_docs)
+
+
+async def arun_relevance_filter(
+    query_str: str, retrieved_docs: List[DocListResponse]
+) -> List[DocListResponse]:
+    """
+    Versión asíncrona de `run_relevance_filter`. La llamada al LLM (modos "llm" e
+    "hybrid") se realiza con `arun_correlation_filter`.
+    """
+    mode = settings.RELEVANCE_FILTER_MODE
+    if mode == "none" or not retrieved_docs:
+        return retrieved_docs
+    if mode == "llm":
+        return await arun_correlation_filter(query_str, retrieved_docs)
+
+    # The cross-encoder is CPU-bound: keep it off the event loop
+    relevant_docs, borderline_docs = await asyncio.to_thread(
+        split_by_relevance, query_str, retrieved_docs
+    )
+    if mode == "hybrid" and borderline_docs:
+        borderline_docs = await arun_correlation_filter(query_str, borderline_docs)
+    elif mode == "embedding":
+        borderline_docs = []
+    elif mode != "hybrid":
+        raise ValueError(f"Unknown relevance filter mode: {mode}")
+    return _merge_in_order(retrieved_docs, relevant_docs, borderline_docs)
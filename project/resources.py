@@ -0,0 +1,147 @@
+"""
+Módulo: resources.py
+
+Módulo que gestiona los recursos pesados de la aplicación (modelo de embeddings,
+modelo de detección de idioma, almacén vectorial, LLM y recuperador) como instancias
+únicas compartidas por todo el proceso.
+
+Cada recurso se crea de forma perezosa la primera vez que se solicita y se reutiliza
+después, de modo que todas las sesiones de Streamlit comparten una sola copia de cada
+modelo y la memoria no crece con el número de usuarios. `warm_up` permite cargarlos
+por adelantado al arrancar el servidor.
+"""
+
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Callable, Dict
+
+from config import settings
+from embedding_cache import QueryEmbeddingCache
+from embedding_setup import get_embedding_model
+from language_engine import detect_language, load_language_detection_model
+from llm_setup import get_llm
+from metrics import start_metrics_server
+from retriever import VectorDBRetriever
+from vector_store_setup import create_vector_store
+
+_resources: Dict[str, Any] = {}
+# One lock per resource, so that different models load concurrently
+_resource_locks: Dict[str, threading.RLock] = {}
+_resources_lock = threading.Lock()
+_warm_up_thread = None
+
+
+def _get_or_create(name: str, factory: Callable[[], Any]) -> Any:
+    resource = _resources.get(name)
+    if resource is None:
+        with _resources_lock:
+            lock = _resource_locks.setdefault(name, threading.RLock())
+        with lock:
+            # Another thread may have created it while we were waiting
+            resource = _resources.get(name)
+            if resource is None:
+                print(f"Loading shared resource: {name}...")
+                resource = factory()
+                _resources[name] = resource
+    return resource
+
+
+def get_shared_vector_store():
+    """
+    Devuelve la colección y el almacén vectorial compartidos.
+
+    Devuelve:
+    --------
+    tuple
+        Tupla (Collection, ChromaVectorStore).
+    """
+    return _get_or_create("vector_store", create_vector_store)
+
+
+def get_shared_embedding_model():
+    """
+    Devuelve el modelo de embeddings compartido.
+    """
+    return _get_or_create("embed_model", get_embedding_model)
+
+
+def get_shared_llm():
+    """
+    Devuelve el modelo de lenguaje compartido.
+    """
+    return _get_or_create("llm", get_llm)
+
+
+def get_shared_language_detection_model():
+    """
+    Devuelve el modelo de detección de idioma compartido.
+    """
+    return _get_or_create("language_detection_model", load_language_detection_model)
+
+
+def get_shared_retriever() -> VectorDBRetriever:
+    """
+    Devuelve el recuperador compartido, con su caché de embeddings de consultas.
+    """
+
+    def _create_retriever():
+        _, vector_store = get_shared_vector_store()
+        return VectorDBRetriever(
+            vector_store=vector_store,
+            embed_model=get_shared_embedding_model(),
+            query_mode=settings.QUERY_MODE,
+            node_top_k=settings.NODE_TOP_K,
+            document_top_k=settings.DOCUMENT_TOP_K,
+            embedding_cache=QueryEmbeddingCache(),
+        )
+
+    return _get_or_create("retriever", _create_retriever)
+
+
+def warm_up() -> None:
+    """
+    Carga todos los recursos compartidos y ejecuta una inferencia de prueba en cada
+    modelo, para que la primera búsqueda no pague el coste de inicialización.
+    """
+    # The models are independent: load them concurrently
+    with ThreadPoolExecutor(max_workers=4, thread_name_prefix="warm-up") as executor:
+        futures = [
+            executor.submit(get_shared_vector_store),
+            executor.submit(get_shared_llm),
+            executor.submit(
+                lambda: get_shared_embedding_model().get_query_embedding("warm up")
+            ),
+            executor.submit(
+                lambda: detect_language(
+                    "warm up", get_shared_language_detection_model()
+                )
+            ),
+        ]
+        for future in futures:
+            future.result()
+
+    get_shared_retriever()
+    print("Shared resources ready.")
+
+
+def start_warm_up() -> threading.Thread:
+    """
+    Lanza `warm_up` en un hilo en segundo plano la primera vez que se llama, junto
+    con el servidor de métricas (`METRICS_PORT`); las llamadas posteriores devuelven
+    el mismo hilo.
+
+    Devuelve:
+    --------
+    threading.Thread
+        El hilo de precarga.
+    """
+    global _warm_up_thread
+
+    with _resources_lock:
+        if _warm_up_thread is None:
+            start_metrics_server()
+            _warm_up_thread = threading.Thread(
+                target=warm_up, name="resources-warm-up", daemon=True
+            )
+            _warm_up_thread.start()
+    return _warm_up_thread
@@ -1,7 +1,12 @@
-from typing import List
+import time
+from typing import Iterator, List
 
+from config import settings
 from doc_list import DocListResponse
 from llama_index.core.base.llms.types import ChatMessage, ChatResponse, MessageRole
+from llm_cache import build_cache_key, get_llm_cache
+from llm_setup import get_stage_client
+from metrics import observe, timed
 
 
 def build_response_prompt(query_str: str, retrieved_docs: List[DocListResponse]) -> str:
@@ -37,14 +42,11 @@ def build_response_prompt(query_str: str, retrieved_docs: List[DocListResponse])
     return prompt
 
 
-def run_response_maker(
-    query_str: str, output_language: str, retrieved_docs: List[DocListResponse], llm
-) -> ChatResponse:
+def build_response_messages(
+    query_str: str, output_language: str, retrieved_docs: List[DocListResponse]
+) -> List[ChatMessage]:
     """
-    Crea la respuesta entre la consulta del usuario y los documentos recuperados.
-
-    Este método construye un prompt basado en la consulta del usuario y los documentos relevantes,
-    llama a un modelo de lenguaje (LLM) para analizar la correlación y devuelve un resultado estructurado.
+    Construye los mensajes de la llamada de generación de la respuesta.
 
     Parámetros:
     -----------
@@ -54,13 +56,11 @@ def run_response_maker(
         El idioma en el que se debe generar la respuesta.
     retrieved_docs : List[DocListResponse]
         Una lista de documentos relevantes recuperados para la consulta.
-    llm : object
-        El modelo de lenguaje encargado de procesar el prompt y devolver el resultado.
 
     Devuelve:
     --------
-    ChatResponse
-        La respuesta estructurada generada por el modelo de lenguaje.
+    List[ChatMessage]
+        Los mensajes para el modelo de lenguaje.
     """
 
     # 1. Build the prompt text, which includes indexes for each document
@@ -96,7 +96,143 @@ def run_response_maker(
         ChatMessage(role=MessageRole.USER, content=prompt_text),
         ChatMessage(role=MessageRole.SYSTEM, content=user_instructions),
     ]
+    return messages
 
-    # 4. Call the LLM with the structured messages
-    response_text = llm.chat(messages=messages).raw.choices[0].message.content.strip()
+
+@timed("response_maker")
+def run_response_maker(
+    query_str: str, output_language: str, retrieved_docs: List[DocListResponse], llm
+) -> ChatResponse:
+    """
+    Crea la respuesta entre la consulta del usuario y los documentos recuperados.
+
+    Este método construye un prompt basado en la consulta del usuario y los documentos relevantes,
+    llama a un modelo de lenguaje (LLM) para analizar la correlación y devuelve un resultado estructurado.
+
+    Parámetros:
+    -----------
+    query_str : str
+        El texto de la consulta del usuario.
+    output_language : str
+        El idioma en el que se debe generar la respuesta.
+    retrieved_docs : List[DocListResponse]
+        Una lista de documentos relevantes recuperados para la consulta.
+    llm : object
+        El modelo de lenguaje encargado de procesar el prompt y devolver el resultado.
+
+    Devuelve:
+    --------
+    ChatResponse
+        La respuesta estructurada generada por el modelo de lenguaje.
+    """
+
+    messages = build_response_messages(query_str, output_language, retrieved_docs)
+
+    # Call the LLM with the structured messages (cached by query, language and docs)
+    client, model = get_stage_client(settings.RESPONSE_LLM_BACKEND, llm.model)
+
+    def _chat():
+        return client.complete(messages, model=model, temperature=llm.temperature)
+
+    cache_key = build_cache_key(model, messages, temperature=llm.temperature)
+    response_text = get_llm_cache().get_or_compute(cache_key, _chat)
     return response_text
+
+
+@timed("response_maker")
+async def arun_response_maker(
+    query_str: str, output_language: str, retrieved_docs: List[DocListResponse], llm
+) -> str:
+    """
+    Versión asíncrona de `run_response_maker`, basada en el método `acomplete` del
+    backend configurado (`RESPONSE_LLM_BACKEND`).
+
+    Parámetros:
+    -----------
+    query_str : str
+        El texto de la consulta del usuario.
+    output_language : str
+        El idioma en el que se debe generar la respuesta.
+    retrieved_docs : List[DocListResponse]
+        Una lista de documentos relevantes recuperados para la consulta.
+    llm : object
+        El modelo de lenguaje encargado de procesar el prompt y devolver el resultado.
+
+    Devuelve:
+    --------
+    str
+        El texto de la respuesta generada por el modelo de lenguaje.
+    """
+    messages = build_response_messages(query_str, output_language, retrieved_docs)
+
+    client, model = get_stage_client(settings.RESPONSE_LLM_BACKEND, llm.model)
+
+    async def _achat():
+        return await client.acomplete(
+            messages, model=model, temperature=llm.temperature
+        )
+
+    cache_key = build_cache_key(model, messages, temperature=llm.temperature)
+    return await get_llm_cache().aget_or_compute(cache_key, _achat)
+
+
+def stream_response_maker(
+    query_str: str, output_language: str, retrieved_docs: List[DocListResponse], llm
+) -> Iterator[str]:
+    """
+    Versión en streaming de `run_response_maker`: genera los fragmentos de texto de
+    la respuesta a medida que el modelo los produce, a través del método `stream`
+    del backend configurado.
+
+    Se registra el tiempo hasta el primer token en la métrica
+    "response_time_to_first_token_seconds". Si la respuesta ya está en la caché, se
+    devuelve completa de una sola vez; si no, se guarda en la caché al terminar.
+
+    Parámetros:
+    -----------
+    query_str : str
+        El texto de la consulta del usuario.
+    output_language : str
+        El idioma en el que se debe generar la respuesta.
+    retrieved_docs : List[DocListResponse]
+        Una lista de documentos relevantes recuperados para la consulta.
+    llm : object
+        El modelo de lenguaje encargado de procesar el prompt y devolver el resultado.
+
+    Devuelve:
+    --------
+    Iterator[str]
+        Un generador con los fragmentos de texto de la respuesta.
+    """
+    messages = build_response_messages(query_str, output_language, retrieved_docs)
+    start_time = time.perf_counter()
+
+    client, model = get_stage_client(settings.RESPONSE_LLM_BACKEND, llm.model)
+    llm_cache = get_llm_cache()
+    cache_key = build_cache_key(model, messages, temperature=llm.temperature)
+    cached_response = llm_cache.get(cache_key)
+    if cached_response is not None:
+        llm_cache.record_hit()
+        observe(
+            "response_time_to_first_token_seconds", time.perf_counter() - start_time
+        )
+        yield cached_response
+        return
+
+    llm_cache.record_miss()
+    chunks = []
+    for delta in client.stream(messages, model=model, temperature=llm.temperature):
+        if not chunks:
+            observe(
+                "response_time_to_first_token_seconds", time.perf_counter() - start_time
+            )
+        chunks.append(delta)
+        yield delta
+
+    observe("response_total_seconds", time.perf_counter() - start_time)
+    observe(
+        "search_stage_seconds",
+        time.perf_counter() - start_time,
+        {"stage": "response_maker"},
+    )
+    llm_cache.set(cache_key, "".join(chunks).strip())
@@ -6,12 +6,107 @@ un almacén vectorial, utilizando un modelo de incrustaciones para consultas.
 Proporciona funcionalidad para integrar recuperación basada en similitud con LlamaIndex.
 """
 
+from concurrent.futures import ThreadPoolExecutor
+from functools import lru_cache
 from typing import Any, List, Optional
+
+import numpy as np
+from config import settings
+from embedding_setup import get_query_embedding_batch
+from hyde import build_hyde_embedding, build_hyde_embeddings
+from llama_index.core import QueryBundle
 from llama_index.core.retrievers import BaseRetriever
 from llama_index.core.schema import NodeWithScore
-from llama_index.core import QueryBundle
 from llama_index.core.vector_stores import VectorStoreQuery
-from typing import List, Optional, Any
+from metrics import COUNT_BUCKETS, observe, stage
+from multi_query import generate_paraphrases
+
+
+def aggregate_document_scores(
+    sources: List[str],
+    similarities: Optional[List[float]],
+    method: str = "max",
+    top_n: int = 3,
+    rrf_k: int = 60,
+    ranks: Optional[np.ndarray] = None,
+):
+    """
+    Agrega las puntuaciones de los fragmentos recuperados por documento.
+
+    Los métodos disponibles son:
+    - "max": la mayor similitud de los fragmentos del documento (equivale a quedarse
+      con el primer fragmento de cada documento).
+    - "mean_top_n": la media de las `top_n` mayores similitudes del documento, que
+      favorece los documentos con varios fragmentos relevantes.
+    - "rrf": Reciprocal Rank Fusion, la suma de 1 / (rrf_k + posición) de los
+      fragmentos del documento.
+
+    Parámetros:
+    -----------
+    sources : list
+        Documento de origen de cada fragmento, en orden descendente de similitud.
+    similarities : list, opcional
+        Similitud de cada fragmento. Si es None, se usa sólo la posición.
+    method : str, opcional
+        Método de agregación (por defecto es "max").
+    top_n : int, opcional
+        Número de fragmentos promediados con "mean_top_n" (por defecto es 3).
+    rrf_k : int, opcional
+        Constante de suavizado de "rrf" (por defecto es 60).
+    ranks : np.ndarray, opcional
+        Posición de cada fragmento en su lista de resultados, cuando se fusionan
+        varias búsquedas. Por defecto, la posición en `sources`.
+
+    Devuelve:
+    --------
+    tuple
+        Tupla (document_nodes, document_scores) con, para cada documento distinto, la
+        posición de su mejor fragmento y su puntuación agregada.
+    """
+    num_nodes = len(sources)
+    if ranks is None:
+        ranks = np.arange(num_nodes)
+    if similarities is None:
+        scores = -ranks.astype(np.float64)
+    else:
+        scores = np.asarray(similarities, dtype=np.float64)
+
+    # Group the chunks by document; return_index gives the best chunk of each one
+    _, document_nodes, groups = np.unique(
+        np.asarray(sources, dtype=object), return_index=True, return_inverse=True
+    )
+    num_documents = len(document_nodes)
+
+    if method == "max":
+        document_scores = np.full(num_documents, -np.inf)
+        np.maximum.at(document_scores, groups, scores)
+    elif method == "mean_top_n":
+        # Rank of each chunk inside its document, by descending score
+        order = np.lexsort((-scores, groups))
+        group_starts = np.searchsorted(groups[order], np.arange(num_documents))
+        rank_in_group = np.empty(num_nodes, dtype=np.int64)
+        rank_in_group[order] = np.arange(num_nodes) - group_starts[groups[order]]
+
+        selected = rank_in_group < top_n
+        document_scores = np.bincount(
+            groups[selected], weights=scores[selected], minlength=num_documents
+        ) / np.bincount(groups[selected], minlength=num_documents)
+    elif method == "rrf":
+        document_scores = np.bincount(
+            groups, weights=1.0 / (rrf_k + ranks + 1), minlength=num_documents
+        )
+    else:
+        raise ValueError(f"Unknown aggregation method: {method}")
+
+    return document_nodes, document_scores
+
+
+@lru_cache(maxsize=None)
+def _get_search_executor() -> ThreadPoolExecutor:
+    # Runs the searches of stores without query_batch concurrently
+    return ThreadPoolExecutor(
+        max_workers=settings.SEARCH_MAX_CONCURRENCY, thread_name_prefix="search"
+    )
 
 
 class VectorDBRetriever(BaseRetriever):
@@ -34,6 +129,22 @@ class VectorDBRetriever(BaseRetriever):
         Número máximo de nodos devueltos por la consulta (por defecto, 20).
     document_top_k : int, opcional
         Número máximo de documentos únicos seleccionados (por defecto, 5).
+    embedding_cache : QueryEmbeddingCache, opcional
+        Caché de embeddings de consultas. Si se indica, las consultas repetidas no
+        vuelven a pasar por el modelo de embeddings.
+    aggregation : str, opcional
+        Agregación de las puntuaciones por documento: "max", "mean_top_n" o "rrf"
+        (por defecto, `settings.DOCUMENT_AGGREGATION`). La puntuación devuelta es
+        siempre la similitud del mejor fragmento, para que el umbral de confianza
+        conserve su significado.
+    max_node_top_k : int, opcional
+        Número máximo de nodos pedidos al almacén al repetir la consulta
+        (por defecto, `settings.MAX_NODE_TOP_K`).
+    retrieval_mode : str, opcional
+        "default" (búsqueda con el embedding de la consulta), "hyde" (embedding de
+        la consulta combinado con resúmenes hipotéticos, ver `hyde.py`) o
+        "multi_query" (búsquedas de la consulta y sus paráfrasis fusionadas con
+        RRF, ver `multi_query.py`). Por defecto, `settings.RETRIEVAL_MODE`.
     """
 
     def __init__(
@@ -43,14 +154,48 @@ class VectorDBRetriever(BaseRetriever):
         query_mode: str = "default",
         node_top_k: int = 20,
         document_top_k: int = 5,
+        embedding_cache: Optional[Any] = None,
+        aggregation: Optional[str] = None,
+        max_node_top_k: Optional[int] = None,
+        retrieval_mode: Optional[str] = None,
     ) -> None:
         self._vector_store = vector_store
         self._embed_model = embed_model
         self._query_mode = query_mode
         self._node_top_k = node_top_k
         self._document_top_k = document_top_k
+        self._embedding_cache = embedding_cache
+        self._aggregation = aggregation or settings.DOCUMENT_AGGREGATION
+        self._aggregation_top_n = settings.DOCUMENT_AGGREGATION_TOP_N
+        self._rrf_k = settings.RRF_K
+        self._max_node_top_k = max(
+            node_top_k, max_node_top_k or settings.MAX_NODE_TOP_K
+        )
+        self._retrieval_mode = retrieval_mode or settings.RETRIEVAL_MODE
+        if self._retrieval_mode not in ("default", "hyde", "multi_query"):
+            raise ValueError(f"Unknown retrieval mode: {self._retrieval_mode}")
         super().__init__()
 
+    def _get_query_embedding(self, query_str: str) -> List[float]:
+        """
+        Calcula el embedding de una consulta, usando la caché si está disponible.
+        """
+        with stage("query_embedding"):
+            if self._embedding_cache is None:
+                return self._embed_model.get_query_embedding(query_str)
+            return self._embedding_cache.get_or_compute(
+                query_str, self._embed_model.get_query_embedding
+            )
+
+    def _query_nodes(self, query_embedding: List[float], top_k: int):
+        vector_store_query = VectorStoreQuery(
+            query_embedding=query_embedding,
+            similarity_top_k=top_k,
+            mode=self._query_mode,
+        )
+        with stage("vector_store_query"):
+            return self._vector_store.query(vector_store_query)
+
     def _retrieve(self, query_bundle: QueryBundle) -> List[NodeWithScore]:
         """
         Recupera nodos relevantes basados en una consulta vectorial.
@@ -59,6 +204,15 @@ class VectorDBRetriever(BaseRetriever):
         vector, realiza una consulta en el almacén vectorial y selecciona los nodos más
         relevantes según su similitud.
 
+        En modo "hyde", el embedding de la consulta se combina con los de varios
+        resúmenes hipotéticos antes de la búsqueda (`build_hyde_embedding`). En modo
+        "multi_query", se usa `_retrieve_multi_query`.
+
+        Si los `node_top_k` fragmentos recuperados pertenecen a menos de
+        `document_top_k` documentos distintos, la consulta se repite pidiendo el doble
+        de fragmentos, hasta `max_node_top_k`. Las puntuaciones de los fragmentos se
+        agregan por documento con `aggregate_document_scores`.
+
         Parámetros:
         -----------
         query_bundle : QueryBundle
@@ -67,39 +221,232 @@ class VectorDBRetriever(BaseRetriever):
         Devuelve:
         --------
         List[NodeWithScore]
-            Una lista de nodos con sus respectivas puntuaciones de similitud.
+            Una lista con el mejor nodo de cada documento seleccionado y la
+            similitud de ese nodo.
         """
-        
-        # 1. Embed the query and retrieve the top-N nodes
-        query_embedding = self._embed_model.get_query_embedding(query_bundle.query_str)
-        vector_store_query = VectorStoreQuery(
-            query_embedding=query_embedding,
-            similarity_top_k=self._node_top_k,
-            mode=self._query_mode,
-        )
-        query_result = self._vector_store.query(vector_store_query)
-        
-        # The vector store results should already be in descending order of similarity.
-        # If not, you can manually sort by similarity here.
-
-        # 2. Collect the top-K nodes from distinct sources
-        selected_nodes: List[NodeWithScore] = []
-        seen_sources = set()
-
-        for index, node in enumerate(query_result.nodes):
-            if len(selected_nodes) >= self._document_top_k:
-                # If we already have enough distinct documents, break out
+        if self._retrieval_mode == "multi_query":
+            return self._retrieve_multi_query(query_bundle.query_str)
+
+        query_embedding = self._get_query_embedding(query_bundle.query_str)
+        if self._retrieval_mode == "hyde":
+            query_embedding = build_hyde_embedding(
+                query_bundle.query_str, query_embedding, self._embed_model
+            )
+        return self._retrieve_from_embedding(query_embedding)
+
+    def _retrieve_from_embedding(
+        self, query_embedding: List[float], query_result=None
+    ) -> List[NodeWithScore]:
+        """
+        Igual que `_retrieve`, a partir del embedding de la consulta. Si se indica
+        `query_result`, se usa como resultado de la primera consulta al almacén.
+        """
+
+        # 1. Retrieve the top-N nodes, over-fetching until enough distinct
+        #    documents are found
+        top_k = self._node_top_k
+        while True:
+            if query_result is None:
+                query_result = self._query_nodes(query_embedding, top_k)
+            sources = [
+                node.metadata.get("source", "unknown_source")
+                for node in query_result.nodes
+            ]
+            store_exhausted = len(sources) < top_k
+            if (
+                len(set(sources)) >= self._document_top_k
+                or store_exhausted
+                or top_k >= self._max_node_top_k
+            ):
                 break
+            top_k = min(top_k * 2, self._max_node_top_k)
+            query_result = None
 
-            similarity: Optional[float] = None
-            if query_result.similarities:
-                similarity = query_result.similarities[index]
+        observe("retrieval_candidates", len(sources), buckets=COUNT_BUCKETS)
+        if not sources:
+            return []
+
+        # 2. Aggregate the chunk scores per document and keep the best documents
+        similarities = query_result.similarities or None
+        document_nodes, document_scores = aggregate_document_scores(
+            sources,
+            similarities,
+            method=self._aggregation,
+            top_n=self._aggregation_top_n,
+            rrf_k=self._rrf_k,
+        )
+        best = np.argsort(-document_scores, kind="stable")[: self._document_top_k]
+
+        return [
+            NodeWithScore(
+                node=query_result.nodes[document_nodes[index]],
+                score=similarities[document_nodes[index]] if similarities else None,
+            )
+            for index in best
+        ]
+
+    def _get_query_embeddings(self, query_strs: List[str]) -> List[List[float]]:
+        """
+        Calcula los embeddings de varias consultas: las que están en la caché se
+        reutilizan y el resto se calculan juntas en una sola pasada del modelo.
+        """
+        embeddings = [
+            self._embedding_cache.get(query_str)
+            if self._embedding_cache is not None
+            else None
+            for query_str in query_strs
+        ]
+        missing = list(
+            dict.fromkeys(
+                query_str
+                for query_str, embedding in zip(query_strs, embeddings)
+                if embedding is None
+            )
+        )
+        if missing:
+            with stage("query_embedding"):
+                computed = dict(
+                    zip(missing, get_query_embedding_batch(self._embed_model, missing))
+                )
+            if self._embedding_cache is not None:
+                for query_str, embedding in computed.items():
+                    self._embedding_cache.put(query_str, embedding)
+            embeddings = [
+                embedding if embedding is not None else computed[query_str]
+                for query_str, embedding in zip(query_strs, embeddings)
+            ]
+        return embeddings
+
+    def _query_many(self, query_embeddings: List[List[float]], top_k: int):
+        """
+        Realiza varias búsquedas: con una sola operación vectorizada si el almacén
+        ofrece `query_batch` (como `LocalVectorStore`) o, si no, de forma concurrente.
+        """
+        if hasattr(self._vector_store, "query_batch"):
+            with stage("vector_store_query"):
+                return self._vector_store.query_batch(
+                    [
+                        VectorStoreQuery(
+                            query_embedding=query_embedding,
+                            similarity_top_k=top_k,
+                            mode=self._query_mode,
+                        )
+                        for query_embedding in query_embeddings
+                    ]
+                )
+        if len(query_embeddings) == 1:
+            return [self._query_nodes(query_embeddings[0], top_k)]
+        return list(
+            _get_search_executor().map(
+                lambda query_embedding: self._query_nodes(query_embedding, top_k),
+                query_embeddings,
+            )
+        )
+
+    def _retrieve_multi_query(self, query_str: str) -> List[NodeWithScore]:
+        """
+        Recupera documentos con la consulta y sus paráfrasis (modo "multi_query").
+
+        Las paráfrasis se generan con una sola llamada al LLM (`generate_paraphrases`),
+        sus embeddings se calculan en un lote y las búsquedas se realizan a la vez
+        (`_query_many`). Los resultados se fusionan por documento con Reciprocal Rank
+        Fusion sobre todas las listas; la puntuación devuelta es la mayor similitud
+        de los fragmentos del documento.
+
+        Parámetros:
+        -----------
+        query_str : str
+            El texto de la consulta.
+
+        Devuelve:
+        --------
+        List[NodeWithScore]
+            El mejor nodo de cada documento seleccionado y su similitud.
+        """
+        query_strs = [query_str, *generate_paraphrases(query_str)]
+        query_embeddings = self._get_query_embeddings(query_strs)
+        query_results = self._query_many(query_embeddings, self._node_top_k)
+
+        nodes = [node for result in query_results for node in result.nodes]
+        observe("retrieval_candidates", len(nodes), buckets=COUNT_BUCKETS)
+        if not nodes:
+            return []
+
+        # Flatten all result lists, keeping each chunk's rank inside its own list
+        ranks = np.concatenate(
+            [np.arange(len(result.nodes)) for result in query_results]
+        )
+        has_similarities = all(
+            result.similarities or not result.nodes for result in query_results
+        )
+        if has_similarities:
+            similarities = np.concatenate(
+                [
+                    np.asarray(result.similarities or [], dtype=np.float64)
+                    for result in query_results
+                ]
+            )
+        else:
+            similarities = -ranks.astype(np.float64)
+
+        # Best chunks first, so that each document is represented by its best chunk
+        order = np.argsort(-similarities, kind="stable")
+        sources = [
+            nodes[index].metadata.get("source", "unknown_source") for index in order
+        ]
+        document_nodes, document_scores = aggregate_document_scores(
+            sources,
+            similarities[order],
+            method="rrf",
+            rrf_k=self._rrf_k,
+            ranks=ranks[order],
+        )
+        best = np.argsort(-document_scores, kind="stable")[: self._document_top_k]
+
+        return [
+            NodeWithScore(
+                node=nodes[order[document_nodes[index]]],
+                score=float(similarities[order[document_nodes[index]]])
+                if has_similarities
+                else None,
+            )
+            for index in best
+        ]
+
+    def retrieve_many(self, query_strs: List[str]) -> List[List[NodeWithScore]]:
+        """
+        Recupera los documentos de varias consultas a la vez.
+
+        Los embeddings de las consultas se calculan en lote y, si el almacén ofrece
+        `query_batch` (como `LocalVectorStore`), todas las búsquedas se resuelven con
+        una sola operación vectorizada. Las consultas que necesitan repetir la
+        búsqueda para reunir `document_top_k` documentos se repiten por separado. En
+        modo "hyde", los resúmenes de todas las consultas se generan a la vez con un
+        único presupuesto de latencia y se incrustan en un solo lote.
+
+        Parámetros:
+        -----------
+        query_strs : list
+            Textos de las consultas.
+
+        Devuelve:
+        --------
+        list
+            Para cada consulta, la lista de nodos que devolvería `_retrieve`.
+        """
+        query_strs = list(query_strs)
+        if self._retrieval_mode == "multi_query":
+            return [self._retrieve_multi_query(query_str) for query_str in query_strs]
 
-            source = node.metadata.get("source", "unknown_source")
+        query_embeddings = self._get_query_embeddings(query_strs)
+        if self._retrieval_mode == "hyde":
+            query_embeddings = build_hyde_embeddings(
+                query_strs, query_embeddings, self._embed_model
+            )
 
-            # If this node's source has not been seen yet, select it
-            if source not in seen_sources:
-                seen_sources.add(source)
-                selected_nodes.append(NodeWithScore(node=node, score=similarity))
+        query_results = self._query_many(query_embeddings, self._node_top_k)
 
-        return selected_nodes
+        return [
+            self._retrieve_from_embedding(query_embedding, query_result)
+            for query_embedding, query_result in zip(query_embeddings, query_results)
+        ]
@@ -0,0 +1,217 @@
+"""
+Módulo: search_pipeline.py
+
+Módulo con la versión asíncrona del flujo de búsqueda completo: detección del idioma,
+transformación de la query, recuperación con umbral de confianza y generación de la
+respuesta. Las etapas independientes (detección del idioma y transformación de la
+query) se ejecutan de forma concurrente, y todas las búsquedas del proceso pueden
+compartir un único bucle de eventos en segundo plano.
+"""
+
+import asyncio
+import threading
+from typing import Awaitable, Callable, Iterable, List, Optional
+
+from confidence_filter import aquery_with_confidence
+from config import settings
+from doc_list import DocListResponse
+from language_engine import detect_language
+from pydantic import BaseModel
+from query_transformer import arun_query_transformation_filter, clean_transformed_query
+from relevance_filter import arun_relevance_filter
+from response_maker import arun_response_maker
+
+# Shared background event loop (see get_event_loop)
+_event_loop: Optional[asyncio.AbstractEventLoop] = None
+_event_loop_lock = threading.Lock()
+
+
+class SearchResult(BaseModel):
+    """
+    Resultado de una búsqueda completa.
+
+    Atributos:
+    ----------
+    query : str
+        La consulta original del usuario.
+    detected_language : str
+        El idioma detectado de la consulta.
+    transformed_query : str
+        La consulta transformada utilizada para la búsqueda.
+    documents : List[DocListResponse]
+        Los documentos recuperados que superan el umbral de confianza.
+    response : str
+        La respuesta generada por el modelo de lenguaje.
+    """
+
+    query: str
+    detected_language: str
+    transformed_query: str
+    documents: List[DocListResponse]
+    response: str
+
+
+async def prepare_search(
+    user_query: str,
+    llm,
+    retriever,
+    language_detection_model,
+    retrieve_documents: Optional[
+        Callable[[str], Awaitable[List[DocListResponse]]]
+    ] = None,
+) -> SearchResult:
+    """
+    Ejecuta las etapas de la búsqueda previas a la generación de la respuesta:
+    detección del idioma y transformación de la query (concurrentes), recuperación
+    de documentos y, si `RELEVANCE_FILTER_MODE` lo indica, filtro de relevancia.
+    Permite generar la respuesta después, por ejemplo en streaming.
+
+    Parámetros:
+    -----------
+    user_query : str
+        La consulta original del usuario.
+    llm : object
+        El modelo de lenguaje utilizado para transformar la query.
+    retriever : VectorDBRetriever
+        El recuperador de documentos.
+    language_detection_model : fasttext.FastText
+        El modelo de detección de idioma.
+    retrieve_documents : callable, opcional
+        Corrutina que recibe la consulta transformada y devuelve los documentos que
+        superan el umbral de confianza (por defecto, `aquery_with_confidence` con
+        `retriever`; el servicio HTTP la sustituye por su agrupador de peticiones).
+
+    Devuelve:
+    --------
+    SearchResult
+        El resultado de la búsqueda con la respuesta vacía.
+    """
+    user_query = user_query.replace("\n", " ")
+
+    # Language detection does not depend on the transformation: run both concurrently
+    detected_language, transformed_query = await asyncio.gather(
+        asyncio.to_thread(detect_language, user_query, language_detection_model),
+        arun_query_transformation_filter(user_query, llm),
+    )
+    transformed_query = clean_transformed_query(transformed_query)
+
+    if retrieve_documents is None:
+        query_documents = await aquery_with_confidence(transformed_query, retriever)
+    else:
+        query_documents = await retrieve_documents(transformed_query)
+    query_documents = await arun_relevance_filter(transformed_query, query_documents)
+
+    return SearchResult(
+        query=user_query,
+        detected_language=detected_language,
+        transformed_query=transformed_query,
+        documents=query_documents,
+        response="",
+    )
+
+
+async def search(
+    user_query: str, llm, retriever, language_detection_model
+) -> SearchResult:
+    """
+    Ejecuta el flujo de búsqueda completo de forma asíncrona.
+
+    Parámetros:
+    -----------
+    user_query : str
+        La consulta original del usuario.
+    llm : object
+        El modelo de lenguaje utilizado para transformar la query y generar la respuesta.
+    retriever : VectorDBRetriever
+        El recuperador de documentos.
+    language_detection_model : fasttext.FastText
+        El modelo de detección de idioma.
+
+    Devuelve:
+    --------
+    SearchResult
+        El resultado de la búsqueda.
+    """
+    result = await prepare_search(user_query, llm, retriever, language_detection_model)
+
+    result.response = await arun_response_maker(
+        result.transformed_query, result.detected_language, result.documents, llm
+    )
+    return result
+
+
+async def search_many(
+    user_queries: Iterable[str],
+    llm,
+    retriever,
+    language_detection_model,
+    max_concurrency: Optional[int] = None,
+) -> List[SearchResult]:
+    """
+    Ejecuta varias búsquedas de forma concurrente en el mismo bucle de eventos.
+
+    Parámetros:
+    -----------
+    user_queries : iterable
+        Las consultas de los usuarios.
+    llm, retriever, language_detection_model :
+        Los mismos recursos que en `search`.
+    max_concurrency : int, opcional
+        Número máximo de búsquedas simultáneas
+        (por defecto, `settings.SEARCH_MAX_CONCURRENCY`).
+
+    Devuelve:
+    --------
+    List[SearchResult]
+        Los resultados, en el mismo orden que las consultas.
+    """
+    semaphore = asyncio.Semaphore(max_concurrency or settings.SEARCH_MAX_CONCURRENCY)
+
+    async def _bounded_search(user_query):
+        async with semaphore:
+            return await search(user_query, llm, retriever, language_detection_model)
+
+    return await asyncio.gather(*(_bounded_search(query) for query in user_queries))
+
+
+def get_event_loop() -> asyncio.AbstractEventLoop:
+    """
+    Devuelve el bucle de eventos compartido del proceso, que se ejecuta en un hilo
+    en segundo plano y se crea la primera vez que se solicita.
+
+    Compartir un único bucle permite que las búsquedas de varios usuarios (por
+    ejemplo, las sesiones de Streamlit, cada una en su propio hilo) se intercalen y
+    reutilicen los clientes asíncronos y sus conexiones.
+
+    Devuelve:
+    --------
+    asyncio.AbstractEventLoop
+        El bucle de eventos compartido.
+    """
+    global _event_loop
+
+    with _event_loop_lock:
+        if _event_loop is None:
+            _event_loop = asyncio.new_event_loop()
+            threading.Thread(
+                target=_event_loop.run_forever, name="search-event-loop", daemon=True
+            ).start()
+    return _event_loop
+
+
+def run_coroutine(coroutine):
+    """
+    Ejecuta una corrutina en el bucle de eventos compartido y espera su resultado
+    desde código síncrono.
+
+    Parámetros:
+    -----------
+    coroutine : coroutine
+        La corrutina a ejecutar (por ejemplo, `search(...)`).
+
+    Devuelve:
+    --------
+    Any
+        El resultado de la corrutina.
+    """
+    return asyncio.run_coroutine_threadsafe(coroutine, get_event_loop()).result()
@@ -6,90 +6,74 @@ Este módulo permite a los usuarios ingresar consultas de investigación, buscar
 utilizando modelos de lenguaje y bases de datos vectoriales, desde la interfaz.
 """
 
-import time
 import sys
+import time
 
 import streamlit as st
-from confidence_filter import query_with_confidence
-from config import settings
-from data_loader import load_documents
-from embedding_setup import get_embedding_model
-from language_engine import detect_language, load_language_detection_model
-from llm_setup import get_llm
-from query_transformer import run_query_transformation_filter
-from response_maker import run_response_maker
-from retriever import VectorDBRetriever
-from vector_store_setup import (
-    chunk_documents,
-    create_nodes,
-    create_vector_store,
-    embed_and_add_nodes,
+from ingestion import ingest_documents, open_ledger
+from resources import (
+    get_shared_embedding_model,
+    get_shared_language_detection_model,
+    get_shared_llm,
+    get_shared_retriever,
+    get_shared_vector_store,
+    start_warm_up,
 )
+from response_maker import stream_response_maker
+from search_pipeline import prepare_search, run_coroutine
 
 
 def setup():
     # --------------- Setup ---------------
-    print("Creating vector store...")
-    collection, vector_store = create_vector_store()
-
-    print("Setting up embedding model...")
-    embed_model = get_embedding_model()
-
-    print("Setting up LLM...")
-    llm = get_llm()
-
-    print("Setting up retriever...")
-    retriever = VectorDBRetriever(
-        vector_store=vector_store,
-        embed_model=embed_model,
-        query_mode=settings.QUERY_MODE,
-        node_top_k=settings.NODE_TOP_K,
-        document_top_k=settings.DOCUMENT_TOP_K,
-    )
-
-    print("Loading language detection model...")
-    language_detection_model = load_language_detection_model()
+    # Heavy resources are shared by every session of the process and loaded only once
+    collection, vector_store = get_shared_vector_store()
 
     return (
-        embed_model,
-        llm,
-        retriever,
+        get_shared_embedding_model(),
+        get_shared_llm(),
+        get_shared_retriever(),
         vector_store,
         collection,
-        language_detection_model,
+        get_shared_language_detection_model(),
     )
 
 
 # --------------- Database Loading Logic ---------------
-def load_database(embed_model, vector_store):
-    print("Loading documents...")
+def load_database(embed_model, vector_store, collection):
+    ledger = open_ledger(collection)
+    if ledger is None:
+        print(
+            f"Skipping collection loading because it already contains {collection.count()} nodes."
+        )
+        return
+
+    print("Loading, splitting, embedding and adding documents to vector store...")
     print(f"Max docs: {st.session_state.max_docs}")
-    documents = load_documents(max_docs=st.session_state.max_docs)
-
-    print("Splitting documents into chunks...")
-    text_chunks, doc_idxs = chunk_documents(documents)
-
-    print("Creating nodes...")
-    nodes = create_nodes(documents, text_chunks, doc_idxs)
-
-    print("Embedding and adding nodes to vector store...")
-    embed_and_add_nodes(nodes, embed_model, vector_store)
+    try:
+        ingest_documents(
+            embed_model, vector_store, max_docs=st.session_state.max_docs, ledger=ledger
+        )
+    finally:
+        ledger.close()
 
     print("Database loaded!")
 
+
 def main():
+    # Start loading the shared models as soon as the server runs the app
+    start_warm_up()
+
     # Set the page title
     st.title("RAG-based Research Assistant")
 
     # Initialize session state variables
     if "max_docs" not in st.session_state:
-        #Guardar el valor de max_docs en session state
+        # Guardar el valor de max_docs en session state
         if len(sys.argv) > 1:
             st.session_state.max_docs = int(sys.argv[1])
         else:
             st.session_state.max_docs = None
-        
-        
+
     if "last_query" not in st.session_state:
         st.session_state.last_query = ""
     if "response" not in st.session_state:
@@ -109,7 +93,7 @@ def main():
             language_detection_model,
         ) = setup()
 
-        # Save the setup in session state
+        # Save references to the shared resources in session state
         st.session_state.embed_model = embed_model
         st.session_state.llm = llm
         st.session_state.retriever = retriever
@@ -130,44 +114,36 @@ def main():
         st.session_state.last_query = user_query
 
     # ------------------- SEARCH BUTTON ------------------
+    search_result = None
     if st.button("Search"):
         if user_query.strip():
-            # Call the RAG pipeline
-            user_query = user_query.replace("\n", " ")
-
-            # Detect the language of the query
-            detected_language = detect_language(
-                user_query, st.session_state.language_detection_model
-            )
-            print(f"Detected language: {detected_language}")
-
-            # Transform the query
-            transformed_query = run_query_transformation_filter(
-                user_query, st.session_state.llm
-            )
-            if "Output: " in transformed_query:
-                transformed_query = transformed_query[
-                    transformed_query.rfind('Output: "') + len('Output: "') : -1
-                ]
-
-            ## Query the retriever with confidence
-            query_documents = query_with_confidence(
-                transformed_query, st.session_state.retriever
-            )
-
-            llm_response = run_response_maker(
-                transformed_query,
-                detected_language,
-                query_documents,
-                st.session_state.llm,
+            # Call the RAG pipeline on the shared event loop
+            search_result = run_coroutine(
+                prepare_search(
+                    user_query,
+                    st.session_state.llm,
+                    st.session_state.retriever,
+                    st.session_state.language_detection_model,
+                )
             )
-            st.session_state.response = llm_response
+            print(f"Detected language: {search_result.detected_language}")
         else:
             st.write("Please enter a query.")
 
     # ------------------ DISPLAY RESPONSE ----------------
     st.markdown("### RAG Answer")
-    st.write(st.session_state.response)
+    if search_result is not None:
+        # Render the answer progressively as the LLM generates it
+        st.session_state.response = st.write_stream(
+            stream_response_maker(
+                search_result.transformed_query,
+                search_result.detected_language,
+                search_result.documents,
+                st.session_state.llm,
+            )
+        )
+    else:
+        st.write(st.session_state.response)
 
     # ------------------- LOAD DATABASE BUTTON -------------------
     # Use Streamlit's columns for alignment
@@ -179,10 +155,12 @@ def main():
             disabled=st.session_state.db_loaded,
             key="load_db_button",
         ):
-            if st.session_state.collection.count() == 0:
-                load_database(
-                    st.session_state.embed_model, st.session_state.vector_store
-                )  # Load the database when button is clicked
+            # Load (or resume loading) the database when button is clicked
+            load_database(
+                st.session_state.embed_model,
+                st.session_state.vector_store,
+                st.session_state.collection,
+            )
 
             st.session_state.db_loaded = True
             st.session_state.show_success = True  # Trigger success message
@@ -199,4 +177,3 @@ def main():
 
 if __name__ == "__main__":
     main()
-    
\ No newline at end of file
@@ -0,0 +1,74 @@
+"""
+Fixtures compartidas de las pruebas.
+
+`chroma_server` arranca un servidor de Chroma local con `chroma run` en un puerto
+libre, una vez por módulo, y omite las pruebas que lo usan si no se puede arrancar.
+"""
+
+import os
+import shutil
+import socket
+import subprocess
+import time
+
+import httpx
+import pytest
+from config import settings
+
+_SERVER_START_TIMEOUT = 30.0
+
+
+def _free_port() -> int:
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+
+@pytest.fixture(scope="module")
+def chroma_server(tmp_path_factory):
+    if shutil.which("chroma") is None:
+        pytest.skip("the chroma CLI is not installed")
+
+    port = _free_port()
+    data_dir = tmp_path_factory.mktemp("chroma")
+    process = subprocess.Popen(
+        [
+            "chroma",
+            "run",
+            "--path",
+            str(data_dir / "db"),
+            "--log-path",
+            str(data_dir / "chroma.log"),
+            "--host",
+            "127.0.0.1",
+            "--port",
+            str(port),
+        ],
+        stdout=subprocess.DEVNULL,
+        stderr=subprocess.DEVNULL,
+        env={**os.environ, "ANONYMIZED_TELEMETRY": "False"},
+    )
+
+    deadline = time.monotonic() + _SERVER_START_TIMEOUT
+    while True:
+        try:
+            httpx.get(f"http://127.0.0.1:{port}/api/v2/heartbeat", timeout=1.0)
+            break
+        except httpx.TransportError:
+            if process.poll() is not None or time.monotonic() > deadline:
+                process.kill()
+                pytest.skip("the local Chroma server did not start")
+            time.sleep(0.2)
+
+    yield port
+
+    process.terminate()
+    process.wait(timeout=10)
+
+
+@pytest.fixture
+def chroma_settings(chroma_server, monkeypatch):
+    monkeypatch.setenv("ANONYMIZED_TELEMETRY", "False")
+    monkeypatch.setattr(settings, "CHROMADB_HOST", "127.0.0.1")
+    monkeypatch.setattr(settings, "CHROMADB_PORT", chroma_server)
+    return settings
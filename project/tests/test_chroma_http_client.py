@@ -0,0 +1,153 @@
+"""
+Pruebas del cliente de Chroma remoto (`chroma_http_client.py`).
+
+Las pruebas de ida y vuelta usan el servidor local de `conftest.py` y se omiten si
+no se puede arrancar. Las de reintentos simulan el transporte y no necesitan
+servidor.
+"""
+
+import uuid
+
+import httpx
+import pytest
+from chroma_http_client import RetryTransport, create_chroma_http_client
+from config import settings
+
+
+@pytest.fixture
+def no_retry_delay(monkeypatch):
+    monkeypatch.setattr(settings, "CHROMADB_RETRY_BASE_DELAY", 0.0)
+
+
+def test_round_trip(chroma_settings):
+    client = create_chroma_http_client()
+    collection = client.get_or_create_collection(f"test-{uuid.uuid4().hex}")
+
+    collection.add(
+        ids=["a", "b"],
+        embeddings=[[1.0, 0.0, 0.0], [0.0, 1.0, 0.0]],
+        documents=["first", "second"],
+        metadatas=[{"source": "1"}, {"source": "2"}],
+    )
+    assert collection.count() == 2
+
+    result = collection.query(query_embeddings=[[0.9, 0.1, 0.0]], n_results=1)
+    assert result["ids"] == [["a"]]
+    assert result["metadatas"] == [[{"source": "1"}]]
+
+    collection.delete(ids=["a"])
+    assert collection.count() == 1
+    assert collection.get()["ids"] == ["b"]
+
+
+def test_configured_pool_and_timeouts(chroma_settings, monkeypatch):
+    monkeypatch.setattr(settings, "CHROMADB_MAX_CONNECTIONS", 4)
+    monkeypatch.setattr(settings, "CHROMADB_KEEPALIVE_EXPIRY", 12.0)
+    monkeypatch.setattr(settings, "CHROMADB_TIMEOUT", 7.0)
+    monkeypatch.setattr(settings, "CHROMADB_CONNECT_TIMEOUT", 2.0)
+
+    client = create_chroma_http_client()
+    session = client._server._session
+
+    assert session.timeout == httpx.Timeout(7.0, connect=2.0)
+    assert session.headers["content-type"] == "application/json"
+    transport = session._transport
+    assert isinstance(transport, RetryTransport)
+    assert transport._pool._max_connections == 4
+    assert transport._pool._max_keepalive_connections == 4
+    assert transport._pool._keepalive_expiry == 12.0
+    assert client.heartbeat() > 0
+
+
+def test_retry_against_server_after_dropped_connection(
+    chroma_settings, no_retry_delay, monkeypatch
+):
+    client = create_chroma_http_client()
+    transport = client._server._session._transport
+
+    send = httpx.HTTPTransport.handle_request
+    attempts = []
+
+    def _drop_first_connection(self, request):
+        attempts.append(request.url.path)
+        if len(attempts) == 1:
+            raise httpx.ConnectError("connection dropped")
+        return send(self, request)
+
+    monkeypatch.setattr(httpx.HTTPTransport, "handle_request", _drop_first_connection)
+
+    assert client.heartbeat() > 0
+    assert len(attempts) == 2
+    assert transport.retries == 1
+
+
+def _fake_send(monkeypatch, responses):
+    """
+    Sustituye el envío del transporte: cada llamada devuelve (o lanza) el siguiente
+    elemento de `responses`.
+    """
+    calls = []
+
+    def _send(self, request):
+        outcome = responses[len(calls)]
+        calls.append(request)
+        if isinstance(outcome, Exception):
+            raise outcome
+        return httpx.Response(outcome, request=request)
+
+    monkeypatch.setattr(httpx.HTTPTransport, "handle_request", _send)
+    return calls
+
+
+def test_retry_transport_retries_503(no_retry_delay, monkeypatch):
+    calls = _fake_send(monkeypatch, [503, 503, 200])
+    transport = RetryTransport(max_retries=3)
+
+    response = httpx.Client(transport=transport).get(
+        "http://chroma.test/api/v2/heartbeat"
+    )
+
+    assert response.status_code == 200
+    assert len(calls) == 3
+    assert transport.retries == 2
+
+
+def test_retry_transport_retries_connection_errors(no_retry_delay, monkeypatch):
+    calls = _fake_send(monkeypatch, [httpx.ConnectError("refused"), 200])
+    transport = RetryTransport(max_retries=3)
+
+    response = httpx.Client(transport=transport).post(
+        "http://chroma.test/api/v2/query", content=b'{"n_results": 1}'
+    )
+
+    assert response.status_code == 200
+    assert len(calls) == 2
+    assert calls[1].content == b'{"n_results": 1}'
+
+
+def test_retry_transport_gives_up_after_max_retries(no_retry_delay, monkeypatch):
+    calls = _fake_send(monkeypatch, [503, 503, 503])
+    transport = RetryTransport(max_retries=2)
+
+    response = httpx.Client(transport=transport).get(
+        "http://chroma.test/api/v2/heartbeat"
+    )
+    assert response.status_code == 503
+    assert len(calls) == 3
+
+    _fake_send(monkeypatch, [httpx.ConnectError("refused")] * 3)
+    with pytest.raises(httpx.ConnectError):
+        httpx.Client(transport=transport).get("http://chroma.test/api/v2/heartbeat")
+
+
+def test_retry_transport_does_not_retry_client_errors(no_retry_delay, monkeypatch):
+    calls = _fake_send(monkeypatch, [404])
+    transport = RetryTransport(max_retries=3)
+
+    response = httpx.Client(transport=transport).get(
+        "http://chroma.test/api/v2/missing"
+    )
+
+    assert response.status_code == 404
+    assert len(calls) == 1
+    assert transport.retries == 0
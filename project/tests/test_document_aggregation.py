@@ -0,0 +1,77 @@
+"""
+Pruebas de la agregación de las puntuaciones de los fragmentos por documento
+(`aggregate_document_scores` de `retriever.py`).
+"""
+
+import numpy as np
+import pytest
+from retriever import aggregate_document_scores
+
+# Chunks in descending order of similarity: documents a, b and c
+_SOURCES = ["a", "b", "a", "c", "b", "a"]
+_SIMILARITIES = [0.9, 0.8, 0.7, 0.6, 0.5, 0.1]
+
+
+def test_max():
+    document_nodes, document_scores = aggregate_document_scores(
+        _SOURCES, _SIMILARITIES, method="max"
+    )
+
+    # Position of the best chunk of each document
+    assert document_nodes.tolist() == [0, 1, 3]
+    np.testing.assert_allclose(document_scores, [0.9, 0.8, 0.6])
+
+
+def test_max_without_similarities_uses_the_position():
+    document_nodes, document_scores = aggregate_document_scores(
+        _SOURCES, None, method="max"
+    )
+
+    assert document_nodes.tolist() == [0, 1, 3]
+    np.testing.assert_allclose(document_scores, [0.0, -1.0, -3.0])
+
+
+def test_mean_top_n():
+    _, document_scores = aggregate_document_scores(
+        _SOURCES, _SIMILARITIES, method="mean_top_n", top_n=2
+    )
+
+    np.testing.assert_allclose(document_scores, [0.8, 0.65, 0.6])
+
+
+def test_mean_top_n_keeps_the_best_chunks_of_unsorted_input():
+    _, document_scores = aggregate_document_scores(
+        ["a", "a", "a"], [0.2, 0.9, 0.5], method="mean_top_n", top_n=2
+    )
+
+    np.testing.assert_allclose(document_scores, [0.7])
+
+
+def test_rrf():
+    _, document_scores = aggregate_document_scores(
+        _SOURCES, _SIMILARITIES, method="rrf", rrf_k=60
+    )
+
+    np.testing.assert_allclose(
+        document_scores,
+        [1 / 61 + 1 / 63 + 1 / 66, 1 / 62 + 1 / 65, 1 / 64],
+    )
+
+
+def test_rrf_with_the_ranks_of_fused_searches():
+    # Two result lists concatenated: each document is first in one and second in
+    # the other
+    _, document_scores = aggregate_document_scores(
+        ["a", "b", "b", "a"],
+        None,
+        method="rrf",
+        rrf_k=60,
+        ranks=np.array([0, 1, 0, 1]),
+    )
+
+    np.testing.assert_allclose(document_scores, [1 / 61 + 1 / 62] * 2)
+
+
+def test_unknown_method():
+    with pytest.raises(ValueError):
+        aggregate_document_scores(_SOURCES, _SIMILARITIES, method="sum")
@@ -0,0 +1,95 @@
+"""
+Pruebas de la tabla de documentos (`document_store.py`), local (SQLite) y en el
+servidor de Chroma remoto.
+"""
+
+import pytest
+from chroma_http_client import create_chroma_http_client
+from config import settings
+from document_store import ChromaDocumentStore, DocumentStore, get_document_store
+
+_DOCUMENTS = [
+    {"source": "1234.5678", "title": "Hubbard model", "abstract": "Quasi-particles."},
+    {"source": "2345.6789", "title": "Spin chains", "abstract": "Bethe ansatz."},
+]
+
+
+@pytest.fixture(params=["sqlite", "chroma_http"])
+def document_store(request, tmp_path):
+    if request.param == "sqlite":
+        store = DocumentStore(tmp_path / "documents.sqlite")
+    else:
+        request.getfixturevalue("chroma_settings")
+        client = create_chroma_http_client()
+        # Every test starts from an empty collection on the shared server
+        client.get_or_create_collection("documents")
+        client.delete_collection("documents")
+        store = ChromaDocumentStore(client)
+    yield store
+    store.close()
+
+
+def test_put_and_get_many(document_store):
+    document_store.put_many(_DOCUMENTS)
+
+    documents = document_store.get_many(["2345.6789", "unknown", "1234.5678"])
+
+    assert documents == {document["source"]: document for document in _DOCUMENTS}
+    assert document_store.count() == 2
+
+
+def test_put_many_replaces_existing_documents(document_store):
+    document_store.put_many(_DOCUMENTS)
+    document_store.put_many(
+        [{"source": "1234.5678", "title": "Hubbard model v2", "abstract": "New."}]
+    )
+
+    documents = document_store.get_many(["1234.5678"])
+
+    assert documents["1234.5678"]["title"] == "Hubbard model v2"
+    assert document_store.count() == 2
+
+
+def test_get_many_batches_large_lookups(document_store):
+    document_store.put_many(
+        {"source": f"doc-{i}", "title": f"Title {i}", "abstract": ""}
+        for i in range(2000)
+    )
+
+    documents = document_store.get_many(f"doc-{i}" for i in range(2000))
+
+    assert len(documents) == 2000
+    assert documents["doc-1999"]["title"] == "Title 1999"
+
+
+@pytest.mark.parametrize(
+    "document_backend, vector_backend, expected",
+    [
+        ("auto", "chroma", DocumentStore),
+        ("auto", "local", DocumentStore),
+        ("sqlite", "chroma_http", DocumentStore),
+    ],
+)
+def test_get_document_store_backend(
+    document_backend, vector_backend, expected, tmp_path, monkeypatch
+):
+    monkeypatch.setattr(settings, "DOCUMENT_STORE_BACKEND", document_backend)
+    monkeypatch.setattr(settings, "VECTOR_STORE_BACKEND", vector_backend)
+    monkeypatch.setattr(settings, "DOCUMENT_STORE_PATH", tmp_path / "documents.sqlite")
+    get_document_store.cache_clear()
+    try:
+        assert isinstance(get_document_store(), expected)
+    finally:
+        get_document_store.cache_clear()
+
+
+def test_get_document_store_follows_the_remote_vector_store(
+    chroma_settings, monkeypatch
+):
+    monkeypatch.setattr(settings, "DOCUMENT_STORE_BACKEND", "auto")
+    monkeypatch.setattr(settings, "VECTOR_STORE_BACKEND", "chroma_http")
+    get_document_store.cache_clear()
+    try:
+        assert isinstance(get_document_store(), ChromaDocumentStore)
+    finally:
+        get_document_store.cache_clear()
@@ -0,0 +1,170 @@
+"""
+Pruebas del registro de ingesta (`ingestion_ledger.py`) y de la ingesta reanudable
+e incremental de `ingestion.py` sobre un fichero de arXiv pequeño.
+"""
+
+import json
+
+import pytest
+from config import settings
+from data_loader import get_dataset_path
+from document_store import get_document_store
+from ingestion import ingest_documents
+from ingestion_ledger import IngestionLedger, compute_content_hash
+from llama_index.core.embeddings import MockEmbedding
+from local_vector_store import LocalVectorStore
+
+
+def _write_snapshot(path, documents):
+    with open(path, "w", encoding="utf-8") as file:
+        for source, abstract in documents:
+            file.write(
+                json.dumps(
+                    {
+                        "id": source,
+                        "title": f"Title {source}",
+                        "abstract": abstract,
+                        "categories": "hep-th",
+                    }
+                )
+                + "\n"
+            )
+
+
+@pytest.fixture
+def ledger(tmp_path):
+    ledger = IngestionLedger(tmp_path / "ledger.sqlite")
+    yield ledger
+    ledger.close()
+
+
+@pytest.fixture
+def snapshot_settings(tmp_path, monkeypatch):
+    snapshot_path = tmp_path / "snapshot.json"
+    _write_snapshot(
+        snapshot_path, [(f"000{i}.0001", f"Abstract {i}.") for i in range(4)]
+    )
+    monkeypatch.setattr(settings, "ARXIV_SNAPSHOT_PATH", snapshot_path)
+    monkeypatch.setattr(
+        settings, "SNAPSHOT_INDEX_PATH", tmp_path / "snapshot_index.npy"
+    )
+    monkeypatch.setattr(settings, "DOCUMENT_STORE_BACKEND", "sqlite")
+    monkeypatch.setattr(settings, "DOCUMENT_STORE_PATH", tmp_path / "documents.sqlite")
+    get_dataset_path.cache_clear()
+    get_document_store.cache_clear()
+    yield snapshot_path
+    get_document_store().close()
+    get_document_store.cache_clear()
+    get_dataset_path.cache_clear()
+
+
+@pytest.fixture
+def vector_store(tmp_path):
+    return LocalVectorStore(tmp_path / "store", index_type="flat")
+
+
+def _ingest(vector_store, ledger, max_docs=None):
+    return ingest_documents(
+        MockEmbedding(embed_dim=8),
+        vector_store,
+        max_docs=max_docs,
+        ledger=ledger,
+        workers=1,
+        categories=[],
+    )
+
+
+def test_compute_content_hash():
+    assert compute_content_hash("Title\n\nAbstract") == compute_content_hash(
+        "Title\n\nAbstract"
+    )
+    assert compute_content_hash("Title\n\nAbstract") != compute_content_hash(
+        "Title\n\nAbstract v2"
+    )
+
+
+def test_record_and_reopen(ledger):
+    assert ledger.get_checkpoint() is None
+
+    ledger.record([("1234.5678", 0, "hash-a")], "fingerprint", 120, 1)
+    ledger.record([("2345.6789", 120, "hash-b")], "fingerprint", 250, 2, True)
+    ledger.close()
+
+    reopened = IngestionLedger(ledger.path)
+    assert reopened.get_checkpoint() == {
+        "fingerprint": "fingerprint",
+        "offset": 250,
+        "doc_count": 2,
+        "exhausted": True,
+    }
+    assert reopened.get_content_hash("1234.5678") == "hash-a"
+    assert reopened.get_content_hash("unknown") is None
+    assert reopened.count() == 2
+    reopened.close()
+
+
+def test_record_replaces_content_hash(ledger):
+    ledger.record([("1234.5678", 0, "hash-a")], "fingerprint", 120, 1)
+    ledger.record([("1234.5678", 0, "hash-b")], "fingerprint", 120, 1)
+
+    assert ledger.get_content_hash("1234.5678") == "hash-b"
+    assert ledger.count() == 1
+
+
+def test_reset(ledger):
+    ledger.record([("1234.5678", 0, "hash-a")], "fingerprint", 120, 1)
+
+    ledger.reset()
+
+    assert ledger.get_checkpoint() is None
+    assert ledger.count() == 0
+
+
+def test_ingestion_resumes_from_checkpoint(snapshot_settings, ledger, vector_store):
+    first = _ingest(vector_store, ledger, max_docs=2)
+
+    checkpoint = ledger.get_checkpoint()
+    assert first["chunks"] == 2
+    assert checkpoint["doc_count"] == 2
+    assert not checkpoint["exhausted"]
+
+    second = _ingest(vector_store, ledger)
+
+    assert second["chunks"] == 2
+    assert ledger.get_checkpoint()["exhausted"]
+    assert ledger.count() == 4
+    assert vector_store.count() == 4
+    assert get_document_store().count() == 4
+
+    # Nothing left to read
+    assert _ingest(vector_store, ledger)["chunks"] == 0
+
+
+def test_new_snapshot_embeds_only_changed_documents(
+    snapshot_settings, ledger, vector_store
+):
+    _ingest(vector_store, ledger)
+    fingerprint = ledger.get_checkpoint()["fingerprint"]
+
+    # Same documents, one abstract changed and one document added
+    _write_snapshot(
+        snapshot_settings,
+        [
+            ("0000.0001", "Abstract 0."),
+            ("0001.0001", "Abstract 1, revised."),
+            ("0002.0001", "Abstract 2."),
+            ("0003.0001", "Abstract 3."),
+            ("0004.0001", "Abstract 4."),
+        ],
+    )
+    get_dataset_path.cache_clear()
+
+    stats = _ingest(vector_store, ledger)
+
+    assert stats["chunks"] == 2
+    assert ledger.get_checkpoint()["fingerprint"] != fingerprint
+    assert ledger.get_content_hash("0001.0001") == compute_content_hash(
+        "Title 0001.0001\n\nAbstract 1, revised."
+    )
+    # The stale nodes of the changed document were replaced
+    assert vector_store.count() == 5
@@ -0,0 +1,149 @@
+"""
+Pruebas de los límites de la pasarela de OpenAI (`llm_gateway.py`): la cubeta de
+fichas (`TokenBucket`) y el límite de llamadas simultáneas (`ConcurrencyLimiter`).
+"""
+
+import asyncio
+import threading
+import time
+
+import pytest
+from llm_gateway import ConcurrencyLimiter, TokenBucket
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    """
+    Reloj manual que sustituye a `time.monotonic`; se avanza con `clock.advance`.
+    """
+
+    class _Clock:
+        now = 1000.0
+
+        def advance(self, seconds):
+            self.now += seconds
+
+    fake_clock = _Clock()
+    monkeypatch.setattr(time, "monotonic", lambda: fake_clock.now)
+    return fake_clock
+
+
+def test_token_bucket_allows_a_burst_up_to_its_capacity(clock):
+    bucket = TokenBucket(rate_per_minute=60, capacity=3)
+
+    assert [bucket.reserve() for _ in range(3)] == [0.0, 0.0, 0.0]
+    # Further reservations queue behind each other
+    assert bucket.reserve() == pytest.approx(1.0)
+    assert bucket.reserve() == pytest.approx(2.0)
+
+
+def test_token_bucket_refills_over_time(clock):
+    bucket = TokenBucket(rate_per_minute=60, capacity=1)
+    bucket.reserve()
+
+    clock.advance(0.5)
+    assert bucket.reserve() == pytest.approx(0.5)
+
+    clock.advance(1.5)
+    assert bucket.reserve() == pytest.approx(0.0)
+
+
+def test_token_bucket_never_exceeds_its_capacity(clock):
+    bucket = TokenBucket(rate_per_minute=60, capacity=2)
+
+    clock.advance(3600)
+
+    assert [bucket.reserve() for _ in range(2)] == [0.0, 0.0]
+    assert bucket.reserve() == pytest.approx(1.0)
+
+
+def test_token_bucket_caps_large_reservations(clock):
+    # A request larger than the bucket waits for a full bucket, not forever
+    bucket = TokenBucket(rate_per_minute=600, capacity=100)
+
+    assert bucket.reserve(250) == 0.0
+    assert bucket.reserve(50) == pytest.approx(5.0)
+
+
+def test_concurrency_limiter_bounds_threads():
+    limiter = ConcurrencyLimiter(2)
+    lock = threading.Lock()
+    running, peak = 0, 0
+
+    def _call():
+        nonlocal running, peak
+        with limiter:
+            with lock:
+                running += 1
+                peak = max(peak, running)
+            time.sleep(0.01)
+            with lock:
+                running -= 1
+
+    threads = [threading.Thread(target=_call) for _ in range(8)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    assert peak == 2
+    assert limiter.active == 0
+
+
+def test_concurrency_limiter_is_shared_by_threads_and_coroutines():
+    limiter = ConcurrencyLimiter(1)
+
+    async def _main():
+        limiter.acquire()
+        waiter = asyncio.create_task(limiter.aacquire())
+        await asyncio.sleep(0.01)
+        assert not waiter.done()
+
+        # Released from another thread: the slot is handed over to the coroutine
+        threading.Thread(target=limiter.release).start()
+        await asyncio.wait_for(waiter, timeout=1.0)
+        assert limiter.active == 1
+        limiter.release()
+
+    asyncio.run(_main())
+    assert limiter.active == 0
+
+
+def test_concurrency_limiter_serves_waiters_in_order():
+    limiter = ConcurrencyLimiter(1)
+    order = []
+
+    async def _call(name):
+        async with limiter:
+            order.append(name)
+            await asyncio.sleep(0)
+
+    async def _main():
+        async with limiter:
+            tasks = [asyncio.create_task(_call(name)) for name in "abc"]
+            await asyncio.sleep(0.01)
+        await asyncio.gather(*tasks)
+
+    asyncio.run(_main())
+    assert order == ["a", "b", "c"]
+    assert limiter.active == 0
+
+
+def test_cancelled_waiter_does_not_keep_a_slot():
+    limiter = ConcurrencyLimiter(1)
+
+    async def _main():
+        limiter.acquire()
+        waiter = asyncio.create_task(limiter.aacquire())
+        await asyncio.sleep(0.01)
+        waiter.cancel()
+        with pytest.raises(asyncio.CancelledError):
+            await waiter
+
+        limiter.release()
+        assert limiter.active == 0
+        await asyncio.wait_for(limiter.aacquire(), timeout=1.0)
+        limiter.release()
+
+    asyncio.run(_main())
+    assert limiter.active == 0
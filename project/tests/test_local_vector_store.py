@@ -0,0 +1,173 @@
+"""
+Pruebas del almacén vectorial local (`local_vector_store.py`): escritura, borrado,
+persistencia y búsqueda cuantizada a int8 con reordenación en float32.
+"""
+
+import numpy as np
+import pytest
+from ann_index import IVFIndex
+from llama_index.core.schema import NodeRelationship, RelatedNodeInfo, TextNode
+from llama_index.core.vector_stores import VectorStoreQuery
+from local_vector_store import LocalVectorStore, quantize_int8
+
+_DIM = 32
+_NUM_DOCUMENTS = 100
+_CHUNKS_PER_DOCUMENT = 3
+
+
+def _make_nodes(vectors, doc_ids):
+    return [
+        TextNode(
+            id_=f"{doc_id}-{i}",
+            text=f"Chunk {i} of {doc_id}",
+            embedding=vector.tolist(),
+            metadata={"source": doc_id},
+            relationships={NodeRelationship.SOURCE: RelatedNodeInfo(node_id=doc_id)},
+        )
+        for i, (vector, doc_id) in enumerate(zip(vectors, doc_ids))
+    ]
+
+
+@pytest.fixture
+def vectors():
+    rng = np.random.default_rng(0)
+    return rng.standard_normal((_NUM_DOCUMENTS * _CHUNKS_PER_DOCUMENT, _DIM)).astype(
+        np.float32
+    )
+
+
+@pytest.fixture
+def doc_ids():
+    return [
+        f"doc-{i // _CHUNKS_PER_DOCUMENT}"
+        for i in range(_NUM_DOCUMENTS * _CHUNKS_PER_DOCUMENT)
+    ]
+
+
+@pytest.fixture(params=["int8", "none"])
+def store(request, tmp_path, vectors, doc_ids):
+    store = LocalVectorStore(
+        tmp_path / "store", quantization=request.param, index_type="flat"
+    )
+    store.add(_make_nodes(vectors, doc_ids))
+    return store
+
+
+def test_quantize_int8():
+    vectors = np.array([[0.5, -1.0, 0.25], [0.0, 0.0, 0.0]], dtype=np.float32)
+
+    codes, scales = quantize_int8(vectors)
+
+    assert codes.dtype == np.int8
+    assert codes[0].tolist() == [64, -127, 32]
+    assert scales[0] == pytest.approx(1.0 / 127)
+    # Zero vectors keep a unit scale instead of dividing by zero
+    assert codes[1].tolist() == [0, 0, 0]
+    assert scales[1] == 1.0
+    np.testing.assert_allclose(
+        codes * scales[:, None], vectors, atol=float(scales[0]) / 2
+    )
+
+
+def test_add_and_query(store, vectors):
+    result = store.query(
+        VectorStoreQuery(query_embedding=vectors[7].tolist(), similarity_top_k=3)
+    )
+
+    assert store.count() == len(vectors)
+    assert result.ids[0] == "doc-2-7"
+    assert result.nodes[0].get_content() == "Chunk 7 of doc-2"
+    assert result.nodes[0].ref_doc_id == "doc-2"
+    assert result.similarities[0] == pytest.approx(1.0, abs=1e-5)
+    assert result.similarities == sorted(result.similarities, reverse=True)
+
+
+def test_quantized_search_matches_exact_search(store, vectors):
+    rng = np.random.default_rng(1)
+    queries = rng.standard_normal((20, _DIM)).astype(np.float32)
+
+    for query in queries:
+        rows, dots = store.search(query, 10)
+        exact_rows, exact_dots = store.search(query, 10, exact=True)
+
+        np.testing.assert_array_equal(rows, exact_rows)
+        # Re-ranked with the float32 vectors: the scores are exact as well
+        np.testing.assert_allclose(dots, exact_dots, rtol=1e-5)
+
+    assert store.evaluate_recall(queries, top_k=10) == 1.0
+
+
+def test_search_batch_matches_search(store):
+    rng = np.random.default_rng(2)
+    queries = rng.standard_normal((5, _DIM)).astype(np.float32)
+
+    for query, (rows, dots) in zip(queries, store.search_batch(queries, 10)):
+        expected_rows, expected_dots = store.search(query, 10)
+        np.testing.assert_array_equal(rows, expected_rows)
+        np.testing.assert_allclose(dots, expected_dots, rtol=1e-5)
+
+
+def test_add_replaces_nodes_with_the_same_id(store, vectors, doc_ids):
+    replacement = -vectors[:1]
+    store.add(_make_nodes(replacement, doc_ids[:1]))
+
+    rows, _ = store.search(replacement[0], 1)
+    result = store.query(
+        VectorStoreQuery(query_embedding=vectors[0].tolist(), similarity_top_k=1)
+    )
+
+    assert store.count() == len(vectors)
+    assert rows.tolist() == [len(vectors)]
+    assert result.ids != ["doc-0-0"]
+
+
+def test_delete_by_ref_doc_id(store, vectors):
+    store.delete("doc-2")
+
+    result = store.query(
+        VectorStoreQuery(query_embedding=vectors[7].tolist(), similarity_top_k=10)
+    )
+
+    assert store.count() == len(vectors) - _CHUNKS_PER_DOCUMENT
+    assert all(node.ref_doc_id != "doc-2" for node in result.nodes)
+
+
+def test_search_never_returns_more_than_the_live_rows(tmp_path, vectors, doc_ids):
+    store = LocalVectorStore(tmp_path / "store", index_type="flat")
+    store.add(_make_nodes(vectors[:6], doc_ids[:6]))
+    store.delete("doc-0")
+
+    rows, _ = store.search(vectors[0], 10)
+
+    assert sorted(rows.tolist()) == [3, 4, 5]
+
+
+def test_reopen(tmp_path, vectors, doc_ids):
+    store = LocalVectorStore(tmp_path / "store", quantization="int8")
+    store.add(_make_nodes(vectors, doc_ids))
+    store.delete("doc-0")
+
+    # The quantization of an existing store wins over the argument
+    reopened = LocalVectorStore(tmp_path / "store", quantization="none")
+    rows, _ = reopened.search(vectors[10], 1)
+
+    assert reopened.quantization == "int8"
+    assert reopened.dim == _DIM
+    assert reopened.count() == len(vectors) - _CHUNKS_PER_DOCUMENT
+    assert rows.tolist() == [10]
+
+
+def test_refresh_index_builds_the_ann_index(tmp_path, vectors, doc_ids):
+    store = LocalVectorStore(tmp_path / "store", index_type="ivf")
+    store.add(_make_nodes(vectors, doc_ids))
+
+    ann_index = store.refresh_index()
+
+    assert isinstance(ann_index, IVFIndex)
+    assert ann_index.num_rows == len(vectors)
+    assert (tmp_path / "store" / "ivf_index.npz").exists()
+    # Already current: not rebuilt
+    assert store.refresh_index() is ann_index
+
+    rows, _ = store.search(vectors[42], 1)
+    assert rows.tolist() == [42]
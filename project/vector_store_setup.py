@@ -6,19 +6,25 @@ Incluye funciones para dividir documentos en fragmentos de texto, crear nodos
 con metadatos, y generar incrustaciones para su almacenamiento.
 """
 
+import time
+from typing import Any, Callable, Dict, List, Tuple
 
-from typing import Tuple
+import chromadb
+from chroma_http_client import create_chroma_http_client
+from chromadb.api.models.Collection import Collection
 from config import settings
 from llama_index.core.node_parser import SentenceSplitter
-from llama_index.core.schema import TextNode
+from llama_index.core.schema import (
+    MetadataMode,
+    NodeRelationship,
+    RelatedNodeInfo,
+    TextNode,
+)
 from llama_index.vector_stores.chroma import ChromaVectorStore
-
-import chromadb
-from chromadb.api.models.Collection import Collection
-
+from local_vector_store import LocalVectorStore
 
 
-def create_vector_store() -> Tuple[Collection, ChromaVectorStore]:
+def create_chroma_vector_store() -> Tuple[Collection, ChromaVectorStore]:
     """
     Crea e inicializa un almacén vectorial con Chroma.
 
@@ -28,14 +34,68 @@ def create_vector_store() -> Tuple[Collection, ChromaVectorStore]:
 
     Devuelve:
     --------
-    ChromaVectorStore
-        Una instancia del almacén vectorial de Chroma.
+    tuple
+        Tupla (Collection, ChromaVectorStore).
     """
     chroma_client = chromadb.PersistentClient(path=str(settings.DATABASE_PATH))
     chroma_collection = chroma_client.get_or_create_collection("quickstart")
     return chroma_collection, ChromaVectorStore(chroma_collection=chroma_collection)
 
 
+def create_chroma_http_vector_store() -> Tuple[Collection, ChromaVectorStore]:
+    """
+    Crea un almacén vectorial sobre la colección "quickstart" de un servidor de
+    Chroma remoto (`CHROMADB_HOST` y `CHROMADB_PORT`), con conexiones persistentes,
+    tiempos de espera y reintentos (ver `chroma_http_client.py`).
+
+    Devuelve:
+    --------
+    tuple
+        Tupla (Collection, ChromaVectorStore).
+    """
+    chroma_client = create_chroma_http_client()
+    chroma_collection = chroma_client.get_or_create_collection("quickstart")
+    return chroma_collection, ChromaVectorStore(chroma_collection=chroma_collection)
+
+
+def create_local_vector_store() -> Tuple[LocalVectorStore, LocalVectorStore]:
+    """
+    Crea o abre el almacén vectorial local (`LocalVectorStore`), que hace a la vez
+    de colección (`count`) y de almacén vectorial.
+
+    Devuelve:
+    --------
+    tuple
+        Tupla (LocalVectorStore, LocalVectorStore).
+    """
+    local_store = LocalVectorStore()
+    return local_store, local_store
+
+
+# Available vector store backends, selected with VECTOR_STORE_BACKEND
+VECTOR_STORE_BACKENDS: Dict[str, Callable[[], Tuple[Any, Any]]] = {
+    "chroma": create_chroma_vector_store,
+    "chroma_http": create_chroma_http_vector_store,
+    "local": create_local_vector_store,
+}
+
+
+def create_vector_store() -> Tuple[Any, Any]:
+    """
+    Crea el almacén vectorial configurado en `VECTOR_STORE_BACKEND`.
+
+    Devuelve:
+    --------
+    tuple
+        Tupla (colección, almacén vectorial). La colección ofrece `count()` y el
+        almacén la interfaz de LlamaIndex (`add`, `delete`, `query`).
+    """
+    backend = settings.VECTOR_STORE_BACKEND
+    if backend not in VECTOR_STORE_BACKENDS:
+        raise ValueError(f"Unknown vector store backend: {backend}")
+    return VECTOR_STORE_BACKENDS[backend]()
+
+
 def chunk_documents(documents):
     """
     Divide documentos en fragmentos de texto utilizando un separador de oraciones.
@@ -55,10 +115,7 @@ def chunk_documents(documents):
         Una tupla que contiene una lista de fragmentos de texto y una lista de
         índices de documento asociados.
     """
-    text_parser = SentenceSplitter(
-        chunk_size=settings.CHUNK_SIZE,
-        chunk_overlap=settings.CHUNK_OVERLAP,
-    )
+    text_parser = get_text_parser()
 
     text_chunks = []
     doc_idxs = []
@@ -74,6 +131,9 @@ def create_nodes(documents, text_chunks, doc_idxs):
     """
     Crea nodos de texto a partir de fragmentos de texto y asocia metadatos.
 
+    Los nodos son iguales a los de `build_document_nodes` (identificadores,
+    posiciones y relación con el documento de origen).
+
     Parámetros:
     -----------
     documents : list
@@ -88,40 +148,201 @@ def create_nodes(documents, text_chunks, doc_idxs):
     list
         Lista de nodos de texto con metadatos asociados.
     """
+    chunks_by_doc = {}
+    for doc_idx, text_chunk in zip(doc_idxs, text_chunks):
+        chunks_by_doc.setdefault(doc_idx, []).append(text_chunk)
+
     nodes = []
-    for idx, text_chunk in enumerate(text_chunks):
-        node = TextNode(text=text_chunk)
-        src_doc = documents[doc_idxs[idx]]
-        node.metadata = src_doc["metadata"]
+    for doc_idx, doc_chunks in chunks_by_doc.items():
+        nodes.extend(_build_chunk_nodes(documents[doc_idx], doc_chunks))
+    return nodes
+
+
+def get_text_parser() -> SentenceSplitter:
+    """
+    Crea el separador de oraciones configurado con `CHUNK_SIZE` y `CHUNK_OVERLAP`.
+
+    Devuelve:
+    --------
+    SentenceSplitter
+        Una instancia del separador de oraciones.
+    """
+    return SentenceSplitter(
+        chunk_size=settings.CHUNK_SIZE,
+        chunk_overlap=settings.CHUNK_OVERLAP,
+    )
+
+
+def build_document_nodes(doc, text_parser: SentenceSplitter) -> List[TextNode]:
+    """
+    Divide un documento en fragmentos y crea sus nodos de texto.
+
+    Los identificadores de los nodos son deterministas (identificador del documento
+    y posición del fragmento) y cada nodo queda vinculado a su documento de origen,
+    de modo que volver a ingerir un documento sobrescribe sus nodos y es posible
+    borrarlos con `vector_store.delete(source)`.
+
+    Los nodos sólo guardan el identificador del documento y la posición del
+    fragmento dentro del texto; el título y el resumen se guardan una sola vez en
+    `DocumentStore`.
+
+    Parámetros:
+    -----------
+    doc : dict
+        Documento con las claves "text" y "metadata".
+    text_parser : SentenceSplitter
+        Separador utilizado para dividir el texto.
+
+    Devuelve:
+    --------
+    list
+        Lista de nodos de texto del documento.
+    """
+    return _build_chunk_nodes(doc, text_parser.split_text(doc["text"]))
+
+
+def _build_chunk_nodes(doc, text_chunks) -> List[TextNode]:
+    source = doc["metadata"]["source"]
+    text = doc["text"]
+
+    nodes = []
+    search_start = 0
+    for chunk_idx, text_chunk in enumerate(text_chunks):
+        node = TextNode(id_=f"{source}_{chunk_idx}", text=text_chunk)
+        node.metadata = {"source": source}
+        # The arXiv id carries no meaning for the embedding model
+        node.excluded_embed_metadata_keys = ["source"]
+        node.relationships[NodeRelationship.SOURCE] = RelatedNodeInfo(node_id=source)
+
+        # The splitter may normalize whitespace, so the offsets are best effort
+        start_char = text.find(text_chunk, search_start)
+        if start_char >= 0:
+            node.start_char_idx = start_char
+            node.end_char_idx = start_char + len(text_chunk)
+            search_start = start_char + 1
+
         nodes.append(node)
     return nodes
 
 
-def embed_and_add_nodes(nodes, embed_model, vector_store, batch_size=100):
+def embed_nodes(nodes, embed_model, embed_batch_size=None):
     """
-    Genera embeddings para los nodos de texto y los agrega al almacén vectorial en lotes.
+    Genera los embeddings de una lista de nodos en micro-lotes.
 
     Parámetros:
     -----------
     nodes : list
-        Lista de nodos de texto para incrustar.
+        Lista de nodos de texto para incrustar. Se modifican en el sitio.
+    embed_model : object
+        Modelo utilizado para generar incrustaciones de texto.
+    embed_batch_size : int, opcional
+        Número de textos por llamada al modelo de embeddings.
+        Por defecto, `settings.EMBED_BATCH_SIZE`.
+    """
+    embed_batch_size = embed_batch_size or settings.EMBED_BATCH_SIZE
+
+    for start in range(0, len(nodes), embed_batch_size):
+        batch = nodes[start : start + embed_batch_size]
+        texts = [node.get_content(metadata_mode=MetadataMode.EMBED) for node in batch]
+        embeddings = embed_model.get_text_embedding_batch(texts)
+        for node, node_embedding in zip(batch, embeddings):
+            node.embedding = node_embedding
+
+
+def embed_and_add_nodes(
+    nodes,
+    embed_model,
+    vector_store,
+    batch_size=None,
+    embed_batch_size=None,
+    on_flush=None,
+):
+    """
+    Genera embeddings para los nodos de texto y los agrega al almacén vectorial en lotes.
+
+    Los textos se incrustan con `get_text_embedding_batch` en micro-lotes de
+    `embed_batch_size` elementos, de modo que el modelo procesa cada micro-lote en
+    una sola pasada. La escritura en el almacén vectorial se agrupa de forma
+    independiente en lotes de `batch_size` nodos. Los nodos que ya traen su
+    embedding (por ejemplo, calculado en un proceso de trabajo) se escriben tal
+    cual. Al terminar se informa del rendimiento obtenido (fragmentos por segundo).
+
+    Parámetros:
+    -----------
+    nodes : iterable
+        Nodos de texto para incrustar.
     embed_model : object
         Modelo utilizado para generar incrustaciones de texto. Debe poder
         manejar listas de textos en una sola llamada para usar el modo batch.
     vector_store : ChromaVectorStore
         Instancia del almacén vectorial donde se almacenarán los nodos incrustados.
-    batch_size : int
-        Tamaño del lote (batch) para procesar las incrustaciones. Por defecto, 1000.
+    batch_size : int, opcional
+        Número de nodos por escritura en el almacén vectorial.
+        Por defecto, `settings.VECTOR_STORE_BATCH_SIZE`.
+    embed_batch_size : int, opcional
+        Número de textos por llamada al modelo de embeddings.
+        Por defecto, `settings.EMBED_BATCH_SIZE`.
+    on_flush : callable, opcional
+        Función que recibe la lista de nodos tras cada escritura en el almacén
+        vectorial (por ejemplo, para registrar el progreso de la ingesta).
+
+    Devuelve:
+    --------
+    dict
+        Estadísticas de la ingesta: número de fragmentos, segundos empleados
+        y fragmentos por segundo.
     """
+    batch_size = batch_size or settings.VECTOR_STORE_BATCH_SIZE
+    embed_batch_size = embed_batch_size or settings.EMBED_BATCH_SIZE
+
+    start_time = time.perf_counter()
+    total_chunks = 0
 
+    nodes_to_embed = []
     nodes_to_save = []
+
+    def _embed_pending():
+        embed_nodes(
+            [node for node in nodes_to_embed if node.embedding is None],
+            embed_model,
+            embed_batch_size,
+        )
+        nodes_to_save.extend(nodes_to_embed)
+        nodes_to_embed.clear()
+
+    def _flush(nodes_batch):
+        nonlocal total_chunks
+        vector_store.add(nodes_batch)
+        total_chunks += len(nodes_batch)
+        if on_flush is not None:
+            on_flush(nodes_batch)
+
     for node in nodes:
-        node_embedding = embed_model.get_text_embedding(node.get_content(metadata_mode="all"))
-        node.embedding = node_embedding
-        nodes_to_save.append(node)
-
-        if len(nodes_to_save) >= batch_size:
-            vector_store.add(nodes_to_save)
-            nodes_to_save = []
-        
-    vector_store.add(nodes_to_save)
+        nodes_to_embed.append(node)
+        if len(nodes_to_embed) >= embed_batch_size:
+            _embed_pending()
+
+        while len(nodes_to_save) >= batch_size:
+            _flush(nodes_to_save[:batch_size])
+            del nodes_to_save[:batch_size]
+
+    if nodes_to_embed:
+        _embed_pending()
+
+    while nodes_to_save:
+        _flush(nodes_to_save[:batch_size])
+        del nodes_to_save[:batch_size]
+
+    elapsed = time.perf_counter() - start_time
+    chunks_per_second = total_chunks / elapsed if elapsed > 0 else 0.0
+    print(
+        f"Embedded {total_chunks} chunks in {elapsed:.2f}s "
+        f"({chunks_per_second:.1f} chunks/s, embed_batch_size={embed_batch_size}, "
+        f"batch_size={batch_size})"
+    )
+
+    return {
+        "chunks": total_chunks,
+        "seconds": elapsed,
+        "chunks_per_second": chunks_per_second,
+    }